@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+App Factory - One way to get any handler variant's app
+
+    app = create_app("main")        # main.py (Flask, DatabaseBackend storage)
+    app = create_app("fast")        # fast_group_handler.py (Flask, pooled requests)
+    app = create_app("async")       # async_group_handler.py (Starlette)
+
+Each variant configures itself from the environment when first imported;
+serve.py, start.py and the benchmarks all go through here.
+
+Importing an app is cheap and makes no connections. Storage clients (and
+the Supabase SDK and pydantic) are only loaded by the first request that
+needs them. serve.py preloads the app in its master, so each worker builds
+its own clients after the fork. bench_startup.py measures import time and
+time to first request, and test_startup.py keeps both within budget.
+"""
+
+import importlib
+
+# variant -> (module, interface)
+VARIANTS = {
+    "main": ("main", "wsgi"),
+    "fast": ("fast_group_handler", "wsgi"),
+    "async": ("async_group_handler", "asgi"),
+}
+
+
+def interface(variant):
+    """"wsgi" or "asgi" """
+    try:
+        return VARIANTS[variant][1]
+    except KeyError:
+        raise ValueError(f"Unknown app variant: {variant} (choose from {', '.join(VARIANTS)})")
+
+
+def create_app(variant="main"):
+    """The variant's application object"""
+    interface(variant)
+    return importlib.import_module(VARIANTS[variant][0]).app
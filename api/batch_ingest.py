@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Batch Ingest - Parsing and validation for bulk expense creation
+
+`POST /api/groups/<id>/expenses:batch` takes either a JSON array (or
+`{"expenses": [...]}`) or an NDJSON body with one expense per line. Every
+item is validated against ExpenseCreate before anything is written; the
+valid ones go upstream as a single multi-row insert and the response
+lists a result per input item, in input order.
+"""
+
+import os
+import json
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+
+class BatchError(ValueError):
+    """Raised when the batch body as a whole cannot be accepted"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_ndjson(content_type):
+    return (content_type or "").split(";")[0].strip().lower() in NDJSON_TYPES
+
+
+def _too_large(max_items):
+    return BatchError(f"Batch exceeds {max_items} expenses", status_code=413)
+
+
+def _parse_line(line, number):
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise BatchError(f"Invalid JSON on line {number}")
+
+
+def parse_json_body(payload, max_items=None):
+    """Items from an already decoded JSON array or {"expenses": [...]} body"""
+    max_items = max_items or MAX_BATCH_SIZE
+    items = payload.get("expenses") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise BatchError("Body must be a JSON array of expenses or {\"expenses\": [...]}")
+    if not items:
+        raise BatchError("Batch is empty")
+    if len(items) > max_items:
+        raise _too_large(max_items)
+    return items
+
+
+def parse_ndjson(lines, max_items=None):
+    """Items from an iterable of NDJSON lines, read one line at a time"""
+    max_items = max_items or MAX_BATCH_SIZE
+    items = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        if len(items) == max_items:
+            raise _too_large(max_items)
+        items.append(_parse_line(line, number))
+    if not items:
+        raise BatchError("Batch is empty")
+    return items
+
+
+async def aparse_ndjson(chunks, max_items=None):
+    """Items from an async iterable of byte chunks carrying NDJSON"""
+    max_items = max_items or MAX_BATCH_SIZE
+    items, buffer, number = [], b"", 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if not line.strip():
+                continue
+            if len(items) == max_items:
+                raise _too_large(max_items)
+            items.append(_parse_line(line, number))
+    if buffer.strip():
+        if len(items) == max_items:
+            raise _too_large(max_items)
+        items.append(_parse_line(buffer, number + 1))
+    if not items:
+        raise BatchError("Batch is empty")
+    return items
+
+
+def _validate(item):
+    """(ExpenseCreate, None) for a valid item, (None, errors) otherwise"""
+    # pydantic is imported with the first batch rather than at startup
+    from pydantic import ValidationError
+    from models import ExpenseCreate
+
+    if not isinstance(item, dict):
+        return None, [{"field": None, "message": "expense must be a JSON object"}]
+    try:
+        expense = ExpenseCreate(**item)
+    except ValidationError as e:
+        return None, [{"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                      for error in e.errors()]
+    if not expense.description.strip():
+        return None, [{"field": "description", "message": "description must not be blank"}]
+    return expense, None
+
+
+def validate_batch(items, group_id, user_id):
+    """Validate every item; returns (rows to insert, per-item results)
+
+    Results for valid items are placeholders until merge_inserted() fills
+    them in with the created rows.
+    """
+    rows, results = [], []
+    for index, item in enumerate(items):
+        expense, errors = _validate(item)
+        if errors:
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        rows.append({
+            "description": expense.description.strip(),
+            "amount": expense.amount,
+            "group_id": group_id,
+            "created_by": user_id
+        })
+        results.append({"index": index, "status": "pending"})
+    return rows, results
+
+
+def merge_inserted(results, created):
+    """Fill pending results with the inserted rows (PostgREST keeps input order)"""
+    pending = [result for result in results if result["status"] == "pending"]
+    if created is None or len(created) != len(pending):
+        for result in pending:
+            result.update(status="failed", error="Insert failed")
+        return results
+    for result, row in zip(pending, created):
+        result.update(status="created", expense=row)
+    return results
+
+
+def batch_response(results):
+    """(body, status code): 201 all created, 207 mixed, 400 nothing valid, 502 insert failed"""
+    created = sum(1 for result in results if result["status"] == "created")
+    invalid = sum(1 for result in results if result["status"] == "invalid")
+    failed = len(results) - created - invalid
+
+    if failed:
+        status = 502
+    elif not created:
+        status = 400
+    elif invalid:
+        status = 207
+    else:
+        status = 201
+
+    body = {
+        "created": created,
+        "invalid": invalid,
+        "failed": failed,
+        "results": results
+    }
+    return body, status
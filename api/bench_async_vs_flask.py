@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Flask fast handler vs ASGI async handler under upstream latency
+
+Both apps talk to the local Supabase stand-in with injected latency. Flask
+runs on a fixed pool of worker threads (like gunicorn --threads), the async
+app runs on a single uvicorn event loop.
+"""
+
+import time
+import logging
+import asyncio
+import threading
+import statistics
+
+import httpx
+import uvicorn
+
+import async_group_handler
+import fast_group_handler
+from jwt_auth import TokenVerifier
+from load_harness import PooledWSGIServer, free_port
+from local_supabase import LocalSupabase, issue_token, JWT_SECRET
+
+UPSTREAM_LATENCY = 0.2
+FLASK_THREADS = 8
+CONCURRENCY = 100
+REQUESTS = 800
+USER_ID = "bench-user"
+
+
+async def drive(url, headers):
+    """Fire REQUESTS requests with CONCURRENCY in flight; return (elapsed, latencies)"""
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(REQUESTS):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+        return time.perf_counter() - start, sorted(latencies)
+
+
+def report(label, elapsed, latencies):
+    print(f"   {label:<30} {REQUESTS / elapsed:8.1f} req/s   "
+          f"p50 {statistics.median(latencies):7.1f} ms   p95 {latencies[int(len(latencies) * 0.95)]:7.1f} ms")
+
+
+def run_flask(server, group_id, headers):
+    client = fast_group_handler.FastSupabaseClient()
+    client.url, client.base_url = server.url, server.rest_url
+    fast_group_handler.supabase = client
+    fast_group_handler.token_verifier = TokenVerifier(secret=JWT_SECRET)
+
+    port = free_port()
+    wsgi = PooledWSGIServer("127.0.0.1", port, fast_group_handler.app, FLASK_THREADS)
+    threading.Thread(target=wsgi.serve_forever, daemon=True).start()
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}/api/groups/{group_id}/expenses", headers))
+    finally:
+        wsgi.shutdown()
+
+
+def run_async(server, group_id, headers):
+    client = async_group_handler.AsyncSupabaseClient()
+    client.url, client.base_url = server.url, server.rest_url
+    async_group_handler.supabase = client
+    async_group_handler.token_verifier = TokenVerifier(secret=JWT_SECRET)
+
+    port = free_port()
+    asgi = uvicorn.Server(uvicorn.Config(async_group_handler.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=asgi.run, daemon=True).start()
+    while not asgi.started:
+        time.sleep(0.01)
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}/api/groups/{group_id}/expenses", headers))
+    finally:
+        asgi.should_exit = True
+
+
+def run_benchmark():
+    print("📊 Flask vs async handler benchmark")
+    print(f"   upstream latency {UPSTREAM_LATENCY * 1000:.0f} ms, {CONCURRENCY} clients, {REQUESTS} requests")
+    print("=" * 72)
+
+    with LocalSupabase(latency=UPSTREAM_LATENCY) as server:
+        group = server.seed("groups", [{"name": "Bench", "created_by": USER_ID}])[0]
+        server.seed("expenses", [
+            {"description": f"Expense {i}", "amount": 12.5, "group_id": group["id"], "created_by": USER_ID}
+            for i in range(20)
+        ])
+        headers = {"Authorization": f"Bearer {issue_token(USER_ID)}"}
+
+        report(f"Flask ({FLASK_THREADS} threads)", *run_flask(server, group["id"], headers))
+        report("ASGI (1 event loop)", *run_async(server, group["id"], headers))
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    run_benchmark()
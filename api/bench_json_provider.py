@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: jsonify() of a 10k-expense payload with Flask's default provider vs FastJSONProvider
+Also times passing an unmodified upstream body through vs parsing and re-serializing it.
+"""
+
+import time
+import uuid
+import datetime
+import statistics
+from decimal import Decimal
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from json_provider import FastJSONProvider, RawJSON, dumps_bytes
+
+EXPENSES = 10_000
+ROUNDS = 20
+
+
+def make_payload(count=EXPENSES):
+    created = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    user = uuid.uuid4()
+    expenses = [
+        {
+            "id": i,
+            "description": f"Expense number {i}",
+            "amount": Decimal(f"{i % 500}.{i % 100:02d}"),
+            "group_id": 1,
+            "created_by": user,
+            "created_at": created + datetime.timedelta(seconds=i)
+        }
+        for i in range(count)
+    ]
+    return {
+        "expenses": expenses,
+        "count": count,
+        "total_amount": sum(expense["amount"] for expense in expenses),
+        "next_cursor": None
+    }
+
+
+def time_rounds(fn, rounds=ROUNDS):
+    fn()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def jsonify_with(provider_class, payload):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+
+    def run():
+        with app.app_context():
+            return jsonify(payload).get_data()
+    return run
+
+
+def report(label, ms, baseline=None):
+    speedup = f"   {baseline / ms:6.1f}x" if baseline else ""
+    print(f"   {label:<38} {ms:8.2f} ms{speedup}")
+
+
+def run_benchmark():
+    print(f"📊 JSON provider benchmark ({EXPENSES} expenses, median of {ROUNDS})")
+    print("=" * 60)
+    print(f"   Encoder: {'orjson' if json_provider.orjson else 'stdlib json (orjson not installed)'}")
+
+    payload = make_payload()
+    default = time_rounds(jsonify_with(DefaultJSONProvider, payload))
+    fast = time_rounds(jsonify_with(FastJSONProvider, payload))
+
+    print("\n🔸 jsonify() of the listing payload")
+    report("Flask DefaultJSONProvider", default)
+    report("FastJSONProvider", fast, default)
+
+    # An upstream body returned unmodified: parse + re-serialize vs pass the bytes on
+    upstream = dumps_bytes(payload)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    def round_trip():
+        with app.app_context():
+            return jsonify(app.json.loads(upstream)).get_data()
+
+    def passthrough():
+        with app.app_context():
+            return jsonify(RawJSON(upstream)).get_data()
+
+    reparse = time_rounds(round_trip)
+    raw = time_rounds(passthrough)
+
+    print(f"\n🔸 Unmodified upstream body ({len(upstream) / 1024:.0f} KiB)")
+    report("parse + jsonify", reparse)
+    report("RawJSON passthrough", raw, reparse)
+
+
+if __name__ == "__main__":
+    run_benchmark()
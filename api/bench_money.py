@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Benchmark: totalling a million amounts with Decimal vs float vs integer cents (money.sum_cents)
+"""
+
+import time
+import random
+from decimal import Decimal
+
+from money import sum_cents, to_amount
+
+AMOUNTS = 1_000_000
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_benchmark():
+    print(f"📊 Money totals benchmark ({AMOUNTS:,} amounts)")
+    print("=" * 60)
+
+    rng = random.Random(42)
+    numbers = [rng.randrange(1, 10 ** 7) / 100 for _ in range(AMOUNTS)]
+    # PostgREST sends numeric columns as JSON numbers; some drivers send strings
+    inputs = {"JSON numbers": numbers, "numeric strings": [f"{n:.2f}" for n in numbers]}
+
+    for label, amounts in inputs.items():
+        decimal_total, decimal_ms = timed(lambda: sum(Decimal(str(amount)) for amount in amounts))
+        float_total, float_ms = timed(lambda: round(sum(float(amount) for amount in amounts), 2))
+        cents_total, cents_ms = timed(lambda: sum_cents(amounts))
+
+        print(f"\n🔸 {label}")
+        print(f"   {'sum(Decimal(str(a)))':<28} {decimal_ms:8.1f} ms   {decimal_total}")
+        print(f"   {'round(sum(float(a)), 2)':<28} {float_ms:8.1f} ms   {float_total}"
+              f"{'' if Decimal(str(float_total)) == decimal_total else '   ❌ inexact'}")
+        print(f"   {'money.sum_cents':<28} {cents_ms:8.1f} ms   {to_amount(cents_total)}"
+              f"{'   ✅ exact' if Decimal(cents_total) / 100 == decimal_total else '   ❌ inexact'}")
+        print(f"   Speedup over Decimal: {decimal_ms / cents_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
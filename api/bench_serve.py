@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serve.py throughput as workers are added
+
+Runs main.py on the SQLite backend (no upstream latency, so the work is
+CPU-bound Python) under serve.py with 1, 2, 4... sync workers and drives
+each with the load harness. On a machine with N free cores throughput
+should grow close to linearly up to N workers, and flatten beyond that.
+The load clients need cores too, so leave some spare.
+
+    python bench_serve.py --workers 1,2,4 --scenario list_expenses
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+from local_supabase import JWT_SECRET
+from load_harness import Target, drive, free_port, print_report
+from serve import cpu_count
+from sqlite_backend import SQLiteDatabaseClient
+from synthetic_data import SCALES, load_sqlite
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_server(port, workers, threads, sqlite_path, worker_class="sync"):
+    """serve.py in a child process, once it answers /health"""
+    env = {**os.environ, "DATABASE_BACKEND": "sqlite", "SQLITE_PATH": sqlite_path,
+           "SUPABASE_JWT_SECRET": JWT_SECRET, "SUPABASE_JWT_ISSUER": ""}
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "serve.py"), "--app", "main", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--threads", str(threads), "--worker-class", worker_class,
+         "--max-requests", "0", "--log-level", "warning"],
+        env=env, cwd=HERE
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("serve.py did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of serve.py by worker count")
+    parser.add_argument("--workers", default="1,2,4", help="comma list of worker counts")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--worker-class", choices=("sync", "async"), default="sync")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--scenario", default="list_expenses")
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-serve-"), "expenses.db")
+    dataset = load_sqlite(SQLiteDatabaseClient(path), args.scale)
+
+    print(f"⚙️  serve.py scaling: main.py on SQLite ({args.scale}), {cpu_count()} cores available, "
+          f"{args.threads} threads per worker, {args.clients} client processes")
+    print("=" * 72)
+
+    baseline = None
+    for workers in [int(count) for count in args.workers.split(",")]:
+        port = free_port()
+        process = start_server(port, workers, args.threads, path, args.worker_class)
+        try:
+            target = Target(f"{workers} workers", f"http://127.0.0.1:{port}", process.terminate, "/api/expenses/{}")
+            drive(target, dataset, args.scenario, min(500, args.requests), args.concurrency, clients=args.clients)
+            report = drive(target, dataset, args.scenario, args.requests, args.concurrency, seed=1,
+                           clients=args.clients)
+        finally:
+            process.terminate()
+            process.wait()
+        baseline = baseline or report["throughput_rps"]
+        print(f"   {workers:>2} workers   x{report['throughput_rps'] / baseline:4.2f}", end="")
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
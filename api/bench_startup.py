@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: startup cost of each handler app
+
+For every variant, in fresh interpreters:
+- import: seconds to import the app through app_factory, and which heavy
+  dependencies that pulled in. The Supabase SDK and pydantic should only
+  load once a request needs them.
+- first request: seconds from launching serve.py until an authenticated
+  GET /api/groups answers (main.py on SQLite, so nothing leaves the machine)
+
+    python bench_startup.py
+    python bench_startup.py --runs 10 --json
+
+test_startup.py holds the app to IMPORT_BUDGET and FIRST_REQUEST_BUDGET.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+import app_factory
+from load_harness import free_port
+from local_supabase import JWT_SECRET, issue_token
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Generous ceilings: they catch an eager SDK import or a blocking call at import, not noise
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.0"))
+FIRST_REQUEST_BUDGET = float(os.getenv("STARTUP_FIRST_REQUEST_BUDGET", "3.0"))
+
+# Imported on first use, never at startup
+HEAVY_MODULES = ("supabase", "postgrest", "gotrue", "pydantic")
+
+_IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app_factory
+app_factory.create_app(sys.argv[1])
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+
+def local_env(sqlite_path=None):
+    """Environment that keeps the apps offline: SQLite storage and locally issued tokens"""
+    return {**os.environ, "DATABASE_BACKEND": "sqlite",
+            "SQLITE_PATH": sqlite_path or os.path.join(tempfile.mkdtemp(prefix="bench-startup-"), "expenses.db"),
+            "SUPABASE_JWT_SECRET": JWT_SECRET, "SUPABASE_JWT_ISSUER": ""}
+
+
+def import_time(variant, env=None):
+    """(seconds, heavy modules loaded) for importing the variant in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE, variant], env=env or local_env(), cwd=HERE,
+        capture_output=True, text=True, check=True
+    ).stdout
+    probe = json.loads(output.strip().splitlines()[-1])
+    heavy = [name for name in HEAVY_MODULES if name in probe["modules"]]
+    return probe["seconds"], heavy
+
+
+def time_to_first_request(env=None, timeout=30):
+    """Seconds from launching serve.py (main.py) until an authenticated list of groups comes back"""
+    port = free_port()
+    headers = {"Authorization": f"Bearer {issue_token('startup-user')}"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "serve.py"), "--app", "main", "--bind", f"127.0.0.1:{port}",
+         "--workers", "1", "--log-level", "warning"],
+        env=env or local_env(), cwd=HERE, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = requests.get(f"http://127.0.0.1:{port}/api/groups", headers=headers, timeout=timeout)
+                response.raise_for_status()
+                return time.perf_counter() - start
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        raise RuntimeError(f"serve.py did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time to first request for each app")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (best is reported)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = []
+    for variant in app_factory.VARIANTS:
+        imports = [import_time(variant) for _ in range(args.runs)]
+        report = {
+            "app": variant,
+            "import_s": round(min(seconds for seconds, _ in imports), 3),
+            "heavy_modules": imports[0][1],
+        }
+        if variant == "main":
+            report["first_request_s"] = round(min(time_to_first_request() for _ in range(args.runs)), 3)
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    print(f"⏱️  Startup (best of {args.runs}); budgets: import {IMPORT_BUDGET}s, first request {FIRST_REQUEST_BUDGET}s")
+    print("=" * 72)
+    for report in reports:
+        first = f"   first request {report['first_request_s']:6.3f} s" if "first_request_s" in report else ""
+        print(f"   {report['app']:<6} import {report['import_s']:6.3f} s{first}   "
+              f"heavy modules: {', '.join(report['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import os
 import json
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from supabase import create_client, Client
+from json_provider import FastJSONProvider
 from typing import Dict, Any, Optional
 import logging
 
@@ -38,23 +38,38 @@ class Config:
 # ================================
 def initialize_supabase():
     """Initialize and return Supabase client"""
+    from supabase import create_client
+
     try:
-        supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+        supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
         logger.info("✅ Supabase client initialized successfully")
         return supabase
     except Exception as e:
         logger.error(f"❌ Failed to initialize Supabase client: {e}")
         raise e
 
-# Global Supabase client
-supabase = initialize_supabase()
+# Global Supabase client, created on first use so a bad configuration fails requests rather than the import
+supabase = None
+
+
+def get_supabase():
+    global supabase
+    if supabase is None:
+        supabase = initialize_supabase()
+    return supabase
 
 # ================================
 # DATABASE OPERATIONS
 # ================================
 class GroupHandler:
-    def __init__(self, supabase_client):
-        self.client = supabase_client
+    def __init__(self, supabase_client=None):
+        self._client = supabase_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_supabase()
+        return self._client
     
     def create_group(self, group_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -110,12 +125,13 @@ class GroupHandler:
             return None
 
 # Initialize group handler
-group_handler = GroupHandler(supabase)
+group_handler = GroupHandler()
 
 # ================================
 # FLASK APPLICATION
 # ================================
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, origins=Config.CORS_ORIGINS)
 
 def get_current_user():
@@ -162,7 +178,7 @@ def test_connection():
     """Test Supabase connection"""
     try:
         # Try to fetch groups table structure
-        result = supabase.table("groups").select("id").limit(1).execute()
+        result = get_supabase().table("groups").select("id").limit(1).execute()
         return jsonify({
             "status": "success",
             "message": "Supabase connection working",
@@ -256,7 +272,7 @@ def test_connection():
     print("="*50)
     
     try:
-        result = supabase.table("groups").select("id,name").limit(5).execute()
+        result = get_supabase().table("groups").select("id,name").limit(5).execute()
         print(f"✅ Connection successful! Found {len(result.data)} groups")
         for group in result.data:
             print(f"   - {group}")
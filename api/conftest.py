@@ -0,0 +1,88 @@
+"""
+Shared pytest fixtures: a local Supabase stand-in and handler test clients wired to it
+"""
+
+import pytest
+
+from local_supabase import LocalSupabase, issue_token, JWT_SECRET
+from jwt_auth import TokenVerifier
+from resilience import Upstream, AsyncUpstream
+
+USER_ID = "f3ff68f5-a7d4-4358-8d9b-1e79ae59e9d4"
+
+
+@pytest.fixture
+def server():
+    with LocalSupabase() as server:
+        yield server
+
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {issue_token(USER_ID)}"}
+
+
+@pytest.fixture
+def fast_client(server, monkeypatch):
+    import fast_group_handler
+
+    client = fast_group_handler.FastSupabaseClient()
+    client.url = server.url
+    client.base_url = server.rest_url
+    monkeypatch.setattr(fast_group_handler, "supabase", client)
+    # Fresh breaker and latencies per test; hedges would add calls the call-count tests don't expect
+    monkeypatch.setattr(fast_group_handler, "upstream", Upstream(hedging=False))
+    monkeypatch.setattr(fast_group_handler, "token_verifier", TokenVerifier(secret=JWT_SECRET))
+    fast_group_handler.owned_groups.clear()
+    fast_group_handler.versions.clear()
+    fast_group_handler.expense_cache.clear()
+    fast_group_handler.rate_limiter.clear()
+    yield fast_group_handler.app.test_client()
+    fast_group_handler.owned_groups.clear()
+    fast_group_handler.versions.clear()
+    fast_group_handler.expense_cache.clear()
+    fast_group_handler.rate_limiter.clear()
+
+
+@pytest.fixture
+def main_client(server, monkeypatch):
+    import main
+    from supabase import create_client
+    from config import settings
+    from database import DatabaseClient
+
+    db_client = DatabaseClient(create_client(server.url, settings.SUPABASE_KEY))
+    monkeypatch.setattr(main, "db_client", db_client)
+    monkeypatch.setattr(main, "token_verifier", TokenVerifier(remote_verify=db_client.verify_user_token))
+    main.owned_groups.clear()
+    main.versions.clear()
+    main.expense_cache.clear()
+    main.rate_limiter.clear()
+    yield main.app.test_client()
+    main.owned_groups.clear()
+    main.versions.clear()
+    main.expense_cache.clear()
+    main.rate_limiter.clear()
+
+
+@pytest.fixture
+def async_client(server, monkeypatch):
+    import async_group_handler
+    from starlette.testclient import TestClient
+
+    client = async_group_handler.AsyncSupabaseClient()
+    client.url = server.url
+    client.base_url = server.rest_url
+    monkeypatch.setattr(async_group_handler, "supabase", client)
+    monkeypatch.setattr(async_group_handler, "upstream", AsyncUpstream(hedging=False))
+    monkeypatch.setattr(async_group_handler, "token_verifier", TokenVerifier(secret=JWT_SECRET))
+    async_group_handler.owned_groups.clear()
+    async_group_handler.versions.clear()
+    async_group_handler.expense_cache.clear()
+    async_group_handler.rate_limiter.clear()
+    with TestClient(async_group_handler.app) as test_client:
+        yield test_client
+    async_group_handler.owned_groups.clear()
+    async_group_handler.versions.clear()
+    async_group_handler.expense_cache.clear()
+    async_group_handler.rate_limiter.clear()
@@ -15,32 +15,146 @@
 
 
 import os
-from supabase import create_client, Client
-from typing import Dict, Any, List, Optional
+import logging
+import threading
+from money import to_cents, sum_cents
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Tuple
 from config import settings
+from pagination import keyset_params, split_page
+from streaming import iter_keyset_chunks
+from upstream_trace import instrument_httpx
 
-# Initialize Supabase client
-url: str = settings.SUPABASE_URL
-key: str = settings.SUPABASE_KEY
-supabase: Client = create_client(url, key)
+if TYPE_CHECKING:
+    # The supabase SDK (with httpx, postgrest and pydantic) takes longer to import than the rest of the app
+    # together, so it is only imported once a DatabaseClient is built
+    from supabase import Client
 
-class DatabaseClient:
-    def __init__(self):
-        self.client = supabase
+logger = logging.getLogger(__name__)
+
+# PostgREST answers this when db-aggregates-enabled is off
+AGGREGATES_DISABLED = "PGRST123"
+
+
+def _aggregates_disabled(error) -> bool:
+    """Whether a PostgREST error says aggregate functions are turned off, rather than that the call failed"""
+    message = (getattr(error, "message", None) or "").lower()
+    return getattr(error, "code", None) == AGGREGATES_DISABLED or "aggregate functions is not allowed" in message
+
+
+class DatabaseBackend:
+    """Storage interface the API is written against
+
+    DatabaseClient talks to Supabase over PostgREST; SQLiteDatabaseClient
+    (sqlite_backend.py) is an embedded local store. Both must pass
+    test_database_backends.py.
+    """
+
+    @property
+    def errors(self) -> Tuple[type, ...]:
+        """Exception types a call raises when the store fails or rejects it"""
+        raise NotImplementedError
+
+    def insert(self, table: str, data) -> List[Dict[Any, Any]]:
+        """Insert one row (dict) or many (list of dicts); returns the created rows"""
+        raise NotImplementedError
+
+    def delete(self, table: str, filters: Dict[str, Any], columns: str = "id") -> List[Dict[Any, Any]]:
+        """Delete the rows matching every filter; returns those columns of the deleted rows"""
+        raise NotImplementedError
+
+    def delete_group(self, group_id: int, user_id: str) -> List[Dict[Any, Any]]:
+        """Delete a group the user owns, with its expenses; empty if not found or not theirs"""
+        raise NotImplementedError
+
+    def select(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, order: str = None) -> List[Dict[Any, Any]]:
+        raise NotImplementedError
+
+    def select_page(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, limit: int = 50,
+                    after: Optional[Tuple[str, int]] = None, count: bool = False) -> Tuple[List[Dict[Any, Any]], Optional[str], Optional[int]]:
+        """One keyset page ordered newest first; returns (rows, next_cursor, total on the first page); errors propagate"""
+        raise NotImplementedError
+
+    def iter_chunks(self, table: str, columns: str = "*", filters: Dict[str, Any] = None) -> Iterator[List[Dict[Any, Any]]]:
+        """Every matching row in keyset-ordered chunks; errors propagate"""
+        raise NotImplementedError
+
+    def summarize_expenses(self, group_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """{group_id: {"expense_count", "total_cents"}} for every requested group"""
+        raise NotImplementedError
+
+    def verify_user_token(self, token: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class DatabaseClient(DatabaseBackend):
+    def __init__(self, client: Optional["Client"] = None):
+        if client is None:
+            from supabase import create_client
+            client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        self.client = client
+        # None until PostgREST tells us whether db-aggregates-enabled is on
+        self.aggregates_supported: Optional[bool] = None
+
+    @property
+    def errors(self) -> Tuple[type, ...]:
+        import httpx
+        from postgrest.exceptions import APIError
+        return APIError, httpx.HTTPError
+
+    def _table(self, table: str):
+        """Query builder for a table, on a PostgREST session that records its calls
+
+        supabase-py rebuilds the PostgREST client on auth events, so the hooks
+        are checked on every call rather than installed once.
+        """
+        instrument_httpx(self.client.postgrest.session)
+        return self.client.table(table)
 
     def insert(self, table: str, data: Dict[Any, Any]) -> List[Dict[Any, Any]]:
         """Insert data into a table"""
         try:
-            result = self.client.table(table).insert(data).execute()
+            result = self._table(table).insert(data).execute()
             return result.data if result.data else []
         except Exception as e:
             print(f"Database insert failed: {e}")
             raise e
 
+    def delete(self, table: str, filters: Dict[str, Any], columns: str = "id") -> List[Dict[Any, Any]]:
+        """Delete the rows matching every filter in one call and return them"""
+        try:
+            query = self._table(table).delete()
+            for key, value in filters.items():
+                query = query.eq(key, value)
+            # Only the listed columns of the deleted rows come back
+            query.params = query.params.add("select", columns)
+            result = query.execute()
+            return result.data if result.data else []
+        except Exception as e:
+            print(f"Database delete failed: {e}")
+            raise e
+
+    def delete_group(self, group_id: int, user_id: str) -> List[Dict[Any, Any]]:
+        """Delete a group the user owns; an empty result means not found or not theirs
+
+        Expenses go with the group through ON DELETE CASCADE. Without it the
+        filtered delete fails with a foreign key error, which also proves
+        ownership, so the expenses are cleared and the delete retried.
+        """
+        from postgrest.exceptions import APIError
+
+        filters = {"id": group_id, "created_by": user_id}
+        try:
+            return self.delete("groups", filters)
+        except APIError as e:
+            if e.code != "23503":
+                raise
+        self.delete("expenses", {"group_id": group_id})
+        return self.delete("groups", filters)
+
     def select(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, order: str = None) -> List[Dict[Any, Any]]:
         """Select data from a table"""
         try:
-            query = self.client.table(table).select(columns)
+            query = self._table(table).select(columns)
             
             if filters:
                 for key, value in filters.items():
@@ -62,10 +176,90 @@ class DatabaseClient:
             print(f"Database select failed: {e}")
             return []
 
+    def select_page(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, limit: int = 50,
+                    after: Optional[Tuple[str, int]] = None, count: bool = False) -> Tuple[List[Dict[Any, Any]], Optional[str], Optional[int]]:
+        """Select one keyset page ordered newest first; returns (rows, next_cursor, total)
+
+        With count=True the exact total is requested on the first page only, since
+        later pages are filtered past the cursor and PostgREST counts what remains.
+        Upstream errors propagate: a failed read must not look like an empty page.
+        """
+        try:
+            result = self._keyset_query(table, columns, filters, keyset_params(limit, after),
+                                        count="exact" if count and after is None else None)
+        except Exception as e:
+            logger.error(f"❌ Database select page failed: {e}")
+            raise
+        rows, next_cursor = split_page(result.data or [], limit)
+        return rows, next_cursor, result.count
+
+    def iter_chunks(self, table: str, columns: str = "*", filters: Dict[str, Any] = None) -> Iterator[List[Dict[Any, Any]]]:
+        """Yield every matching row in keyset-ordered chunks; upstream errors propagate"""
+        return iter_keyset_chunks(lambda params: self._keyset_query(table, columns, filters, params).data or [])
+
+    def _keyset_query(self, table: str, columns: str, filters: Optional[Dict[str, Any]], params: Dict[str, str], count: Optional[str] = None):
+        query = self._table(table).select(columns, count=count)
+
+        if filters:
+            for key, value in filters.items():
+                query = query.eq(key, value)
+
+        # postgrest-py has no builder for `or=` logic trees, so add the
+        # keyset params to the request directly
+        for key, value in params.items():
+            query.params = query.params.add(key, value)
+
+        return query.execute()
+
+    def summarize_expenses(self, group_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Expense count and total (in integer cents) per group, computed in a single upstream call"""
+        from postgrest.exceptions import APIError
+
+        summaries = {group_id: {"expense_count": 0, "total_cents": 0} for group_id in group_ids}
+        if not group_ids:
+            return summaries
+
+        try:
+            if self.aggregates_supported is not False:
+                try:
+                    result = (
+                        self._table("expenses")
+                        .select("group_id,expense_count:id.count(),total_amount:amount.sum()")
+                        .in_("group_id", group_ids)
+                        .execute()
+                    )
+                    self.aggregates_supported = True
+                    for row in result.data or []:
+                        summaries[row["group_id"]] = {
+                            "expense_count": row["expense_count"],
+                            "total_cents": to_cents(row["total_amount"])
+                        }
+                    return summaries
+                except APIError as e:
+                    if not _aggregates_disabled(e):
+                        # Not a configuration answer: summarize locally this once and ask again next time
+                        logger.warning(f"⚠️ Aggregate summary failed, summarizing locally: {e}")
+                    else:
+                        logger.info(f"ℹ️ PostgREST aggregates not enabled, summarizing locally from now on: {e}")
+                        self.aggregates_supported = False
+
+            # Fallback: fetch only the columns needed and aggregate here
+            result = self._table("expenses").select("group_id,amount").in_("group_id", group_ids).execute()
+            amounts = {group_id: [] for group_id in group_ids}
+            for row in result.data or []:
+                amounts[row["group_id"]].append(row["amount"])
+            for group_id, values in amounts.items():
+                summaries[group_id] = {"expense_count": len(values), "total_cents": sum_cents(values)}
+            return summaries
+        except Exception as e:
+            logger.error(f"❌ Database summarize failed: {e}")
+            return summaries
+
     def verify_user_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Verify JWT token with Supabase Auth"""
         try:
             # Get user from token using Supabase auth
+            instrument_httpx(self.client.auth._http_client)
             user_response = self.client.auth.get_user(token)
             if user_response.user:
                 user = user_response.user
@@ -82,5 +276,75 @@ class DatabaseClient:
             print(f"Error verifying token: {e}")
             return None
 
-# Global instance
-db_client = DatabaseClient() 
\ No newline at end of file
+def create_db_client(backend: Optional[str] = None) -> DatabaseBackend:
+    """The storage backend named by DATABASE_BACKEND (supabase or sqlite)"""
+    backend = (backend or settings.DATABASE_BACKEND).lower()
+    if backend == "supabase":
+        return DatabaseClient()
+    if backend == "sqlite":
+        from sqlite_backend import SQLiteDatabaseClient
+        return SQLiteDatabaseClient(settings.SQLITE_PATH)
+    raise ValueError(f"Unknown DATABASE_BACKEND: {backend}")
+
+
+
+class LazyDatabaseClient(DatabaseBackend):
+    """Stands in for the configured backend and builds it on first use
+
+    Importing the app stays cheap and never fails on storage settings: the
+    Supabase client (and the SDK import) or the SQLite file is only set up
+    when the first request needs it.
+    """
+
+    def __init__(self, factory=create_db_client):
+        self._factory = factory
+        self._backend: Optional[DatabaseBackend] = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> DatabaseBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._factory()
+        return self._backend
+
+    @property
+    def started(self) -> bool:
+        return self._backend is not None
+
+    def __getattr__(self, name):
+        # Only reached for what this class lacks: the backend's own methods and attributes
+        return getattr(self.backend, name)
+
+    @property
+    def errors(self):
+        return self.backend.errors
+
+    def insert(self, table, data):
+        return self.backend.insert(table, data)
+
+    def delete(self, table, filters, columns="id"):
+        return self.backend.delete(table, filters, columns)
+
+    def delete_group(self, group_id, user_id):
+        return self.backend.delete_group(group_id, user_id)
+
+    def select(self, table, columns="*", filters=None, order=None):
+        return self.backend.select(table, columns, filters, order)
+
+    def select_page(self, table, columns="*", filters=None, limit=50, after=None, count=False):
+        return self.backend.select_page(table, columns, filters, limit, after, count)
+
+    def iter_chunks(self, table, columns="*", filters=None):
+        return self.backend.iter_chunks(table, columns, filters)
+
+    def summarize_expenses(self, group_ids):
+        return self.backend.summarize_expenses(group_ids)
+
+    def verify_user_token(self, token):
+        return self.backend.verify_user_token(token)
+
+
+# Global instance, built on first use
+db_client = LazyDatabaseClient()
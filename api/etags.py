@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+ETags - Version counters for conditional GETs on listings
+
+Each user's group set and each group's expense list has a version that
+mutation endpoints bump. Listing ETags are derived from the version
+(plus the user and the query string), so a GET carrying a current
+If-None-Match can be answered 304 without calling upstream.
+
+Versions live in process memory, or in the shared cache (shared_cache.py)
+when one is configured, so that every worker issues and accepts the same
+ETags. Every key starts from a random nonce and is forgotten after ETAG_TTL
+seconds, so ETags issued before a write made outside this API stop matching
+within that window.
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+ETAG_TTL = float(os.getenv("ETAG_TTL", "30"))
+ETAG_MAX_KEYS = int(os.getenv("ETAG_MAX_KEYS", "100000"))
+
+CACHE_CONTROL = "private, no-cache"
+
+logger = logging.getLogger(__name__)
+
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+def group_key(group_id):
+    return f"group:{group_id}"
+
+
+def etag_headers(etag):
+    """Headers for a 200 or 304 listing response"""
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+class VersionStore:
+    """Thread-safe LRU of key -> (nonce, counter, expires_at), or versions in a shared backend"""
+
+    def __init__(self, ttl=ETAG_TTL, max_keys=ETAG_MAX_KEYS, clock=time.monotonic, shared=None):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.shared = shared
+        self._clock = clock
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        # Conditional requests whose ETag was stale, i.e. cache misses
+        self.modified = 0
+
+    def _entry(self, key):
+        now = self._clock()
+        entry = self._versions.get(key)
+        if entry is None or entry[2] <= now:
+            entry = (uuid.uuid4().hex[:12], 0, now + self.ttl)
+            self._versions[key] = entry
+            while len(self._versions) > self.max_keys:
+                self._versions.popitem(last=False)
+        self._versions.move_to_end(key)
+        return entry
+
+    def current(self, key):
+        """Opaque version string for a key"""
+        if self.shared is not None:
+            return self._shared_current(key)
+        with self._lock:
+            nonce, counter, _ = self._entry(key)
+            return f"{nonce}.{counter}"
+
+    def bump(self, *keys):
+        """Invalidate every ETag derived from these keys"""
+        if self.shared is not None:
+            for key in keys:
+                try:
+                    self.shared.set(f"etag:{key}", uuid.uuid4().hex[:12], self.ttl)
+                except Exception as e:
+                    logger.error(f"❌ Bumping shared ETag version {key} failed: {e}")
+            return
+        with self._lock:
+            for key in keys:
+                nonce, counter, expires_at = self._entry(key)
+                self._versions[key] = (nonce, counter + 1, expires_at)
+
+    def _shared_current(self, key):
+        try:
+            version = self.shared.get(f"etag:{key}")
+            if version is None:
+                version = uuid.uuid4().hex[:12]
+                # Another worker may have created it first
+                if not self.shared.set(f"etag:{key}", version, self.ttl, only_if_absent=True):
+                    version = self.shared.get(f"etag:{key}") or version
+            return version
+        except Exception as e:
+            logger.warning(f"⚠️ Reading shared ETag version {key} failed: {e}")
+            # Matches nothing, so the request is answered in full
+            return uuid.uuid4().hex
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._versions),
+                "shared": self.shared is not None,
+                "ttl_seconds": self.ttl,
+                "not_modified": self.not_modified,
+                "modified": self.modified
+            }
+
+    def etag(self, keys, user_id, args):
+        """Weak ETag for a listing built from these keys, for this user and query"""
+        parts = [self.current(key) for key in keys]
+        parts.append(str(user_id))
+        parts.extend(f"{name}={value}" for name, value in sorted(args.items()))
+        digest = hashlib.sha1("\n".join(parts).encode()).hexdigest()[:20]
+        return f'W/"{digest}"'
+
+    def matches(self, if_none_match, etag):
+        """Weak comparison against an If-None-Match header value"""
+        if not if_none_match:
+            return False
+        opaque = etag[2:]
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate == "*" or candidate.removeprefix("W/") == opaque:
+                with self._lock:
+                    self.not_modified += 1
+                return True
+        with self._lock:
+            self.modified += 1
+        return False
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Expense Cache - Byte-budgeted LRU of whole per-group expense lists
+
+A group's expenses only change through our own endpoints, so listings are
+read through this cache: the first read of a group fetches all of it (up to
+EXPENSE_CACHE_MAX_ROWS rows) in one upstream call, and later pages, counts
+and totals are served from memory. Creates and deletes update the cached
+list in place; deleting a group drops it.
+
+- Memory is bounded by EXPENSE_CACHE_BYTES, estimated per row from its JSON
+  size plus CPython's per-row overhead; least recently used groups go first
+- Groups larger than EXPENSE_CACHE_MAX_ROWS are remembered as too large and
+  keep using page + summary queries
+- A fill started before a write to the same group is not stored, so a slow
+  read can never overwrite a newer write
+- Entries expire after EXPENSE_CACHE_TTL seconds; without a shared cache
+  (shared_cache.py) that bounds how long writes made by another worker
+  process can go unseen
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from json_provider import dumps_bytes
+from money import to_cents, sum_cents
+from pagination import split_page
+
+EXPENSE_CACHE_BYTES = int(os.getenv("EXPENSE_CACHE_BYTES", str(64 * 1024 * 1024)))
+EXPENSE_CACHE_MAX_ROWS = int(os.getenv("EXPENSE_CACHE_MAX_ROWS", "2000"))
+EXPENSE_CACHE_TTL = float(os.getenv("EXPENSE_CACHE_TTL", "30"))
+
+# Measured: a 7-column expense row costs about 500 bytes more as Python objects than as JSON
+ROW_OVERHEAD = 500
+# Groups whose rows are not tracked individually (too large) still cost their entry
+MARKER_SIZE = 200
+# Groups whose last write is remembered, for rejecting stale fills
+MAX_TRACKED_WRITES = 10000
+
+
+def _key(row):
+    return row["created_at"], row["id"]
+
+
+def _size(rows):
+    return len(dumps_bytes(rows)) + ROW_OVERHEAD * len(rows) if rows else 0
+
+
+class CachedExpenses:
+    """One group's expenses, oldest first; rows is None for a group too large to cache
+
+    Never modified once stored; writes swap in a new entry, so a reader
+    paging through one never sees a half-applied write.
+    """
+
+    __slots__ = ("rows", "total_cents", "size", "expires_at")
+
+    def __init__(self, rows, expires_at):
+        self.rows = None if rows is None else sorted(rows, key=_key)
+        self.total_cents = 0 if rows is None else sum_cents([row.get("amount") for row in rows])
+        self.size = MARKER_SIZE if rows is None else MARKER_SIZE + _size(rows)
+        self.expires_at = expires_at
+
+    def _replaced(self, rows, cents_delta, size_delta):
+        entry = CachedExpenses.__new__(CachedExpenses)
+        entry.rows = rows
+        entry.total_cents = self.total_cents + cents_delta
+        entry.size = self.size + size_delta
+        entry.expires_at = self.expires_at
+        return entry
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def page(self, limit, after=None):
+        """(rows newest first, next_cursor), exactly like a keyset page from upstream"""
+        end = len(self.rows) if after is None else bisect_left(self.rows, tuple(after), key=_key)
+        start = max(0, end - limit - 1)
+        return split_page(self.rows[start:end][::-1], limit)
+
+
+class ExpenseCache:
+    """Thread-safe LRU of group_id -> CachedExpenses within a byte budget"""
+
+    def __init__(self, max_bytes=EXPENSE_CACHE_BYTES, max_rows=EXPENSE_CACHE_MAX_ROWS, ttl=EXPENSE_CACHE_TTL,
+                 clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.too_large = 0
+        # Write epochs, so fills can tell whether a write raced them
+        self._epoch = 0
+        self._last_write = OrderedDict()
+        self._forgotten_writes = 0
+
+    # ----- reads -----
+    def get(self, group_id):
+        """The group's entry (possibly a too-large marker), or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is None or entry.expires_at <= self._clock():
+                if entry is not None:
+                    self._drop(group_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(group_id)
+            if entry.rows is None:
+                self.too_large += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def epoch(self):
+        """Take before fetching a group; pass to fill()"""
+        with self._lock:
+            return self._epoch
+
+    def fill(self, group_id, rows, epoch, complete=True):
+        """Store a freshly read group and return its entry
+
+        complete=False means the group has more than max_rows rows; only a
+        too-large marker is kept. The entry is still returned when a write
+        since `epoch` means it must not be stored.
+        """
+        entry = CachedExpenses(rows if complete and len(rows) <= self.max_rows else None,
+                               self._clock() + self.ttl)
+        if entry.rows is not None and entry.size > self.max_bytes // 8:
+            entry = CachedExpenses(None, entry.expires_at)
+        with self._lock:
+            # Writes after epoch() was taken have a larger epoch
+            last_write = max(self._last_write.get(group_id, 0), self._forgotten_writes)
+            if last_write <= epoch:
+                self._store(group_id, entry)
+        return entry
+
+    # ----- writes -----
+    def add(self, group_id, rows):
+        """Write-through for created expenses; None (outcome unknown) drops the group"""
+        if rows is None:
+            self.invalidate(group_id)
+            return
+        with self._lock:
+            self._record_write(group_id)
+            entry = self._entries.get(group_id)
+            if entry is None or entry.rows is None or not rows:
+                return
+            if len(entry.rows) + len(rows) > self.max_rows:
+                self._store(group_id, CachedExpenses(None, entry.expires_at))
+                return
+            merged = list(entry.rows)
+            for row in rows:
+                insort(merged, row, key=_key)
+            cents = sum(to_cents(row.get("amount")) for row in rows)
+            self._store(group_id, entry._replaced(merged, cents, _size(rows)))
+
+    def discard(self, group_id, expense_ids):
+        """Write-through for deleted expenses"""
+        expense_ids = set(expense_ids)
+        with self._lock:
+            self._record_write(group_id)
+            entry = self._entries.get(group_id)
+            if entry is None or entry.rows is None:
+                return
+            removed = [row for row in entry.rows if row["id"] in expense_ids]
+            if not removed:
+                return
+            kept = [row for row in entry.rows if row["id"] not in expense_ids]
+            cents = sum(to_cents(row.get("amount")) for row in removed)
+            self._store(group_id, entry._replaced(kept, -cents, -_size(removed)))
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._record_write(group_id)
+            if group_id in self._entries:
+                self._drop(group_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            # Fills already in flight must not repopulate the cache
+            self._epoch += 1
+            self._forgotten_writes = self._epoch
+
+    def stats(self):
+        with self._lock:
+            return {
+                "groups": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "max_rows": self.max_rows,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "too_large": self.too_large,
+                "evictions": self.evictions
+            }
+
+    # ----- internals, called with the lock held -----
+    def _record_write(self, group_id):
+        self._epoch += 1
+        self._last_write[group_id] = self._epoch
+        self._last_write.move_to_end(group_id)
+        while len(self._last_write) > MAX_TRACKED_WRITES:
+            _, forgotten = self._last_write.popitem(last=False)
+            self._forgotten_writes = max(self._forgotten_writes, forgotten)
+
+    def _store(self, group_id, entry):
+        if group_id in self._entries:
+            self._drop(group_id)
+        self._entries[group_id] = entry
+        self.bytes += entry.size
+        self._evict()
+
+    def _drop(self, group_id):
+        self.bytes -= self._entries.pop(group_id).size
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
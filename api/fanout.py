@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Fan-out - A request's independent upstream calls, made side by side
+
+    group, rows = in_parallel(
+        lambda: supabase.get_group_fast(group_id, user_id, token),
+        lambda: supabase.fetch_expenses_chunk_fast(group_id, token, params)
+    )
+
+The first call runs on the request's own thread and the others on a
+shared pool, so the request waits for the slowest call rather than their
+sum. Each call runs in a copy of the request's context, so upstream_trace
+still counts it against the request. The Flask handlers use this; the
+async handler gets the same from asyncio.gather().
+"""
+
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by every request in the worker; calls beyond this queue up
+FANOUT_THREADS = int(os.getenv("FANOUT_THREADS", "16"))
+
+# Threads start on first use, so a pre-fork master that never fans out forks none
+_pool = ThreadPoolExecutor(max_workers=FANOUT_THREADS, thread_name_prefix="fanout")
+
+
+def in_parallel(first, *rest):
+    """Each call's result, in order; an error raised by a call is raised here"""
+    futures = [_pool.submit(contextvars.copy_context().run, call) for call in rest]
+    results = [first()]
+    results.extend(future.result() for future in futures)
+    return results
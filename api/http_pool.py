@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+HTTP Pool - Shared keep-alive connection pool for upstream Supabase calls
+
+Every handler routes its REST/auth calls through one requests.Session per
+worker process, so TCP+TLS handshakes are paid once per connection instead
+of once per call.
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
+
+from upstream_trace import TracedSession
+
+# ================================
+# CONFIGURATION
+# ================================
+# Distinct upstream hosts kept in the pool (Supabase REST + auth share one host)
+POOL_CONNECTIONS = int(os.getenv("UPSTREAM_POOL_CONNECTIONS", "4"))
+# Keep-alive connections kept per host, per worker process
+POOL_MAXSIZE = int(os.getenv("UPSTREAM_POOL_MAXSIZE", "32"))
+# Block instead of opening throwaway connections once the pool is exhausted
+POOL_BLOCK = os.getenv("UPSTREAM_POOL_BLOCK", "false").lower() == "true"
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_adapter = None
+
+
+def _build_session(pool_connections, pool_maxsize, pool_block):
+    """Build a session whose adapter keeps connections alive between calls"""
+    global _adapter
+
+    # Every call through the pool is counted against the request that made it
+    session = TracedSession()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # The session is shared by every request thread, so never let one
+    # user's response cookies leak into another user's upstream call
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    _adapter = adapter
+    return session
+
+
+def get_session():
+    """Return this worker's shared session, rebuilding it after a fork"""
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            # Sockets inherited from a parent process must never be reused
+            if _session is None or _session_pid != pid:
+                _session = _build_session(POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK)
+                _session_pid = pid
+    return _session
+
+
+def configure(pool_connections=None, pool_maxsize=None, pool_block=None):
+    """Resize the pool for this worker; existing connections are closed"""
+    global POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, _session, _session_pid
+
+    with _lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if pool_block is not None:
+            POOL_BLOCK = pool_block
+
+        if _session is not None:
+            _session.close()
+        _session = _build_session(POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK)
+        _session_pid = os.getpid()
+    return _session
+
+
+def pool_stats():
+    """Connection reuse stats for this worker's pool"""
+    stats = {
+        "pid": os.getpid(),
+        "pool_connections": POOL_CONNECTIONS,
+        "pool_maxsize": POOL_MAXSIZE,
+        "pool_block": POOL_BLOCK,
+        "requests": 0,
+        "connections_opened": 0,
+        "idle_connections": 0,
+        "hosts": []
+    }
+
+    if _adapter is None or _session_pid != os.getpid():
+        return stats
+
+    pools = _adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+
+        # Free slots are None placeholders; real idle sockets are the rest
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+
+        stats["requests"] += pool.num_requests
+        stats["connections_opened"] += pool.num_connections
+        stats["idle_connections"] += idle
+        stats["hosts"].append({
+            "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+            "requests": pool.num_requests,
+            "connections_opened": pool.num_connections,
+            "idle_connections": idle
+        })
+
+    if stats["requests"]:
+        stats["reuse_ratio"] = round(1 - stats["connections_opened"] / stats["requests"], 4)
+    else:
+        stats["reuse_ratio"] = 0.0
+    return stats
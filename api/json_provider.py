@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+JSON Provider - Fast JSON encoding for every handler
+
+Flask 2.3 ignores `app.json_encoder`; JSON goes through `app.json`, a
+JSONProvider. FastJSONProvider serializes with orjson when it is installed
+(stdlib json otherwise) and handles Decimal, datetime/date and UUID
+directly, so `total_amount` sums and database timestamps need no
+per-handler conversion.
+
+RawJSON wraps an upstream body that is returned unmodified: jsonify()
+sends its bytes as they are instead of parsing and re-serializing them.
+"""
+
+import json
+import uuid
+import datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MIMETYPE = "application/json"
+
+
+def _default(obj):
+    """Types neither encoder serializes on its own (orjson already does datetime and UUID)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, RawJSON):
+        return obj.data
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RawJSON:
+    """An upstream JSON body to pass through byte for byte"""
+
+    __slots__ = ("body", "_data")
+
+    def __init__(self, body):
+        self.body = body
+        self._data = None
+
+    @property
+    def data(self):
+        """The decoded body, parsed on first use"""
+        if self._data is None:
+            self._data = loads(self.body)
+        return self._data
+
+
+def dumps_bytes(obj):
+    """Serialize to compact UTF-8 JSON bytes"""
+    if isinstance(obj, RawJSON):
+        return obj.body
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _fast_json_provider():
+    from flask.json.provider import JSONProvider
+
+    class FastJSONProvider(JSONProvider):
+        """Flask JSON provider backed by dumps_bytes()/loads()"""
+
+        mimetype = MIMETYPE
+
+        def dumps(self, obj, **kwargs):
+            return dumps_bytes(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+    return FastJSONProvider
+
+
+def __getattr__(name):
+    # FastJSONProvider subclasses Flask's provider, so it is defined on first import of the name:
+    # the async app and the caches use dumps_bytes() without loading Flask
+    if name == "FastJSONProvider":
+        globals()[name] = provider = _fast_json_provider()
+        return provider
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
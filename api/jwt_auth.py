@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+JWT Auth - Local verification of Supabase access tokens
+
+Checks the token signature locally (HS256 project secret, or RS256/ES256
+keys from a local JWKS file), validates exp/nbf/aud/iss, and caches the
+verified user until the token expires. Falls back to a remote verifier
+(the /auth/v1/user call) only when no local key material is configured.
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+JWT_LEEWAY = int(os.getenv("SUPABASE_JWT_LEEWAY", "30"))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+# Remotely verified tokens are re-checked this often, so sign-outs propagate
+REMOTE_VERIFY_TTL = int(os.getenv("REMOTE_VERIFY_TTL", "60"))
+
+
+class TokenError(Exception):
+    """Raised when a token fails verification"""
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64int(segment):
+    return int.from_bytes(_b64decode(segment), "big")
+
+
+def decode_unverified(token):
+    """Split a JWT into (header, claims, signing_input, signature) without checking it"""
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature_segment)
+    except (ValueError, TypeError) as e:
+        raise TokenError(f"malformed token: {e}")
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenError("malformed token")
+    return header, claims, f"{header_segment}.{payload_segment}".encode(), signature
+
+
+def load_jwks(path):
+    """Load public keys from a JWKS file into {kid: (alg, key)}; needs `cryptography`"""
+    try:
+        from cryptography.hazmat.primitives.asymmetric import rsa, ec
+    except ImportError:
+        raise RuntimeError("SUPABASE_JWKS_PATH is set but the `cryptography` package is not installed")
+
+    with open(path) as f:
+        document = json.load(f)
+
+    curves = {"P-256": (ec.SECP256R1(), "ES256"), "P-384": (ec.SECP384R1(), "ES384")}
+    keys = {}
+    for jwk in document.get("keys", []):
+        if jwk.get("use", "sig") != "sig":
+            continue
+        if jwk["kty"] == "RSA":
+            key = rsa.RSAPublicNumbers(_b64int(jwk["e"]), _b64int(jwk["n"])).public_key()
+            keys[jwk.get("kid")] = (jwk.get("alg", "RS256"), key)
+        elif jwk["kty"] == "EC" and jwk.get("crv") in curves:
+            curve, alg = curves[jwk["crv"]]
+            key = ec.EllipticCurvePublicNumbers(_b64int(jwk["x"]), _b64int(jwk["y"]), curve).public_key()
+            keys[jwk.get("kid")] = (jwk.get("alg", alg), key)
+    return keys
+
+
+def _verify_asymmetric(alg, key, signing_input, signature):
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, ec
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+    digest = hashes.SHA256() if alg.endswith("256") else hashes.SHA384()
+    try:
+        if alg.startswith("RS"):
+            key.verify(signature, signing_input, padding.PKCS1v15(), digest)
+        else:
+            # JWS carries ECDSA signatures as raw r||s, cryptography wants DER
+            half = len(signature) // 2
+            der = encode_dss_signature(int.from_bytes(signature[:half], "big"),
+                                       int.from_bytes(signature[half:], "big"))
+            key.verify(der, signing_input, ec.ECDSA(digest))
+    except InvalidSignature:
+        raise TokenError("invalid signature")
+
+
+class TokenVerifier:
+    """Verifies access tokens and caches the resulting user by token hash"""
+
+    def __init__(self, secret=None, jwks_path=None, audience="authenticated", issuer=None,
+                 leeway=JWT_LEEWAY, cache_size=VERIFIED_TOKEN_CACHE_SIZE,
+                 remote_verify=None, remote_ttl=REMOTE_VERIFY_TTL, clock=time.time):
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+        self.keys = load_jwks(jwks_path) if jwks_path else {}
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.cache_size = cache_size
+        self.remote_verify = remote_verify
+        self.remote_ttl = remote_ttl
+        self._clock = clock
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def verifies_locally(self):
+        return bool(self.secret or self.keys)
+
+    # ----- cache -----
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= self._clock():
+                del self._cache[key]
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _store(self, key, expires_at, user):
+        with self._lock:
+            self._cache[key] = (expires_at, user)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ----- verification -----
+    def verify(self, token):
+        """Return the user for a valid token, or None"""
+        key, user = self._lookup(token)
+        if user is not None or key is None:
+            return user
+        if self.verifies_locally or self.remote_verify is None:
+            return self._verify_locally(key, token)
+        return self._accept_remote(key, token, self.remote_verify(token))
+
+    def verify_offline(self, token):
+        """The user for a token when that needs no remote call (verified locally, or cached), else None"""
+        key, user = self._lookup(token)
+        if user is not None or key is None or not self.verifies_locally:
+            return user
+        return self._verify_locally(key, token)
+
+    async def verify_async(self, token, remote_verify=None):
+        """Like verify(), but awaits an async remote verifier so the event loop never blocks"""
+        key, user = self._lookup(token)
+        if user is not None or key is None:
+            return user
+        if self.verifies_locally or remote_verify is None:
+            return self._verify_locally(key, token)
+        return self._accept_remote(key, token, await remote_verify(token))
+
+    def _lookup(self, token):
+        if not token:
+            return None, None
+        key = hashlib.sha256(token.encode()).hexdigest()
+        return key, self._cached(key)
+
+    def _verify_locally(self, key, token):
+        if not self.verifies_locally:
+            logger.error("No JWT secret, JWKS or remote verifier configured")
+            return None
+        try:
+            claims = self.verify_claims(token)
+        except TokenError as e:
+            logger.warning(f"Token rejected: {e}")
+            return None
+        if not claims.get("sub"):
+            return None
+
+        user = {
+            "id": claims["sub"],
+            "email": claims.get("email"),
+            "user_metadata": claims.get("user_metadata") or {},
+            "exp": claims["exp"]
+        }
+        self._store(key, claims["exp"], user)
+        return user
+
+    def _accept_remote(self, key, token, user):
+        if not user or not user.get("id"):
+            return None
+        try:
+            _, claims, _, _ = decode_unverified(token)
+        except TokenError:
+            return None
+        # Checked as verify_claims() does, so an odd claim is a rejected token rather than a 500
+        if not isinstance(claims.get("exp"), (int, float)):
+            logger.warning("Token rejected: missing exp")
+            return None
+        expires_at = min(claims["exp"], self._clock() + self.remote_ttl)
+        self._store(key, expires_at, user)
+        return user
+
+    def verify_claims(self, token):
+        """Check signature and registered claims; raises TokenError"""
+        header, claims, signing_input, signature = decode_unverified(token)
+        alg = header.get("alg")
+
+        if alg == "HS256" and self.secret:
+            expected = hmac.new(self.secret, signing_input, hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise TokenError("invalid signature")
+        elif alg in ("RS256", "RS384", "ES256", "ES384") and self.keys:
+            entry = self.keys.get(header.get("kid"))
+            if entry is None and len(self.keys) == 1 and header.get("kid") is None:
+                entry = next(iter(self.keys.values()))
+            if entry is None or entry[0] != alg:
+                raise TokenError("unknown signing key")
+            _verify_asymmetric(alg, entry[1], signing_input, signature)
+        else:
+            raise TokenError(f"unsupported algorithm: {alg}")
+
+        now = self._clock()
+        if not isinstance(claims.get("exp"), (int, float)):
+            raise TokenError("missing exp")
+        if claims["exp"] + self.leeway < now:
+            raise TokenError("token expired")
+        if isinstance(claims.get("nbf"), (int, float)) and claims["nbf"] - self.leeway > now:
+            raise TokenError("token not yet valid")
+
+        if self.audience:
+            audience = claims.get("aud")
+            audiences = audience if isinstance(audience, list) else [audience]
+            if self.audience not in audiences:
+                raise TokenError("invalid audience")
+        if self.issuer and claims.get("iss") != self.issuer:
+            raise TokenError("invalid issuer")
+        return claims
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": "local" if self.verifies_locally else "remote",
+                "cached_tokens": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def verifier_from_env(supabase_url, remote_verify=None):
+    """Build a verifier from SUPABASE_JWT_SECRET / SUPABASE_JWKS_PATH"""
+    return TokenVerifier(
+        secret=os.getenv("SUPABASE_JWT_SECRET") or None,
+        jwks_path=os.getenv("SUPABASE_JWKS_PATH") or None,
+        audience=os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated"),
+        issuer=os.getenv("SUPABASE_JWT_ISSUER", f"{supabase_url}/auth/v1"),
+        remote_verify=remote_verify
+    )
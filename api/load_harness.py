@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Load Harness - Offline end-to-end load tests for every handler app
+
+Starts the local Supabase stand-in (with optional latency, jitter and error
+injection), fills it with synthetic data, serves one of the handler apps on
+a local port and drives it with concurrent HTTP clients. Each scenario
+reports throughput and p50/p95/p99 latency. Nothing leaves the machine.
+
+    python load_harness.py --target fast --scale small --scenario all
+    python load_harness.py --target async --latency-ms 50 --jitter-ms 20 --error-rate 0.01
+    python load_harness.py --target main-sqlite --scale large --scenario list_expenses
+
+Targets: fast, async, main (main.py on the stand-in), main-sqlite (main.py
+on the SQLite backend).
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from collections import Counter
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from serve import PooledWSGIServer
+from jwt_auth import TokenVerifier
+from local_supabase import LocalSupabase, issue_token, JWT_SECRET
+from synthetic_data import SCALES, load_stand_in, load_sqlite
+
+TARGETS = ("fast", "async", "main", "main-sqlite")
+
+
+# ================================
+# SERVING THE APP UNDER TEST
+# ================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(app, threads=8):
+    """Serve a Flask app in the background; returns (base_url, stop)"""
+    port = free_port()
+    server = PooledWSGIServer("127.0.0.1", port, app, threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}", server.shutdown
+
+
+def serve_asgi(app):
+    """Serve an ASGI app on a uvicorn event loop in the background; returns (base_url, stop)"""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{port}", stop
+
+
+class Target:
+    """A handler app wired to local storage and listening on a port"""
+
+    def __init__(self, name, base_url, stop, expenses_path):
+        self.name = name
+        self.base_url = base_url
+        self.stop = stop
+        # Listing/creating expenses is /api/groups/{id}/expenses except in main.py
+        self.expenses_path = expenses_path
+
+
+def start_target(name, server=None, db=None, threads=8, rate_limit=False):
+    """Point a handler module at the stand-in (or SQLite db) and serve it
+
+    A few synthetic users send every request, so the per-user rate limit is
+    lifted unless rate_limit is set.
+    """
+    verifier = TokenVerifier(secret=JWT_SECRET)
+
+    if name in ("fast", "async"):
+        module = __import__(f"{name}_group_handler")
+        client = module.FastSupabaseClient() if name == "fast" else module.AsyncSupabaseClient()
+        client.url, client.base_url = server.url, server.rest_url
+        module.supabase = client
+        module.token_verifier = verifier
+        module.owned_groups.clear()
+        module.versions.clear()
+        module.rate_limiter.clear()
+        module.rate_limiter.enabled = rate_limit
+        base_url, stop = serve_wsgi(module.app, threads) if name == "fast" else serve_asgi(module.app)
+        return Target(name, base_url, stop, "/api/groups/{}/expenses")
+
+    if name in ("main", "main-sqlite"):
+        import main
+        if name == "main":
+            from supabase import create_client
+            from config import settings
+            from database import DatabaseClient
+            main.db_client = DatabaseClient(create_client(server.url, settings.SUPABASE_KEY))
+        else:
+            main.db_client = db
+        main.token_verifier = verifier
+        main.owned_groups.clear()
+        main.versions.clear()
+        main.rate_limiter.clear()
+        main.rate_limiter.enabled = rate_limit
+        base_url, stop = serve_wsgi(main.app, threads)
+        return Target(name, base_url, stop, "/api/expenses/{}")
+
+    raise ValueError(f"Unknown target: {name} (choose from {', '.join(TARGETS)})")
+
+
+# ================================
+# SCENARIOS
+# ================================
+# Each scenario turns (rng, dataset, target) into (user, method, path, json body)
+
+def _owner(rng, dataset):
+    user = rng.choice(dataset.users)
+    while not dataset.groups_by_user.get(user):
+        user = rng.choice(dataset.users)
+    return user, rng.choice(dataset.groups_by_user[user])
+
+
+def list_groups(rng, dataset, target):
+    return rng.choice(dataset.users), "GET", "/api/groups", None
+
+
+def list_expenses(rng, dataset, target):
+    user, group_id = _owner(rng, dataset)
+    return user, "GET", target.expenses_path.format(group_id), None
+
+
+def export_expenses(rng, dataset, target):
+    user, group_id = _owner(rng, dataset)
+    return user, "GET", target.expenses_path.format(group_id) + "?stream=1", None
+
+
+def create_expense(rng, dataset, target):
+    user, group_id = _owner(rng, dataset)
+    body = {"description": "Load test", "amount": rng.randrange(100, 10_000) / 100}
+    return user, "POST", target.expenses_path.format(group_id), body
+
+
+def batch_ingest(rng, dataset, target):
+    user, group_id = _owner(rng, dataset)
+    body = [{"description": f"Batch {i}", "amount": rng.randrange(100, 10_000) / 100} for i in range(50)]
+    return user, "POST", f"/api/groups/{group_id}/expenses:batch", body
+
+
+MIXED_WEIGHTS = ((list_expenses, 60), (list_groups, 25), (create_expense, 10), (batch_ingest, 5))
+
+
+def mixed(rng, dataset, target):
+    scenario = rng.choices([fn for fn, _ in MIXED_WEIGHTS], weights=[weight for _, weight in MIXED_WEIGHTS])[0]
+    return scenario(rng, dataset, target)
+
+
+SCENARIOS = {
+    "list_groups": list_groups,
+    "list_expenses": list_expenses,
+    "export": export_expenses,
+    "create_expense": create_expense,
+    "batch_ingest": batch_ingest,
+    "mixed": mixed,
+}
+
+
+# ================================
+# DRIVER AND REPORTING
+# ================================
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def build_plan(target, dataset, scenario, requests=1000, seed=0):
+    """The scenario's requests as (user, method, path, body), decided up front so runs are repeatable"""
+    rng = random.Random(f"{scenario}:{seed}")
+    build = SCENARIOS[scenario]
+    return [build(rng, dataset, target) for _ in range(requests)]
+
+
+async def fire(base_url, plan, concurrency=50):
+    """Send the plan over `concurrency` keep-alive connections; returns (elapsed, latencies, statuses)"""
+    tokens = {}
+    latencies, statuses = [], Counter()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        queue = iter(plan)
+
+        async def worker():
+            for user, method, path, body in queue:
+                if user not in tokens:
+                    tokens[user] = issue_token(user)
+                headers = {"Authorization": f"Bearer {tokens[user]}"}
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, json=body)
+                    await response.aread()
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start, latencies, statuses
+
+
+def measure(base_url, plan, concurrency=50):
+    return asyncio.run(fire(base_url, plan, concurrency))
+
+
+def drive(target, dataset, scenario, requests=1000, concurrency=50, seed=0, clients=1):
+    """Run one scenario; returns its report dict
+
+    The clients run in forked processes so they do not compete with the app
+    and the stand-in for this process's GIL. With clients > 1 the plan and
+    the connections are split between that many processes, for servers
+    that outrun a single client process.
+    """
+    plan = build_plan(target, dataset, scenario, requests, seed)
+    with ProcessPoolExecutor(max_workers=clients, mp_context=multiprocessing.get_context("fork")) as pool:
+        parts = [pool.submit(measure, target.base_url, plan[i::clients], max(1, concurrency // clients))
+                 for i in range(clients)]
+        results = [part.result() for part in parts]
+
+    elapsed = max(result[0] for result in results)
+    latencies = [latency for result in results for latency in result[1]]
+    statuses = sum((result[2] for result in results), Counter())
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+    return {
+        "target": target.name,
+        "scenario": scenario,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    }
+
+
+def print_report(report):
+    print(f"   {report['scenario']:<15} {report['throughput_rps']:8.1f} req/s   "
+          f"p50 {report['p50_ms']:7.1f} ms   p95 {report['p95_ms']:7.1f} ms   p99 {report['p99_ms']:7.1f} ms   "
+          f"errors {report['errors']}   {report['statuses']}")
+
+
+def run(target="fast", scale="tiny", scenarios=("mixed",), requests=1000, concurrency=50, latency=0.0,
+        jitter=0.0, error_rate=0.0, seed=0, threads=8, sqlite_path=None, rate_limit=False, quiet=False):
+    """Set everything up, run the scenarios in order and return their reports"""
+    say = (lambda *args: None) if quiet else print
+
+    with LocalSupabase(seed=seed) as server:
+        db = None
+        start = time.perf_counter()
+        if target == "main-sqlite":
+            from sqlite_backend import SQLiteDatabaseClient
+            path = sqlite_path or os.path.join(tempfile.mkdtemp(prefix="load-harness-"), "expenses.db")
+            db = SQLiteDatabaseClient(path)
+            dataset = load_sqlite(db, scale, seed)
+        else:
+            dataset = load_stand_in(server, scale, seed)
+        say(f"📦 Loaded {len(dataset.users):,} users, {dataset.group_count:,} groups, "
+            f"{dataset.expenses:,} expenses in {time.perf_counter() - start:.1f} s")
+
+        # Faults only apply to the measured traffic, not to loading
+        server.latency, server.jitter, server.error_rate = latency, jitter, error_rate
+        app = start_target(target, server=server, db=db, threads=threads, rate_limit=rate_limit)
+        try:
+            reports = []
+            for scenario in scenarios:
+                report = drive(app, dataset, scenario, requests, concurrency, seed)
+                reports.append(report)
+                if not quiet:
+                    print_report(report)
+            return reports
+        finally:
+            app.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load tests for the handler apps")
+    parser.add_argument("--target", choices=TARGETS, default="fast")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--scenario", default="all", help=f"all or a comma list of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for Flask targets")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="upstream latency added to every call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra upstream latency, uniform 0..jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls failed with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sqlite-path", help="database file for main-sqlite (default: a temp file)")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the per-user rate limit (429s) on")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario: {scenario}")
+
+    # Per-request logs (and one error per injected fault) would drown the report
+    logging.disable(logging.ERROR)
+
+    if not args.json:
+        print(f"🔥 Load harness: {args.target} on {args.scale} data, {args.requests} requests x "
+              f"{args.concurrency} clients, upstream {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+              f"{args.error_rate:.1%} errors")
+        print("=" * 72)
+
+    reports = run(
+        target=args.target, scale=args.scale, scenarios=scenarios, requests=args.requests,
+        concurrency=args.concurrency, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, seed=args.seed, threads=args.threads, sqlite_path=args.sqlite_path,
+        rate_limit=args.rate_limit, quiet=args.json
+    )
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Local Redis - In-process stand-in for a Redis server (RESP2)
+
+Lets the Redis shared-cache backend be tested without a Redis install.
+Only the commands shared_cache.py uses are implemented: PING, AUTH,
+SELECT, GET, SET (EX/PX/NX), DEL, PUBLISH, SUBSCRIBE and the optimistic
+transaction commands WATCH, UNWATCH, MULTI, EXEC and DISCARD.
+"""
+
+import time
+import threading
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+
+class _Server(ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    if isinstance(value, str):
+        value = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+# Reply marker for an EXEC aborted by a watched key
+_NULL_ARRAY = object()
+
+
+class LocalRedis:
+    """In-memory Redis stand-in listening on 127.0.0.1"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.data = {}
+        # key -> number of writes, for WATCH
+        self.versions = {}
+        # Reentrant: EXEC runs the queued commands under the lock it checked the watches with
+        self.lock = threading.RLock()
+        # channel -> list of (wfile, write lock) of subscribed connections
+        self.subscribers = {}
+        self.commands = 0
+        self._connections = set()
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    # ----- lifecycle -----
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def drop_connections(self):
+        """Close every client connection, as a Redis restart or failover would"""
+        with self.lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(2)
+            except OSError:
+                pass
+
+    # ----- commands -----
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            self.data.pop(key, None)
+            return None
+        return entry[0]
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def exec_transaction(self, watched, queued):
+        """Run queued commands atomically; None (aborted) if a watched key was written since WATCH"""
+        with self.lock:
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return None
+            return [self.execute(args) for args in queued]
+
+    def execute(self, args):
+        """Run one command; returns the reply value, or an Exception for an error reply"""
+        name = args[0].upper()
+        self.commands += 1
+        with self.lock:
+            if name == b"PING":
+                return "PONG"
+            if name in (b"AUTH", b"SELECT"):
+                return "OK"
+            if name == b"GET":
+                return self._get(args[1])
+            if name == b"SET":
+                key, value, expires_at, only_if_absent = args[1], args[2], None, False
+                options = [arg.upper() for arg in args[3:]]
+                for i, option in enumerate(options):
+                    if option == b"EX":
+                        expires_at = time.monotonic() + int(args[4 + i])
+                    elif option == b"PX":
+                        expires_at = time.monotonic() + int(args[4 + i]) / 1000
+                    elif option == b"NX":
+                        only_if_absent = True
+                if only_if_absent and self._get(key) is not None:
+                    return None
+                self.data[key] = (value, expires_at)
+                self._touch(key)
+                return "OK"
+            if name == b"DEL":
+                for key in args[1:]:
+                    self._touch(key)
+                return sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            if name == b"PUBLISH":
+                receivers = list(self.subscribers.get(args[1], ()))
+            else:
+                return Exception(f"ERR unknown command '{name.decode()}'")
+
+        # PUBLISH writes to the subscribers outside the store lock
+        message = _encode([b"message", args[1], args[2]])
+        for wfile, write_lock in receivers:
+            try:
+                with write_lock:
+                    wfile.write(message)
+                    wfile.flush()
+            except OSError:
+                pass
+        return len(receivers)
+
+    def _handler_class(self):
+        redis = self
+
+        class Handler(StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.write_lock = threading.Lock()
+                with redis.lock:
+                    redis._connections.add(self.connection)
+
+            def finish(self):
+                with redis.lock:
+                    redis._connections.discard(self.connection)
+                    for subscribers in redis.subscribers.values():
+                        if (self.wfile, self.write_lock) in subscribers:
+                            subscribers.remove((self.wfile, self.write_lock))
+                try:
+                    super().finish()
+                except OSError:
+                    pass
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.split()
+                args = []
+                for _ in range(int(line[1:])):
+                    size = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(size + 2)[:-2])
+                return args
+
+            def reply(self, value):
+                if value is _NULL_ARRAY:
+                    data = b"*-1\r\n"
+                elif isinstance(value, Exception):
+                    data = f"-{value}\r\n".encode()
+                elif isinstance(value, str) and value in ("OK", "PONG", "QUEUED"):
+                    data = f"+{value}\r\n".encode()
+                else:
+                    data = _encode(value)
+                with self.write_lock:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+
+            def transaction(self, name, args):
+                """Handle a transaction command; returns the reply, or False for anything else"""
+                if name == b"WATCH":
+                    with redis.lock:
+                        self.watched.update((key, redis.versions.get(key, 0)) for key in args[1:])
+                    return "OK"
+                if name == b"UNWATCH":
+                    self.watched = {}
+                    return "OK"
+                if name == b"MULTI":
+                    self.queued = []
+                    return "OK"
+                if name in (b"EXEC", b"DISCARD"):
+                    if self.queued is None:
+                        return Exception(f"ERR {name.decode()} without MULTI")
+                    queued, watched, self.queued, self.watched = self.queued, self.watched, None, {}
+                    return redis.exec_transaction(watched, queued) if name == b"EXEC" else "OK"
+                if self.queued is not None:
+                    self.queued.append(args)
+                    return "QUEUED"
+                return False
+
+            def handle(self):
+                self.watched = {}
+                self.queued = None
+                try:
+                    while True:
+                        args = self.read_command()
+                        if not args:
+                            return
+                        reply = self.transaction(args[0].upper(), args)
+                        if reply is not False:
+                            # An aborted EXEC is a null array
+                            self.reply(reply if reply is not None else _NULL_ARRAY)
+                            continue
+                        if args[0].upper() == b"SUBSCRIBE":
+                            for count, channel in enumerate(args[1:], 1):
+                                with redis.lock:
+                                    redis.subscribers.setdefault(channel, []).append((self.wfile, self.write_lock))
+                                self.reply([b"subscribe", channel, count])
+                            continue
+                        self.reply(redis.execute(args))
+                except (OSError, ValueError):
+                    return
+
+        return Handler
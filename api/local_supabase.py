@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Local Supabase - In-process stand-in for the Supabase REST (PostgREST) API
+
+Runs a threaded HTTP/1.1 server on localhost with in-memory tables so the
+handlers, benchmarks and tests can run without a network connection.
+Only the subset of PostgREST the handlers actually use is implemented.
+"""
+
+import json
+import time
+import hmac
+import random
+import base64
+import hashlib
+import threading
+import itertools
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+# Query parameters that are not column filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "or", "and"}
+
+# Columns with an equality index, so `col=eq.x` does not scan large seeded tables
+INDEXED_COLUMNS = ("created_by", "group_id")
+
+# Secret the stand-in signs its access tokens with (HS256, like Supabase)
+JWT_SECRET = "local-supabase-jwt-secret"
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def issue_token(user_id, email=None, expires_in=3600, secret=JWT_SECRET, **claims):
+    """Issue a Supabase-style HS256 access token for a user"""
+    now = int(time.time())
+    payload = {
+        "sub": user_id,
+        "email": email or f"{user_id}@example.com",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "iat": now,
+        "exp": now + expires_in
+    }
+    payload.update(claims)
+    header = {"alg": "HS256", "typ": "JWT"}
+    signing_input = f"{_b64url(json.dumps(header).encode())}.{_b64url(json.dumps(payload).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64url(signature)}"
+
+
+def _token_claims(token):
+    """Decode a token issued by issue_token, or None if it is invalid or expired"""
+    try:
+        signing_input, _, signature = token.rpartition(".")
+        expected = hmac.new(JWT_SECRET.encode(), signing_input.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64url(expected), signature):
+            return None
+        payload = signing_input.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        if claims.get("exp", 0) < time.time():
+            return None
+        return claims
+    except (ValueError, IndexError):
+        return None
+
+
+def _coerce(raw, sample):
+    """Convert a filter value to the type stored in the column"""
+    if raw == "null":
+        return None
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _matches(row, column, expression):
+    """Evaluate a PostgREST `op.value` filter against one row"""
+    op, _, raw = expression.partition(".")
+    value = row.get(column)
+
+    if op == "in":
+        items = raw.strip("()").split(",") if raw.strip("()") else []
+        return any(value == _coerce(item.strip('"'), value) for item in items)
+    if op == "is":
+        return value is None if raw == "null" else value == (raw == "true")
+
+    target = _coerce(raw, value)
+    if op == "eq":
+        return value == target
+    if op == "neq":
+        return value != target
+    if value is None or target is None:
+        return False
+    if op == "lt":
+        return value < target
+    if op == "lte":
+        return value <= target
+    if op == "gt":
+        return value > target
+    if op == "gte":
+        return value >= target
+    raise ValueError(f"unsupported operator: {op}")
+
+
+def _split_top_level(text):
+    """Split `a,b(c,d),"e,f"` on commas outside parentheses and quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def _matches_logic(row, operator, expression):
+    """Evaluate an `or=(...)` / `and=(...)` logic tree against one row"""
+    results = []
+    for term in _split_top_level(expression.strip()[1:-1]):
+        if term.startswith(("and(", "or(")):
+            nested, _, inner = term.partition("(")
+            results.append(_matches_logic(row, nested, "(" + inner))
+        else:
+            column, _, condition = term.partition(".")
+            op, _, raw = condition.partition(".")
+            value = raw.strip('"')
+            results.append(_matches(row, column, f"{op}.{value}"))
+    return any(results) if operator == "or" else all(results)
+
+
+class ForeignKeyViolation(Exception):
+    """A delete blocked by a referencing row (Postgres error 23503)"""
+
+
+class _Server(ThreadingHTTPServer):
+    # socketserver's default backlog of 5 drops connections under load tests
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class LocalSupabase:
+    """In-memory PostgREST stand-in listening on 127.0.0.1"""
+
+    def __init__(self, host="127.0.0.1", port=0, aggregates=True, latency=0.0, cascade=True,
+                 jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.tables = {"groups": [], "expenses": []}
+        # Seconds added to every response, to mimic a remote Supabase project,
+        # plus up to `jitter` more, drawn uniformly per request
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests answered with error_status instead of running
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.injected_errors = 0
+        # (delay, inject an error?) for the next few requests, ahead of the settings above
+        self._scripted = deque()
+        self._random = random.Random(seed)
+        self._indexes = {}
+        # PostgREST only allows aggregates when db-aggregates-enabled is set
+        self.aggregates = aggregates
+        # expenses.group_id references groups(id); with cascade=False deleting
+        # a group that still has expenses fails like a plain foreign key
+        self.cascade = cascade
+        self.calls = []
+        self.lock = threading.Lock()
+        self._ids = {}
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self._server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    # ----- lifecycle -----
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def rest_url(self):
+        return f"{self.url}/rest/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ----- data helpers -----
+    def _next_row_defaults(self, table):
+        with self.lock:
+            counter = self._ids.setdefault(table, itertools.count(1))
+            self._clock += timedelta(microseconds=1)
+            stamp = self._clock.isoformat(timespec="microseconds")
+            return next(counter), stamp
+
+    def seed(self, table, rows):
+        """Insert rows directly, filling id/created_at/updated_at like the DB does"""
+        created = []
+        for row in rows:
+            row_id, stamp = self._next_row_defaults(table)
+            record = {"id": row_id, "created_at": stamp, "updated_at": stamp}
+            record.update(row)
+            created.append(record)
+        with self.lock:
+            self.tables.setdefault(table, []).extend(created)
+        return created
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls = []
+
+    def call_count(self, method=None, table=None):
+        return sum(
+            1 for call in self.calls
+            if (method is None or call["method"] == method)
+            and (table is None or call["table"] == table)
+        )
+
+    def bytes_sent(self, table=None):
+        """Response body bytes served, optionally for one table"""
+        return sum(call["response_bytes"] for call in self.calls if table is None or call["table"] == table)
+
+    def stall(self, *seconds):
+        """Hold the next requests, one per value, for that many seconds instead of `latency`"""
+        with self.lock:
+            self._scripted.extend((delay, False) for delay in seconds)
+
+    def fail_next(self, count=1):
+        """Answer the next `count` requests with error_status"""
+        with self.lock:
+            self._scripted.extend((0.0, True) for _ in range(count))
+
+    def _draw_fault(self):
+        """(seconds to wait, inject an error?) for one request"""
+        with self.lock:
+            if self._scripted:
+                delay, injected = self._scripted.popleft()
+                self.injected_errors += injected
+                return delay, injected
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            injected = bool(self.error_rate) and self._random.random() < self.error_rate
+            if injected:
+                self.injected_errors += 1
+        return delay, injected
+
+    # ----- query evaluation -----
+    def _index(self, table, column, rows):
+        """{str(value): [rows]} for one column, kept in step with the table list"""
+        entry = self._indexes.get((table, column))
+        if entry is None or entry[0] is not rows or entry[1] > len(rows):
+            entry = (rows, 0, {})
+        source, size, index = entry
+        for row in rows[size:]:
+            index.setdefault(str(row.get(column)), []).append(row)
+        self._indexes[(table, column)] = (rows, len(rows), index)
+        return index
+
+    def _candidates(self, table, params):
+        """Rows that can match params, narrowed through an equality index when possible"""
+        rows = self.tables.get(table, [])
+        for column, expression in params:
+            if column not in INDEXED_COLUMNS:
+                continue
+            if expression.startswith("eq."):
+                return list(self._index(table, column, rows).get(expression[3:], ()))
+            if expression.startswith("in.("):
+                index = self._index(table, column, rows)
+                keys = {item.strip('"') for item in expression[4:].rstrip(")").split(",") if item}
+                # Ids grow with insertion, so this keeps table order
+                return sorted((row for key in keys for row in index.get(key, ())), key=lambda row: row["id"])
+        return list(rows)
+
+    def _filter(self, rows, params):
+        for column, expression in params:
+            if column in ("or", "and"):
+                rows = [row for row in rows if _matches_logic(row, column, expression)]
+            elif column not in RESERVED_PARAMS:
+                rows = [row for row in rows if _matches(row, column, expression)]
+        return rows
+
+    def _order(self, rows, order):
+        for term in reversed(order.split(",")):
+            column, _, direction = term.partition(".")
+            rows = sorted(
+                rows,
+                key=lambda row: (row.get(column) is None, row.get(column)),
+                reverse=direction.startswith("desc")
+            )
+        return rows
+
+    def _project(self, rows, select):
+        if not select or select == "*":
+            return [dict(row) for row in rows]
+
+        # Each item is `column`, `alias:column` or `alias:column.fn()`
+        items = []
+        for item in select.split(","):
+            alias, _, expression = item.strip().rpartition(":")
+            column, _, function = expression.partition(".")
+            function = function.rstrip("()") or None
+            items.append((alias or (function or column), column, function))
+
+        if not any(function for _, _, function in items):
+            return [{alias: row.get(column) for alias, column, _ in items} for row in rows]
+        if not self.aggregates:
+            raise PermissionError("Use of aggregate functions is not allowed")
+        return self._aggregate(rows, items)
+
+    def _aggregate(self, rows, items):
+        """Group by the plain columns and apply sum()/count() to the rest"""
+        keys = [(alias, column) for alias, column, function in items if not function]
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row.get(column) for _, column in keys), []).append(row)
+        if not groups and not keys:
+            groups[()] = []
+
+        result = []
+        for key, members in groups.items():
+            record = {alias: value for (alias, _), value in zip(keys, key)}
+            for alias, column, function in items:
+                if function == "count":
+                    record[alias] = len(members)
+                elif function == "sum":
+                    record[alias] = sum(row.get(column) or 0 for row in members) if members else None
+                elif function:
+                    raise ValueError(f"unsupported aggregate: {function}")
+            result.append(record)
+        return result
+
+    def query(self, table, params, with_total=False):
+        """Run a GET against a table; with_total also returns the unpaged row count"""
+        options = dict(params)
+        with self.lock:
+            rows = self._candidates(table, params)
+
+        rows = self._filter(rows, params)
+        total = len(rows)
+        if options.get("order"):
+            rows = self._order(rows, options["order"])
+
+        offset = int(options.get("offset", 0))
+        rows = rows[offset:]
+        if options.get("limit") is not None:
+            rows = rows[:int(options["limit"])]
+        rows = self._project(rows, options.get("select"))
+        return (rows, total) if with_total else rows
+
+    def insert(self, table, payload):
+        rows = payload if isinstance(payload, list) else [payload]
+        return self.seed(table, rows)
+
+    def delete(self, table, params):
+        with self.lock:
+            existing = self.tables.get(table, [])
+            doomed = self._filter(self._candidates(table, params), params)
+            if table == "groups" and doomed:
+                group_ids = {row["id"] for row in doomed}
+                expenses = self.tables.get("expenses", [])
+                if not self.cascade and any(row["group_id"] in group_ids for row in expenses):
+                    raise ForeignKeyViolation('update or delete on table "groups" violates foreign key constraint')
+                self.tables["expenses"] = [row for row in expenses if row["group_id"] not in group_ids]
+            doomed_ids = {id(row) for row in doomed}
+            self.tables[table] = [row for row in existing if id(row) not in doomed_ids]
+        return doomed
+
+    # ----- HTTP layer -----
+    def _handler_class(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so clients can keep connections alive between calls
+            protocol_version = "HTTP/1.1"
+            # Headers and body must leave in one segment on kept-alive sockets,
+            # otherwise Nagle + delayed ACK adds ~40ms to every response
+            disable_nagle_algorithm = True
+            wbufsize = -1
+
+            def log_message(self, *args):
+                pass
+
+            def _route(self):
+                # Always consume the body so a kept-alive connection stays in sync
+                # (postgrest-py sends `{}` even on GET)
+                length = int(self.headers.get("Content-Length") or 0)
+                self.raw_body = self.rfile.read(length) if length else b""
+                parts = urlsplit(self.path)
+                params = parse_qsl(parts.query, keep_blank_values=True)
+                table = parts.path.rsplit("/", 1)[-1]
+                self.call = {
+                    "method": self.command,
+                    "path": parts.path,
+                    "table": table,
+                    "params": params,
+                    "response_bytes": 0
+                }
+                with backend.lock:
+                    backend.calls.append(self.call)
+                delay, self.injected = backend._draw_fault()
+                if delay:
+                    time.sleep(delay)
+                return parts.path, table, params
+
+            def _send(self, status, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                self.call["response_bytes"] = len(data)
+
+            def _send_injected(self):
+                self._send(backend.error_status, {"code": "INJECTED", "message": "injected fault"})
+
+            def _body(self):
+                return json.loads(self.raw_body or b"null")
+
+            def _wants_representation(self):
+                return "return=representation" in (self.headers.get("Prefer") or "")
+
+            def _send_rows(self, status, rows, headers=None):
+                """Send rows, or a single object when asked for vnd.pgrst.object+json"""
+                if "vnd.pgrst.object+json" not in (self.headers.get("Accept") or ""):
+                    return self._send(status, rows, headers)
+                if len(rows) != 1:
+                    return self._send(406, {"code": "PGRST116", "message": f"{len(rows)} rows returned"})
+                self._send(status, rows[0], headers)
+
+            def do_GET(self):
+                path, table, params = self._route()
+                if self.injected:
+                    return self._send_injected()
+                if path == "/auth/v1/user":
+                    return self._get_user()
+                if not path.startswith("/rest/v1/"):
+                    return self._send(404, {"message": "not found"})
+                try:
+                    rows, total = backend.query(table, params, with_total=True)
+                    headers = {}
+                    if "count=exact" in (self.headers.get("Prefer") or ""):
+                        offset = int(dict(params).get("offset", 0))
+                        span = f"{offset}-{offset + len(rows) - 1}" if rows else "*"
+                        headers["Content-Range"] = f"{span}/{total}"
+                    self._send_rows(200, rows, headers)
+                except PermissionError as e:
+                    self._send(400, {"code": "PGRST123", "message": str(e)})
+                except (ValueError, KeyError) as e:
+                    self._send(400, {"message": str(e)})
+
+            def _get_user(self):
+                token = (self.headers.get("Authorization") or "").replace("Bearer ", "")
+                claims = _token_claims(token)
+                if not claims:
+                    return self._send(401, {"msg": "invalid JWT"})
+                self._send(200, {
+                    "id": claims["sub"],
+                    "email": claims.get("email"),
+                    "aud": claims.get("aud"),
+                    "role": claims.get("role"),
+                    "app_metadata": claims.get("app_metadata", {}),
+                    "user_metadata": claims.get("user_metadata", {}),
+                    "created_at": "2025-01-01T00:00:00+00:00"
+                })
+
+            def do_POST(self):
+                path, table, params = self._route()
+                if self.injected:
+                    return self._send_injected()
+                created = backend.insert(table, self._body())
+                if self._wants_representation():
+                    return self._send_rows(201, created)
+                self._send(201)
+
+            def do_DELETE(self):
+                path, table, params = self._route()
+                if self.injected:
+                    return self._send_injected()
+                try:
+                    deleted = backend.delete(table, params)
+                except ForeignKeyViolation as e:
+                    return self._send(409, {"code": "23503", "message": str(e)})
+                deleted = backend._project(deleted, dict(params).get("select"))
+                if self._wants_representation():
+                    return self._send(200, deleted)
+                self._send(204)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    with LocalSupabase(port=54321) as server:
+        print(f"🧪 Local Supabase stand-in running at {server.url}")
+        print("Press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -1,11 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import logging
-from decimal import Decimal
-import json
 
 from config import settings
 from database import db_client
+from jwt_auth import verifier_from_env
+from json_provider import FastJSONProvider
+from ownership_cache import OwnedGroupCache
+from pagination import PaginationError, parse_page_args
+from streaming import STREAM_MIMETYPE, wants_stream, stream_export
+from projection import (ProjectionError, parse_fields, EXPENSE_COLUMNS, GROUP_COLUMNS,
+                        GROUP_SUMMARY_FIELDS, KEYSET_COLUMNS)
+from money import MoneyError, parse_amount, to_amount
+from etags import VersionStore, user_key, group_key, etag_headers
+from expense_cache import ExpenseCache
+import shared_cache
+import rate_limit
+import metrics
+import upstream_trace
+from fanout import in_parallel
+from batch_ingest import (BatchError, is_ndjson, parse_json_body, parse_ndjson, validate_batch,
+                          merge_inserted, batch_response)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,10 +28,87 @@ logger = logging.getLogger(__name__)
 
 # Create Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Enable CORS
 CORS(app, origins=settings.CORS_ORIGINS)
 
+# Server-Timing header and a log line with each request's upstream calls, and GET /metrics
+upstream_trace.init_flask(app)
+metrics.init_flask(app)
+
+# Verifies tokens locally when SUPABASE_JWT_SECRET/SUPABASE_JWKS_PATH is set,
+# otherwise asks Supabase Auth once per token and caches the answer
+token_verifier = verifier_from_env(settings.SUPABASE_URL, remote_verify=lambda token: db_client.verify_user_token(token))
+
+# Owned group IDs per user, so writes into a group skip the ownership query
+owned_groups = OwnedGroupCache()
+
+# Shared by every worker process when SHARED_CACHE_URL is set
+shared = shared_cache.from_env()
+
+# Listing versions for ETags, bumped by every mutation endpoint
+versions = VersionStore(shared=shared)
+
+# Whole expense lists of recently read groups, kept current by the expense/group endpoints
+expense_cache = ExpenseCache()
+
+# Writes served by other workers evict what they changed from this worker's caches
+invalidations = shared_cache.InvalidationBus(shared)
+invalidations.subscribe(shared_cache.evict_from(owned_groups, expense_cache))
+
+
+def changed(*keys):
+    """After a write: new ETags for these keys, and every other worker drops its cached copies"""
+    versions.bump(*keys)
+    invalidations.publish(*keys)
+
+
+invalidations.init_flask(app)
+
+# Token buckets per user and per route, weighted by each route's upstream cost; per user across workers when shared
+rate_limiter = rate_limit.RateLimiter(backend=shared)
+rate_limit.init_flask(app, rate_limiter, verify=lambda token: token_verifier.verify_offline(token))
+
+# Hit ratios on /metrics; read through the module globals, which tests swap out
+metrics.register_cache("owned_groups", lambda: owned_groups.stats())
+metrics.register_cache("tokens", lambda: token_verifier.stats())
+metrics.register_cache("etags", lambda: versions.stats(), hits="not_modified", misses="modified")
+metrics.register_cache("expenses", lambda: expense_cache.stats())
+
+def user_owns_group(user_id, group_id):
+    """Check group ownership from the cache, loading the user's group IDs on a miss"""
+    owned = owned_groups.get(user_id)
+    if owned is not None and group_id in owned:
+        return True
+    
+    groups = db_client.select("groups", columns="id", filters={"created_by": user_id})
+    owned_groups.put(user_id, [group["id"] for group in groups])
+    return any(group["id"] == group_id for group in groups)
+
+def read_expenses_for_cache(group_id):
+    """(rows, next_cursor) for the expense cache; None if the read failed"""
+    try:
+        rows, next_cursor, _ = db_client.select_page(
+            "expenses", filters={"group_id": group_id}, limit=expense_cache.max_rows
+        )
+    except db_client.errors as e:
+        logger.error(f"Expense cache fill for group {group_id} failed: {e}")
+        return None
+    return rows, next_cursor
+
+def cached_expenses(group_id):
+    """A group's expenses from the cache, read through on a miss; None if too large or unreadable"""
+    entry = expense_cache.get(group_id)
+    if entry is None:
+        epoch = expense_cache.epoch()
+        read = read_expenses_for_cache(group_id)
+        if read is None:
+            return None
+        rows, next_cursor = read
+        entry = expense_cache.fill(group_id, rows, epoch, complete=next_cursor is None)
+    return entry if entry.rows is not None else None
+
 # Helper function to get current user from authorization header
 def get_current_user():
     auth_header = request.headers.get('Authorization')
@@ -29,8 +121,7 @@ def get_current_user():
         token = auth_header.replace("Bearer ", "")
         logger.info(f"Attempting to verify token: {token[:20]}...")
         
-        # Use simplified token verification
-        user = db_client.verify_user_token(token)
+        user = token_verifier.verify(token)
         if not user:
             logger.warning("Token verification failed - no user returned")
             return None, {"error": "Invalid token"}, 401
@@ -41,15 +132,6 @@ def get_current_user():
         logger.error(f"Error getting user: {e}")
         return None, {"error": "Invalid authentication"}, 401
 
-# Custom JSON encoder to handle Decimal
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
-
-app.json_encoder = DecimalEncoder
-
 # Root endpoint
 @app.route("/")
 def root():
@@ -58,7 +140,7 @@ def root():
 # Health check endpoint
 @app.route("/health")
 def health_check():
-    return jsonify({"status": "healthy", "service": "ExpenseTracker API"})
+    return jsonify({"status": "healthy", "service": "ExpenseTracker API", "rate_limit": rate_limiter.stats()})
 
 # API Routes
 
@@ -88,12 +170,85 @@ def create_group():
         if not result:
             return jsonify({"error": "Failed to create group"}), 400
         
+        owned_groups.add(str(user["id"]), result[0]["id"])
+        changed(user_key(user["id"]))
         return jsonify(result[0]), 201
         
     except Exception as e:
         logger.error(f"Error creating group: {e}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+@app.route("/api/groups/<int:group_id>", methods=["GET"])
+def get_group_detail(group_id):
+    """A group with its totals and first page of expenses: everything GroupDetailPage shows."""
+    user, error, status_code = get_current_user()
+    if error:
+        return jsonify(error), status_code
+    user_id = str(user["id"])
+    
+    try:
+        limit, after = parse_page_args(request.args)
+        projection = parse_fields(request.args, EXPENSE_COLUMNS)
+    except (PaginationError, ProjectionError) as e:
+        return jsonify({"error": str(e)}), 400
+    if after is not None:
+        return jsonify({"error": f"Only the first page comes with the group; page on with /api/expenses/{group_id}"}), 400
+    
+    etag = versions.etag([group_key(group_id)], user["id"], request.args)
+    if (group_id in (owned_groups.get(user_id) or ())
+            and versions.matches(request.headers.get("If-None-Match"), etag)):
+        return "", 304, etag_headers(etag)
+    
+    try:
+        # One round of parallel queries. The group is read filtered by owner, which proves
+        # ownership, alongside whatever the expense cache cannot answer
+        def read_page():
+            return db_client.select_page(
+                "expenses", columns=projection.select(*KEYSET_COLUMNS), filters={"group_id": group_id}, limit=limit
+            )
+        
+        def read_summary():
+            return db_client.summarize_expenses([group_id])[group_id]
+        
+        calls = [lambda: db_client.select("groups", filters={"id": group_id, "created_by": user_id})]
+        entry = expense_cache.get(group_id)
+        epoch = expense_cache.epoch()
+        if entry is None:
+            calls.append(lambda: read_expenses_for_cache(group_id))
+        elif entry.rows is None:
+            calls += [read_page, read_summary]
+        groups, *reads = in_parallel(*calls)
+        
+        if not groups:
+            return jsonify({"error": "Group not found or access denied"}), 404
+        owned_groups.add(user_id, group_id)
+        
+        if entry is None:
+            # Rows read for this user are only cached now that ownership is proven
+            if reads[0] is not None:
+                rows, next_cursor = reads[0]
+                entry = expense_cache.fill(group_id, rows, epoch, complete=next_cursor is None)
+            if entry is None or entry.rows is None:
+                # Too large to cache (or unreadable): a second round for the page and the totals
+                reads = in_parallel(read_page, read_summary)
+        
+        if entry is not None and entry.rows is not None:
+            expenses, next_cursor = entry.page(limit)
+            count, total_cents = entry.count, entry.total_cents
+        else:
+            (expenses, next_cursor, _), summary = reads
+            count, total_cents = summary["expense_count"], summary["total_cents"]
+        
+        return jsonify({
+            "group": {**groups[0], "expense_count": count, "total_amount": to_amount(total_cents)},
+            "expenses": projection.apply(expenses),
+            "next_cursor": next_cursor
+        }), 200, etag_headers(etag)
+        
+    except Exception as e:
+        logger.error(f"Error getting group {group_id}: {e}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 @app.route("/api/expenses/<int:group_id>", methods=["GET"])
 def get_expenses_for_group(group_id):
     """Get all expenses for a specific group."""
@@ -101,24 +256,48 @@ def get_expenses_for_group(group_id):
     if error:
         return jsonify(error), status_code
     
+    try:
+        limit, after = parse_page_args(request.args)
+        projection = parse_fields(request.args, EXPENSE_COLUMNS)
+    except (PaginationError, ProjectionError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # A 304 needs ownership proven from the cache too, so it costs no database call
+    etag = versions.etag([group_key(group_id)], user["id"], request.args)
+    if (group_id in (owned_groups.get(str(user["id"])) or ())
+            and versions.matches(request.headers.get("If-None-Match"), etag)):
+        return "", 304, etag_headers(etag)
+    
     try:
         # First, verify the user owns this group
-        groups = db_client.select("groups", filters={"id": group_id, "created_by": str(user["id"])})
-        
-        if not groups:
+        if not user_owns_group(str(user["id"]), group_id):
             return jsonify({"error": "Group not found or access denied"}), 404
         
-        # Get expenses for the group
-        expenses = db_client.select("expenses", filters={"group_id": group_id}, order="created_at.desc")
+        if wants_stream(request.args):
+            # Whole group, written out chunk by chunk with totals in the trailer
+            chunks = db_client.iter_chunks(
+                "expenses", columns=projection.select(*KEYSET_COLUMNS, "amount"), filters={"group_id": group_id}
+            )
+            return Response(stream_export(chunks, project=projection.apply, group_id=group_id), mimetype=STREAM_MIMETYPE)
         
-        # Calculate total amount
-        total_amount = sum(Decimal(str(expense["amount"])) for expense in expenses)
+        cached = cached_expenses(group_id)
+        if cached is not None:
+            expenses, next_cursor = cached.page(limit, after)
+            count, total_cents = cached.count, cached.total_cents
+        else:
+            # One page of expenses; count and total cover the whole group
+            expenses, next_cursor, _ = db_client.select_page(
+                "expenses", columns=projection.select(*KEYSET_COLUMNS), filters={"group_id": group_id}, limit=limit, after=after
+            )
+            summary = db_client.summarize_expenses([group_id])[group_id]
+            count, total_cents = summary["expense_count"], summary["total_cents"]
         
         return jsonify({
-            "expenses": expenses,
-            "count": len(expenses),
-            "total_amount": float(total_amount)
-        })
+            "expenses": projection.apply(expenses),
+            "count": count,
+            "total_amount": to_amount(total_cents),
+            "next_cursor": next_cursor
+        }), 200, etag_headers(etag)
         
     except Exception as e:
         logger.error(f"Error getting expenses for group {group_id}: {e}")
@@ -136,21 +315,32 @@ def add_expense_to_group(group_id):
         if not data or not data.get('description') or not data.get('amount'):
             return jsonify({"error": "Description and amount are required"}), 400
         
-        # First, verify the user owns this group
-        groups = db_client.select("groups", filters={"id": group_id, "created_by": str(user["id"])})
+        try:
+            cents = parse_amount(data['amount'])
+        except MoneyError as e:
+            return jsonify({"error": str(e)}), 400
+        if cents <= 0:
+            return jsonify({"error": "Amount must be greater than 0"}), 400
         
-        if not groups:
+        # First, verify the user owns this group
+        if not user_owns_group(str(user["id"]), group_id):
             return jsonify({"error": "Group not found or access denied"}), 404
         
         # Insert expense into Supabase
         expense_data = {
             "description": data['description'],
-            "amount": data['amount'],
+            "amount": to_amount(cents),
             "group_id": group_id,
             "created_by": str(user["id"])
         }
         
-        result = db_client.insert("expenses", expense_data)
+        result = None
+        try:
+            result = db_client.insert("expenses", expense_data)
+        finally:
+            # No rows back (or an error) means the insert may or may not have landed: drop the cached group
+            expense_cache.add(group_id, result or None)
+            changed(group_key(group_id), user_key(user["id"]))
         
         if not result:
             return jsonify({"error": "Failed to create expense"}), 400
@@ -161,6 +351,45 @@ def add_expense_to_group(group_id):
         logger.error(f"Error adding expense to group {group_id}: {e}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+@app.route("/api/groups/<int:group_id>/expenses:batch", methods=["POST"])
+def add_expenses_batch(group_id):
+    """Add many expenses to a group in one insert (JSON array or NDJSON body)."""
+    user, error, status_code = get_current_user()
+    if error:
+        return jsonify(error), status_code
+    
+    # Parse and validate everything before touching the database
+    try:
+        if is_ndjson(request.content_type):
+            items = parse_ndjson(iter(request.stream.readline, b""))
+        else:
+            items = parse_json_body(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    rows, results = validate_batch(items, group_id, str(user["id"]))
+    
+    try:
+        if rows:
+            if not user_owns_group(str(user["id"]), group_id):
+                return jsonify({"error": "Group not found or access denied"}), 404
+            
+            try:
+                created = db_client.insert("expenses", rows)
+            except db_client.errors as e:
+                # Reported per item as failed; the insert may still have landed, so the group is dropped below
+                logger.error(f"Error inserting expense batch into group {group_id}: {e}")
+                created = None
+            merge_inserted(results, created)
+            expense_cache.add(group_id, created or None)
+            changed(group_key(group_id), user_key(user["id"]))
+        
+        body, status = batch_response(results)
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Error adding expense batch to group {group_id}: {e}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 @app.route("/api/groups/<int:group_id>", methods=["DELETE"])
 def delete_group(group_id):
     """Delete a group and all its expenses."""
@@ -169,18 +398,15 @@ def delete_group(group_id):
         return jsonify(error), status_code
     
     try:
-        # First, verify the user owns this group
-        groups = db_client.select("groups", filters={"id": group_id, "created_by": str(user["id"])})
+        # Ownership is part of the delete filter; nothing deleted means not found or not yours
+        deleted = db_client.delete_group(group_id, str(user["id"]))
         
-        if not groups:
+        if not deleted:
             return jsonify({"error": "Group not found or access denied"}), 404
         
-        # Delete all expenses for this group first
-        db_client.delete("expenses", filters={"group_id": group_id})
-        
-        # Delete the group
-        result = db_client.delete("groups", filters={"id": group_id, "created_by": str(user["id"])})
-        
+        owned_groups.discard(str(user["id"]), group_id)
+        expense_cache.invalidate(group_id)
+        changed(group_key(group_id), user_key(user["id"]))
         return jsonify({"message": "Group deleted successfully"}), 200
         
     except Exception as e:
@@ -195,15 +421,16 @@ def delete_expense(expense_id):
         return jsonify(error), status_code
     
     try:
-        # First, verify the user owns this expense
-        expenses = db_client.select("expenses", filters={"id": expense_id, "created_by": str(user["id"])})
+        # Ownership is part of the delete filter; nothing deleted means not found or not yours
+        deleted = db_client.delete(
+            "expenses", filters={"id": expense_id, "created_by": str(user["id"])}, columns="id,group_id"
+        )
         
-        if not expenses:
+        if not deleted:
             return jsonify({"error": "Expense not found or access denied"}), 404
         
-        # Delete the expense
-        result = db_client.delete("expenses", filters={"id": expense_id, "created_by": str(user["id"])})
-        
+        expense_cache.discard(deleted[0]["group_id"], [expense_id])
+        changed(group_key(deleted[0]["group_id"]), user_key(user["id"]))
         return jsonify({"message": "Expense deleted successfully"}), 200
         
     except Exception as e:
@@ -218,22 +445,45 @@ def get_user_groups():
         return jsonify(error), status_code
     
     try:
-        groups = db_client.select("groups", filters={"created_by": str(user["id"])}, order="created_at.desc")
+        limit, after = parse_page_args(request.args)
+        projection = parse_fields(request.args, GROUP_COLUMNS, GROUP_SUMMARY_FIELDS)
+    except (PaginationError, ProjectionError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Nothing changed since the client's copy: answer before any database call
+    etag = versions.etag([user_key(user["id"])], user["id"], request.args)
+    if versions.matches(request.headers.get("If-None-Match"), etag):
+        return "", 304, etag_headers(etag)
+    
+    try:
+        groups, next_cursor, total = db_client.select_page(
+            "groups", columns=projection.select(*KEYSET_COLUMNS), filters={"created_by": str(user["id"])},
+            limit=limit, after=after, count=True
+        )
+        if after is None and next_cursor is None:
+            # This page is the user's complete group list
+            owned_groups.put(str(user["id"]), [group["id"] for group in groups])
         
-        # Calculate expense count and total amount for each group
-        for group in groups:
-            expenses = db_client.select("expenses", filters={"group_id": group["id"]})
-            group["expense_count"] = len(expenses)
-            group["total_amount"] = float(sum(Decimal(str(expense["amount"])) for expense in expenses))
+        # Expense count and total amount for every group in a single call
+        if any(projection.wants(field) for field in GROUP_SUMMARY_FIELDS):
+            summaries = db_client.summarize_expenses([group["id"] for group in groups])
+            for group in groups:
+                summary = summaries[group["id"]]
+                group["expense_count"] = summary["expense_count"]
+                group["total_amount"] = to_amount(summary["total_cents"])
         
         return jsonify({
-            "groups": groups,
-            "count": len(groups)
-        })
+            "groups": projection.apply(groups),
+            "count": total,
+            "next_cursor": next_cursor
+        }), 200, etag_headers(etag)
         
     except Exception as e:
         logger.error(f"Error getting user groups: {e}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True) 
\ No newline at end of file
+    import os
+
+    # Development only; production runs through serve.py
+    app.run(host="0.0.0.0", port=8000, debug=os.getenv("FLASK_DEBUG") == "1")
\ No newline at end of file
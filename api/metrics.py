@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Metrics - Prometheus text-format /metrics for every handler
+
+- Per-route request counts by status, latency histograms and an in-flight gauge
+- Upstream (Supabase) latency histograms and error counts by table/operation,
+  fed by upstream_trace.record, and reads saved by single-flight coalescing
+- Hedges, retries, spent retry budget, missed deadlines and circuit breaker
+  state, fed by resilience.py
+- Cache hits/misses/evictions (and hit ratio) read from the caches' stats() at scrape time
+
+The hot path takes no locks: each thread updates its own shard (plain dicts)
+and a scrape sums the shards. With several worker processes, set METRICS_DIR
+to a directory shared by the workers; each one writes its totals there every
+METRICS_FLUSH_SECONDS and on exit, and any worker's /metrics merges them.
+Counters of exited workers are kept so totals never go backwards; their
+gauges are dropped.
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# ================================
+# CONFIGURATION
+# ================================
+METRICS_DIR = os.getenv("METRICS_DIR")
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "2"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+
+class Metric:
+    def __init__(self, name, kind, help, labels=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+
+
+DEFINITIONS = {metric.name: metric for metric in (
+    Metric("http_requests_total", "counter", "Requests served, by route, method and status",
+           ("route", "method", "status")),
+    Metric("http_request_duration_seconds", "histogram", "Request latency, by route and method",
+           ("route", "method"), LATENCY_BUCKETS),
+    Metric("http_requests_in_flight", "gauge", "Requests being served right now"),
+    Metric("upstream_request_duration_seconds", "histogram",
+           "Supabase call latency, by table, operation and outcome (ok or error)",
+           ("table", "operation", "outcome"), LATENCY_BUCKETS),
+    Metric("upstream_errors_total", "counter", "Failed Supabase calls, by table, operation and status",
+           ("table", "operation", "status")),
+    Metric("upstream_coalesced_total", "counter",
+           "Supabase reads served by an identical call already in flight (calls saved), by table", ("table",)),
+    Metric("upstream_hedges_total", "counter",
+           "Hedged Supabase reads (a second copy sent after the p95 delay), by table and whether the hedge answered first",
+           ("table", "outcome")),
+    Metric("upstream_retries_total", "counter", "Supabase reads retried after a failure, by table", ("table",)),
+    Metric("upstream_retry_budget_exhausted_total", "counter",
+           "Retries or hedges not sent because the retry budget was spent, by table", ("table",)),
+    Metric("upstream_deadline_exceeded_total", "counter",
+           "Supabase calls not made because the request's latency budget was spent, by table", ("table",)),
+    Metric("upstream_circuit_open", "gauge", "1 while the circuit breaker fails calls fast, by upstream", ("upstream",)),
+    Metric("upstream_circuit_rejected_total", "counter",
+           "Supabase calls failed fast by an open circuit breaker, by upstream", ("upstream",)),
+    Metric("rate_limited_total", "counter",
+           "Requests turned away with a 429, by route and the bucket that was empty (user or route)",
+           ("route", "scope")),
+    Metric("cache_hits_total", "counter", "Cache hits, by cache", ("cache",)),
+    Metric("cache_misses_total", "counter", "Cache misses, by cache", ("cache",)),
+    Metric("cache_evictions_total", "counter", "Entries evicted to stay within a size bound, by cache", ("cache",)),
+    Metric("cache_hit_ratio", "gauge", "Hits / (hits + misses) over all workers, by cache", ("cache",)),
+)}
+
+
+# ================================
+# PER-THREAD SHARDS
+# ================================
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_collectors = {}
+
+
+def _shard():
+    values = getattr(_local, "values", None)
+    if values is None:
+        values = {}
+        # Once per thread; every later update is lock-free
+        with _shards_lock:
+            _shards.append(values)
+        _local.values = values
+    return values
+
+
+def inc(name, labels=(), amount=1):
+    values = _shard()
+    key = (name, labels)
+    values[key] = values.get(key, 0) + amount
+
+
+def observe(name, labels, seconds):
+    """Add one observation to a histogram; stored as per-bucket counts plus the sum"""
+    values = _shard()
+    key = (name, labels)
+    entry = values.get(key)
+    if entry is None:
+        entry = values[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+    entry[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    entry[-1] += seconds
+
+
+def register_cache(cache, stats, hits="hits", misses="misses", evictions="evictions"):
+    """Report a cache's hit, miss and (if it has any) eviction counts, read from its stats() dict at scrape time"""
+    _collectors[cache] = (stats, hits, misses, evictions)
+
+
+# ================================
+# RECORDING
+# ================================
+
+def request_started():
+    inc("http_requests_in_flight", (), 1)
+
+
+def request_finished(route, method, status, seconds):
+    if METRICS_DIR and _process["flusher"] is None:
+        start_flusher()
+    route = route or "unmatched"
+    inc("http_requests_in_flight", (), -1)
+    inc("http_requests_total", (route, method, str(status)))
+    observe("http_request_duration_seconds", (route, method), seconds)
+
+
+def observe_upstream(method, table, status, seconds):
+    operation = OPERATIONS.get(method, method.lower())
+    failed = not isinstance(status, int) or status >= 400
+    observe("upstream_request_duration_seconds", (table, operation, "error" if failed else "ok"), seconds)
+    if failed:
+        inc("upstream_errors_total", (table, operation, str(status)))
+
+
+def observe_coalesced(table):
+    inc("upstream_coalesced_total", (table,))
+
+
+# ================================
+# SNAPSHOTS AND MERGING
+# ================================
+
+def _add(totals, key, value):
+    current = totals.get(key)
+    if current is None:
+        totals[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        for i, amount in enumerate(value):
+            current[i] += amount
+    else:
+        totals[key] = current + value
+
+
+def snapshot():
+    """This process's totals: {(name, labels): number or histogram list}"""
+    totals = {}
+    with _shards_lock:
+        shards = list(_shards)
+    for values in shards:
+        # dict() copies atomically under the GIL, even while the owner thread writes
+        for key, value in dict(values).items():
+            _add(totals, key, value)
+
+    for cache, (stats, hits, misses, evictions) in list(_collectors.items()):
+        try:
+            counts = stats()
+        except Exception as e:
+            logger.warning(f"⚠️ Cache stats for {cache} failed: {e}")
+            continue
+        totals[("cache_hits_total", (cache,))] = counts.get(hits, 0)
+        totals[("cache_misses_total", (cache,))] = counts.get(misses, 0)
+        if evictions in counts:
+            totals[("cache_evictions_total", (cache,))] = counts[evictions]
+    return totals
+
+
+def _encode(totals):
+    return [[name, list(labels), value] for (name, labels), value in totals.items()]
+
+
+def _decode(rows):
+    return {(name, tuple(labels)): value for name, labels, value in rows}
+
+
+_process = {"pid": None, "path": None, "flusher": None}
+
+
+def _snapshot_path():
+    if _process["pid"] != os.getpid():
+        _process["pid"] = os.getpid()
+        # Start time in the name, so a recycled pid never overwrites an exited worker's totals
+        _process["path"] = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+        _process["flusher"] = None
+    return _process["path"]
+
+
+def flush():
+    """Write this process's totals to METRICS_DIR (atomically); a no-op without it"""
+    if not METRICS_DIR:
+        return
+    path = _snapshot_path()
+    temp = f"{path}.tmp"
+    with open(temp, "w") as f:
+        json.dump({"pid": os.getpid(), "values": _encode(snapshot())}, f)
+    os.replace(temp, path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            logger.warning(f"⚠️ Metrics flush failed: {e}")
+
+
+def start_flusher():
+    """Start this process's background flush thread (once per process)"""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with _shards_lock:
+        _snapshot_path()
+        if _process["flusher"] is None:
+            _process["flusher"] = threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True)
+            _process["flusher"].start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Totals over every worker: this one live, the others from their last flush"""
+    totals = snapshot()
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return totals
+
+    own = _snapshot_path()
+    for entry in os.scandir(METRICS_DIR):
+        if not entry.name.endswith(".json") or entry.path == own:
+            continue
+        try:
+            with open(entry.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(data["pid"])
+        for key, value in _decode(data["values"]).items():
+            if alive or DEFINITIONS[key[0]].kind != "gauge":
+                _add(totals, key, value)
+    return totals
+
+
+# ================================
+# EXPOSITION
+# ================================
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals=None):
+    """Prometheus text exposition format 0.0.4"""
+    totals = collect() if totals is None else totals
+
+    hits = {labels: value for (name, labels), value in totals.items() if name == "cache_hits_total"}
+    for labels, hit_count in hits.items():
+        lookups = hit_count + totals.get(("cache_misses_total", labels), 0)
+        totals[("cache_hit_ratio", labels)] = hit_count / lookups if lookups else 0.0
+
+    by_name = {}
+    for (name, labels), value in totals.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in DEFINITIONS.items():
+        samples = sorted(by_name.get(name, []))
+        if not samples and metric.labels:
+            continue
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        if not samples:
+            lines.append(f"{name} 0")
+        for labels, value in samples:
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_labels(metric.labels, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, "+Inf"), value[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(metric.labels, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric.labels, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(metric.labels, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ================================
+# APP INTEGRATION
+# ================================
+
+def init_flask(app):
+    """Count every request of a Flask app and serve GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_metrics():
+        g.metrics_started = time.perf_counter()
+        request_started()
+
+    @app.after_request
+    def _status_for_metrics(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_metrics(exc):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            request_finished(request.endpoint, request.method, g.pop("metrics_status", 500),
+                             time.perf_counter() - started)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """ASGI middleware doing the same for the Starlette app (the route is metrics_endpoint)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        request_started()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router leaves the matched endpoint in the scope
+            endpoint = scope.get("endpoint")
+            request_finished(getattr(endpoint, "__name__", None), scope["method"], status,
+                             time.perf_counter() - started)
+
+
+async def metrics_endpoint(request):
+    from starlette.responses import Response
+    return Response(render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+def _reset_after_fork():
+    """A forked worker starts from zero; its parent's totals stay the parent's"""
+    global _local, _shards_lock
+    _local = threading.local()
+    _shards_lock = threading.Lock()
+    _shards.clear()
+    _process.update(pid=None, path=None, flusher=None)
+
+
+def _flush_at_exit():
+    if METRICS_DIR and _process["pid"] == os.getpid():
+        flush()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(_flush_at_exit)
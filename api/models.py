@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
 
+from money import parse_amount, to_amount
+
 # Group Models
 class GroupCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
@@ -24,6 +26,11 @@ class ExpenseCreate(BaseModel):
     description: str = Field(..., min_length=1, max_length=255)
     amount: float = Field(..., gt=0, description="Amount must be greater than 0")
 
+    @validator("amount", pre=True)
+    def amount_in_cents(cls, value):
+        # At most two decimal places; normalised through exact cents
+        return to_amount(parse_amount(value))
+
 class ExpenseResponse(BaseModel):
     id: int
     description: str
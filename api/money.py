@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Money - Amounts as integer cents
+
+Amounts are parsed once into integer minor units, summed as integers, and
+turned back into a JSON number only on output. Every handler goes through
+this module, so a group's total is the same wherever it is computed.
+
+Upstream `numeric` values arrive as JSON numbers or strings. For anything
+below MAX_CENTS, `round(float(value) * 100)` recovers the exact cents: a
+double holds a two-decimal amount to well within half a cent. sum_cents()
+copies a list into a C double array and adds it with math.fsum(), which
+stays exact as long as the summed magnitudes are below FSUM_EXACT_CENTS.
+"""
+
+import math
+from array import array
+from decimal import Decimal, InvalidOperation
+
+CENTS = 100
+
+# Exact round trip through a double holds far beyond any realistic amount
+MAX_CENTS = 10 ** 13
+
+# Below this, the representation error of all summed doubles is under a quarter cent
+FSUM_EXACT_CENTS = 2 ** 50
+
+
+class MoneyError(ValueError):
+    """Raised when a value is not a valid amount"""
+
+
+def parse_amount(value):
+    """Cents for a user-supplied amount; at most two decimal places"""
+    if isinstance(value, bool) or value is None:
+        raise MoneyError("Amount must be a valid number")
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise MoneyError("Amount must be a valid number")
+    if not amount.is_finite():
+        raise MoneyError("Amount must be a valid number")
+    cents = amount * CENTS
+    if cents != cents.to_integral_value():
+        raise MoneyError("Amount must have at most 2 decimal places")
+    if abs(cents) >= MAX_CENTS:
+        raise MoneyError("Amount is too large")
+    return int(cents)
+
+
+def to_cents(value):
+    """Cents for an upstream amount (number, numeric string or Decimal)"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value * CENTS
+    if isinstance(value, Decimal):
+        return int((value * CENTS).to_integral_value())
+    return round(float(value) * CENTS)
+
+
+def sum_cents(amounts):
+    """Exact total in cents of many upstream amounts (numbers, numeric strings or Decimals)"""
+    if not isinstance(amounts, (list, tuple)):
+        amounts = list(amounts)
+    try:
+        values = array("d", amounts)
+    except TypeError:
+        values = array("d", map(float, amounts))
+
+    if sum(map(abs, values)) * CENTS < FSUM_EXACT_CENTS:
+        return round(math.fsum(values) * CENTS)
+    # Too large for one rounding at the end: round every amount to cents first
+    return sum(map(round, map(float(CENTS).__mul__, values)))
+
+
+def to_amount(cents):
+    """JSON-ready amount for cents; the float's shortest repr is the exact decimal"""
+    return cents / CENTS
+
+
+def format_cents(cents):
+    """Display string with exactly two decimals, e.g. "-12.50" """
+    sign = "-" if cents < 0 else ""
+    whole, part = divmod(abs(cents), CENTS)
+    return f"{sign}{whole}.{part:02d}"
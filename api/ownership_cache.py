@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Ownership Cache - Per-user set of owned group IDs with TTL
+
+Lets handlers answer "does this user own group X?" with a set lookup
+instead of downloading the user's whole group list on every write.
+Memory is bounded by evicting the least recently used users.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+OWNED_GROUPS_TTL = float(os.getenv("OWNED_GROUPS_TTL", "60"))
+OWNED_GROUPS_MAX_USERS = int(os.getenv("OWNED_GROUPS_MAX_USERS", "10000"))
+
+
+class OwnedGroupCache:
+    """Thread-safe LRU of user_id -> set of owned group IDs"""
+
+    def __init__(self, ttl=OWNED_GROUPS_TTL, max_users=OWNED_GROUPS_MAX_USERS, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Owned group IDs for a user, or None if unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, group_ids):
+        with self._lock:
+            self._entries[user_id] = (self._clock() + self.ttl, set(group_ids))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, user_id, group_id):
+        """Record a newly created group; unknown users are left to load lazily"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1].add(group_id)
+
+    def discard(self, user_id, group_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1].discard(group_id)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "max_users": self.max_users,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
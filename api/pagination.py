@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Pagination - Keyset (cursor) pagination helpers for PostgREST listings
+
+Listings are ordered by (created_at desc, id desc). A page is fetched with
+a range filter on that key rather than an offset, so page N costs the same
+as page 1. The cursor handed to clients is an opaque token encoding the
+key of the last row on the page.
+"""
+
+import json
+import base64
+import binascii
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+ORDER = "created_at.desc,id.desc"
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed limit or cursor"""
+
+
+def encode_cursor(row):
+    key = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError, binascii.Error):
+        raise PaginationError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise PaginationError("Invalid cursor")
+    # Clients control the cursor and keyset_filter quotes the timestamp into a filter,
+    # so only a well-formed timestamp gets that far
+    try:
+        datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except ValueError:
+        raise PaginationError("Invalid cursor")
+    return created_at, row_id
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_SIZE):
+    """Read ?limit= and ?cursor= from a request's query args"""
+    try:
+        limit = int(args.get("limit", default_limit))
+    except (TypeError, ValueError):
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+
+    cursor = args.get("cursor") or None
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+
+def keyset_filter(after):
+    """PostgREST `or` filter selecting rows strictly after the cursor key"""
+    created_at, row_id = after
+    # Timestamps contain reserved characters (`.`, `:`, `+`), so quote them
+    return f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id}))'
+
+
+def keyset_params(limit, after=None):
+    """Query params for one page; one extra row is fetched to detect a next page"""
+    params = {"order": ORDER, "limit": str(limit + 1)}
+    if after is not None:
+        params["or"] = keyset_filter(after)
+    return params
+
+
+def split_page(rows, limit):
+    """Trim the look-ahead row and return (page, next_cursor)"""
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(page[-1])
+    return rows, None
+
+
+def parse_content_range_total(header):
+    """Total row count from a `Content-Range: 0-49/1234` header, if present"""
+    if not header or "/" not in header:
+        return None
+    total = header.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Projection - Client-selectable `?fields=` mapped onto PostgREST `select=`
+
+List endpoints accept `?fields=id,amount` to fetch and return only those
+columns. Columns a handler needs internally (keyset key, amounts for
+totals) are added to the upstream select and trimmed from the response
+again, so the client only ever sees what it asked for.
+"""
+
+EXPENSE_COLUMNS = ("id", "description", "amount", "group_id", "created_by", "created_at", "updated_at")
+GROUP_COLUMNS = ("id", "name", "description", "created_by", "created_at", "updated_at")
+# Per-group totals merged in from the summary query, not stored columns
+GROUP_SUMMARY_FIELDS = ("expense_count", "total_amount")
+
+# Columns every keyset page needs to build its cursor
+KEYSET_COLUMNS = ("id", "created_at")
+
+
+class ProjectionError(ValueError):
+    """Raised for an unknown or empty ?fields= list"""
+
+
+class Projection:
+    """The fields a client asked for; fields=None means everything"""
+
+    def __init__(self, fields=None, computed=()):
+        self.fields = fields
+        self.computed = computed
+
+    def wants(self, field):
+        return self.fields is None or field in self.fields
+
+    def select(self, *required):
+        """PostgREST select string covering the requested and required columns"""
+        if self.fields is None:
+            return "*"
+        columns = [field for field in self.fields if field not in self.computed]
+        columns += [column for column in required if column not in columns]
+        return ",".join(columns)
+
+    def apply(self, rows):
+        """Drop columns the client did not ask for"""
+        if self.fields is None:
+            return rows
+        return [{field: row[field] for field in self.fields if field in row} for row in rows]
+
+
+def parse_fields(args, columns, computed=()):
+    """Read ?fields= from a request's query args into a Projection"""
+    raw = args.get("fields")
+    if raw is None:
+        return Projection(computed=computed)
+
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(",") if field.strip()))
+    if not fields:
+        raise ProjectionError("fields must name at least one column")
+    unknown = [field for field in fields if field not in columns and field not in computed]
+    if unknown:
+        raise ProjectionError(f"Unknown fields: {', '.join(unknown)}")
+    return Projection(fields, computed)
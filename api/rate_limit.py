@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Rate Limit - Per-user and per-route token buckets in front of Supabase
+
+Every request spends tokens before it is served. It spends its route's
+cost (ROUTE_COSTS), which is about the number of Supabase calls the route
+makes with cold caches. So a groups listing costs more than deleting an
+expense. Health checks and /metrics cost nothing and are never limited.
+
+- Per user: each caller has a bucket of RATE_LIMIT_BURST tokens, refilled
+  at RATE_LIMIT_RATE tokens per second. The caller is the user, when the
+  token checks out locally or is already in the verified-token cache. A
+  bearer token not verified yet is its own caller, keyed by its hash, so
+  clients behind one address do not share a bucket. Requests without a token
+  are limited by client address. The limiter never asks Supabase Auth, so a
+  throttled request makes no upstream call at all.
+- Per route: RATE_LIMIT_ROUTE_RATES caps the tokens a route may spend per
+  second across all callers, e.g. "get_user_groups=200". Routes not listed
+  are not capped. These buckets are per process: with N workers a route
+  gets N times its rate.
+
+A request that does not fit gets a 429 with Retry-After and never reaches
+Supabase. Buckets live in the process. When SHARED_CACHE_URL is set, user
+buckets live in the shared backend instead, so all workers draw from one
+bucket per user. A caller told to wait is then turned away locally until
+the wait is over, so hammering past the limit costs no round trip. If the
+shared backend fails, the worker falls back to its own buckets until the
+backend is back.
+"""
+
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================
+# CONFIGURATION
+# ================================
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "10"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "50"))
+# Callers tracked per process; the least recently seen start over with a full bucket
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+DEFAULT_COST = float(os.getenv("RATE_LIMIT_DEFAULT_COST", "1"))
+
+
+def _parse_rates(text):
+    """{route: number} from "get_user_groups=3,create_expenses_batch=5" """
+    rates = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        route, _, value = item.partition("=")
+        rates[route.strip()] = float(value)
+    return rates
+
+
+# Tokens per request, by endpoint name (the Flask and Starlette apps share most names);
+# RATE_LIMIT_COSTS adds to or overrides these
+ROUTE_COSTS = {
+    "root": 0,
+    "health_check": 0,
+    "metrics": 0,
+    "metrics_endpoint": 0,
+    "get_user_groups": 2,
+    "get_group_detail": 2,
+    "get_group_expenses": 3,
+    "get_expenses_for_group": 3,
+    "get_expense_by_id": 2,
+    "create_group": 1,
+    "create_expense": 2,
+    "add_expense_to_group": 2,
+    "create_expenses_batch": 5,
+    "add_expenses_batch": 5,
+    "delete_group": 1,
+    "delete_expense": 1,
+    **_parse_rates(os.getenv("RATE_LIMIT_COSTS", ""))
+}
+
+# Tokens per second each route may spend in one worker, across all callers
+ROUTE_RATES = _parse_rates(os.getenv("RATE_LIMIT_ROUTE_RATES", ""))
+
+
+# ================================
+# BUCKETS
+# ================================
+
+class TokenBucket:
+    """burst tokens, refilled continuously at rate per second"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost, now):
+        """0 if cost tokens were spent, else seconds until they are there"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A cost above the burst could never be paid; it empties a full bucket instead
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class RateLimiter:
+    """Per-caller and per-route token buckets; take() says whether a request may go ahead"""
+
+    def __init__(self, rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST, costs=None, route_rates=None,
+                 backend=None, max_keys=RATE_LIMIT_MAX_KEYS, clock=time.monotonic, enabled=RATE_LIMIT_ENABLED):
+        self.enabled = enabled
+        self.rate = rate
+        self.burst = burst
+        self.costs = ROUTE_COSTS if costs is None else costs
+        self.route_rates = ROUTE_RATES if route_rates is None else route_rates
+        self.backend = backend
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._callers = OrderedDict()
+        self._routes = {}
+        # caller -> clock time until which the shared bucket has said no
+        self._blocked = {}
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def cost(self, route):
+        if not self.enabled:
+            return 0
+        return self.costs.get(route, DEFAULT_COST)
+
+    def take(self, caller, route):
+        """Spend a request's tokens; 0 if it may go ahead, else seconds until it may"""
+        cost = self.cost(route)
+        if cost <= 0:
+            return 0.0
+        now = self.clock()
+
+        with self._lock:
+            route_bucket = self._route_bucket(route, now)
+            wait = route_bucket.take(cost, now) if route_bucket else 0.0
+        if wait:
+            return self._limited(route, "route", wait)
+
+        wait = self._take_caller(caller, cost, now)
+        if wait:
+            if route_bucket:
+                # Turned away: the route's capacity goes to someone who is let in
+                with self._lock:
+                    route_bucket.refund(cost)
+            return self._limited(route, "user", wait)
+        with self._lock:
+            self.allowed += 1
+        return 0.0
+
+    def _take_caller(self, caller, cost, now):
+        if self.backend is not None:
+            with self._lock:
+                blocked_until = self._blocked.get(caller)
+            if blocked_until is not None and now < blocked_until:
+                return blocked_until - now
+            try:
+                wait = self.backend.take(f"ratelimit:{caller}", min(cost, self.burst), self.rate, self.burst)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.warning(f"⚠️ Shared rate limit unavailable ({e}); using this worker's buckets")
+            else:
+                if wait:
+                    self._block(caller, now + wait)
+                return wait
+
+        with self._lock:
+            bucket = self._callers.get(caller)
+            if bucket is None:
+                bucket = self._callers[caller] = TokenBucket(self.rate, self.burst, now)
+                if len(self._callers) > self.max_keys:
+                    self._callers.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._callers.move_to_end(caller)
+            return bucket.take(cost, now)
+
+    def _block(self, caller, until):
+        with self._lock:
+            if len(self._blocked) >= self.max_keys:
+                now = self.clock()
+                self._blocked = {key: value for key, value in self._blocked.items() if value > now}
+            self._blocked[caller] = until
+
+    def _route_bucket(self, route, now):
+        bucket = self._routes.get(route)
+        if bucket is None:
+            rate = self.route_rates.get(route)
+            if not rate:
+                return None
+            # One second of the route's traffic may arrive at once
+            bucket = self._routes[route] = TokenBucket(rate, rate, now)
+        return bucket
+
+    def _limited(self, route, scope, wait):
+        with self._lock:
+            self.limited += 1
+        metrics.inc("rate_limited_total", (route, scope))
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._callers.clear()
+            self._routes.clear()
+            self._blocked.clear()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "rate": self.rate,
+            "burst": self.burst,
+            "callers": len(self._callers),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "errors": self.errors,
+            "evictions": self.evictions
+        }
+
+
+def caller(user, address, token=None):
+    """Bucket key: the verified user, else the bearer token's hash, else the client address"""
+    if user and user.get("id"):
+        return f"user:{user['id']}"
+    if token:
+        return f"token:{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+    return f"addr:{address}"
+
+
+def retry_after(wait):
+    """Retry-After value (whole seconds, at least 1)"""
+    return str(max(1, math.ceil(wait)))
+
+
+def bearer_token(header):
+    return header.replace("Bearer ", "") if header else None
+
+
+# ================================
+# APP INTEGRATION
+# ================================
+
+def init_flask(app, limiter, verify):
+    """Limit every request of a Flask app; verify(token) returns the token's user or None without calling out"""
+    from flask import jsonify, request
+
+    @app.before_request
+    def _rate_limit():
+        if request.method == "OPTIONS" or limiter.cost(request.endpoint) <= 0:
+            return None
+        token = bearer_token(request.headers.get("Authorization"))
+        try:
+            user = verify(token) if token else None
+        except Exception:
+            # The handler reports the failure; the request is counted against its token
+            user = None
+        wait = limiter.take(caller(user, request.remote_addr, token), request.endpoint)
+        if wait:
+            return jsonify({"error": "Too many requests"}), 429, {"Retry-After": retry_after(wait)}
+        return None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware doing the same for the Starlette app"""
+
+    def __init__(self, app, limiter, routes, verify):
+        from starlette.routing import Match
+        from starlette.responses import JSONResponse
+
+        self.app = app
+        self.limiter = limiter
+        self.routes = routes
+        self.verify = verify
+        self._full_match = Match.FULL
+        self._response = JSONResponse
+
+    def _endpoint(self, scope):
+        for route in self.routes:
+            match, child = route.matches(scope)
+            if match == self._full_match:
+                return child.get("endpoint")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # The router has not run yet; find the route the same way it will
+        endpoint = self._endpoint(scope)
+        route = getattr(endpoint, "__name__", None)
+        if self.limiter.cost(route) > 0:
+            headers = dict(scope["headers"])
+            token = bearer_token(headers.get(b"authorization", b"").decode("latin-1"))
+            try:
+                user = self.verify(token) if token else None
+            except Exception:
+                user = None
+            client = scope.get("client")
+            wait = self.limiter.take(caller(user, client[0] if client else None, token), route)
+            if wait:
+                # Lets the metrics middleware label the 429 with its route
+                scope["endpoint"] = endpoint
+                response = self._response({"error": "Too many requests"}, status_code=429,
+                                          headers={"Retry-After": retry_after(wait)})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
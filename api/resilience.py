@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+"""
+Resilience - Deadlines, hedged reads, a retry budget and a circuit breaker for upstream calls
+
+Every Supabase call of the fast and async handlers goes through an Upstream:
+
+- Deadlines: each request gets a latency budget for its route (ROUTE_BUDGETS,
+  else UPSTREAM_BUDGET). Each attempt's timeout is whatever is left of the
+  budget, capped at the call's own timeout. No attempt starts once the budget
+  is spent.
+- Hedging: a read still unanswered after its table's p95 latency is sent a
+  second time, and the first good answer wins. A table is only hedged once
+  HEDGE_MIN_SAMPLES of its latencies are known. In threaded workers the
+  first attempt runs on the request's own thread and only hedges take one
+  of the HEDGE_THREADS; when they are all busy, reads go unhedged.
+- Retries: a read that failed is tried again after a short jittered backoff,
+  up to RETRY_ATTEMPTS attempts. A failure is a connection error, a timeout,
+  a 5xx or a 429.
+- Retry budget: hedges and retries both spend tokens from a budget that
+  earns RETRY_BUDGET_RATIO of a token per call. Against a failing upstream,
+  they add at most that fraction of extra load.
+- Circuit breaker: once BREAKER_FAILURE_RATE of the last BREAKER_WINDOW
+  attempts have failed, calls fail at once for BREAKER_COOLDOWN seconds.
+  After that, one probe is let through, and its outcome closes or reopens
+  the circuit.
+
+Writes are never hedged or retried: a POST that timed out may still have
+landed. A call that cannot be answered raises UpstreamUnavailable, which the
+handlers turn into a 503 with Retry-After instead of an empty result.
+
+Upstream serves threaded workers; AsyncUpstream serves one event loop.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ================================
+# CONFIGURATION
+# ================================
+UPSTREAM_BUDGET = float(os.getenv("UPSTREAM_BUDGET", "4"))
+
+
+def _parse_budgets(text):
+    """{route: seconds} from "create_expenses_batch=30,get_group_expenses=2" """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        route, _, seconds = item.partition("=")
+        budgets[route.strip()] = float(seconds)
+    return budgets
+
+
+# Routes whose work is bigger than a page of reads; UPSTREAM_ROUTE_BUDGETS adds to or overrides these
+ROUTE_BUDGETS = {
+    "create_expenses_batch": 30.0,
+    **_parse_budgets(os.getenv("UPSTREAM_ROUTE_BUDGETS", ""))
+}
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.01"))
+HEDGE_THREADS = int(os.getenv("HEDGE_THREADS", "32"))
+LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "200"))
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.05"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "10"))
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "5"))
+
+
+# ================================
+# ERRORS
+# ================================
+
+class UpstreamUnavailable(Exception):
+    """The upstream could not answer in time; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+def failed(response):
+    """True for responses that say the upstream is unhealthy rather than that the request was wrong"""
+    return response.status_code >= 500 or response.status_code == 429
+
+
+# ================================
+# DEADLINES
+# ================================
+
+class Deadline:
+    """A request's latency budget; the route may be resolved lazily (the ASGI router runs after the middleware)"""
+
+    def __init__(self, route=None, clock=time.monotonic):
+        self.started = clock()
+        self.clock = clock
+        self._route = route
+        self._expires = None
+
+    @property
+    def expires(self):
+        if self._expires is None:
+            route = self._route() if callable(self._route) else self._route
+            self._expires = self.started + ROUTE_BUDGETS.get(route, UPSTREAM_BUDGET)
+        return self._expires
+
+    def remaining(self):
+        return self.expires - self.clock()
+
+
+_deadline = ContextVar("upstream_deadline", default=None)
+
+
+def start_deadline(route=None, clock=time.monotonic):
+    """Start the current request's budget; returns a token for end_deadline"""
+    return _deadline.set(Deadline(route, clock))
+
+
+def end_deadline(token):
+    _deadline.reset(token)
+
+
+def clear_deadline():
+    """Drop the current request's budget: a streamed export outlives any page budget, so its chunks keep only their own timeout"""
+    _deadline.set(None)
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def init_flask(app):
+    """Give every request of a Flask app its route's budget"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_deadline():
+        g.upstream_deadline = start_deadline(request.endpoint)
+
+    @app.teardown_request
+    def _end_deadline(exc):
+        token = g.pop("upstream_deadline", None)
+        if token is not None:
+            end_deadline(token)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware doing the same for the Starlette app"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The router leaves the matched endpoint in the scope before the first upstream call
+        token = start_deadline(lambda: getattr(scope.get("endpoint"), "__name__", None))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end_deadline(token)
+
+
+# ================================
+# BUILDING BLOCKS
+# ================================
+
+class LatencyWindow:
+    """The last few latencies of one table's successful calls"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q):
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class RetryBudget:
+    """Tokens for extra attempts: every call earns `ratio` of one, every retry or hedge spends one"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, max_tokens=RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        # Starts full, so a fresh worker can still retry its first failures
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """closed -> open after too many failures -> half_open after the cooldown -> closed or open again"""
+
+    def __init__(self, name="supabase", window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.opened_at = None
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if an attempt may go out now; in half_open only the one probe may"""
+        with self._lock:
+            if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                logger.info(f"🔌 Circuit {self.name} half-open: sending a probe")
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+        metrics.inc("upstream_circuit_rejected_total", (self.name,))
+        return False
+
+    def retry_after(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 1
+            return max(1, int(self.cooldown - (self.clock() - self.opened_at) + 0.999))
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+                if ok:
+                    self._close()
+                else:
+                    self._open()
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if (self.state == "closed" and len(self._outcomes) >= self.min_calls
+                    and failures >= self.failure_rate * len(self._outcomes)):
+                self._open()
+
+    def _open(self):
+        if self.state == "closed":
+            metrics.inc("upstream_circuit_open", (self.name,), 1)
+        self.state = "open"
+        self.opened_at = self.clock()
+        self.opened += 1
+        logger.warning(f"🔌 Circuit {self.name} open for {self.cooldown}s after upstream failures")
+
+    def _close(self):
+        metrics.inc("upstream_circuit_open", (self.name,), -1)
+        self.state = "closed"
+        self.opened_at = None
+        self._outcomes.clear()
+        logger.info(f"🔌 Circuit {self.name} closed")
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "opened": self.opened, "rejected": self.rejected}
+
+
+# ================================
+# POLICY
+# ================================
+
+class _Policy:
+    """Decisions shared by the threaded and async executors"""
+
+    def __init__(self, name="supabase", breaker=None, retry_budget=None, hedging=True,
+                 attempts=RETRY_ATTEMPTS, backoff=RETRY_BACKOFF):
+        self.breaker = breaker or CircuitBreaker(name)
+        self.retry_budget = retry_budget or RetryBudget()
+        self.hedging = hedging
+        self.attempts = attempts
+        self.backoff = backoff
+        self.latencies = {}
+        self.hedges = 0
+        self.hedges_won = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.deadlines_exceeded = 0
+
+    def _timeout(self, table, ceiling):
+        """This attempt's timeout: the request's remaining budget, capped at the call's own timeout"""
+        left = remaining()
+        if left is None:
+            return ceiling
+        if left <= 0:
+            self.deadlines_exceeded += 1
+            metrics.inc("upstream_deadline_exceeded_total", (table,))
+            raise DeadlineExceeded(f"Request budget spent before calling {table}")
+        return min(ceiling, left)
+
+    def _admit(self, table):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"Circuit open: not calling {table}", self.breaker.retry_after())
+
+    def _spend(self, table):
+        """A token for one retry or hedge, if the budget has one"""
+        if self.retry_budget.withdraw():
+            return True
+        self.budget_exhausted += 1
+        metrics.inc("upstream_retry_budget_exhausted_total", (table,))
+        return False
+
+    def _hedge_delay(self, table, timeout):
+        """Seconds to wait before hedging, or None to not hedge this read"""
+        window = self.latencies.get(table)
+        if not self.hedging or window is None or len(window) < HEDGE_MIN_SAMPLES:
+            return None
+        delay = max(HEDGE_MIN_DELAY, window.percentile(HEDGE_PERCENTILE))
+        return delay if delay < timeout else None
+
+    def _record(self, table, ok, seconds=None):
+        self.breaker.record(ok)
+        if ok and seconds is not None:
+            self.latencies.setdefault(table, LatencyWindow()).add(seconds)
+
+    def _hedged(self, table, hedge_won):
+        self.hedges += 1
+        if hedge_won:
+            self.hedges_won += 1
+        metrics.inc("upstream_hedges_total", (table, "won" if hedge_won else "lost"))
+
+    def _retrying(self, table, tries, error):
+        """Seconds to back off before the next attempt, or None to give up with error"""
+        if tries >= self.attempts or not self._spend(table):
+            return None
+        delay = random.uniform(0, self.backoff * 2 ** (tries - 1))
+        left = remaining()
+        if left is not None and left <= delay:
+            return None
+        self.retries += 1
+        metrics.inc("upstream_retries_total", (table,))
+        logger.info(f"🔁 Retrying {table} after {error} (attempt {tries + 1})")
+        return delay
+
+    def _unavailable(self, table, error):
+        if isinstance(error, UpstreamUnavailable):
+            return error
+        status = getattr(error, "status_code", None)
+        detail = f"status {status}" if status is not None else f"{type(error).__name__}: {error}"
+        return UpstreamUnavailable(f"Upstream {table} unavailable ({detail})", self.breaker.retry_after())
+
+    def stats(self):
+        return {
+            "circuit": self.breaker.stats(),
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "retries": self.retries,
+            "retry_budget_exhausted": self.budget_exhausted,
+            "deadlines_exceeded": self.deadlines_exceeded,
+            "p95_ms": {table: round(window.percentile(0.95) * 1000, 1)
+                       for table, window in list(self.latencies.items()) if len(window)}
+        }
+
+
+# Hedges run here; they are leaf calls, so they never wait on one another
+_attempts = None
+_attempts_lock = threading.Lock()
+# One per hedge thread: a read that finds them all taken goes unhedged rather than queue for one
+_hedge_slots = threading.BoundedSemaphore(HEDGE_THREADS)
+
+
+def _submit(fn, *args):
+    global _attempts
+    if _attempts is None:
+        with _attempts_lock:
+            if _attempts is None:
+                _attempts = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="upstream")
+    # In a copy of the caller's context, so upstream_trace counts the call against its request
+    return _attempts.submit(contextvars.copy_context().run, fn, *args)
+
+
+class _Hedge:
+    """The second attempt of one threaded read, and whether it went out or won"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.primary_done = threading.Event()
+        self.sent = False
+        # Came back good while the primary was still out
+        self.first = False
+        self.future = None
+
+    def send(self):
+        """Claim the hedge for sending, unless the primary has already finished"""
+        with self.lock:
+            self.sent = not self.primary_done.is_set()
+            return self.sent
+
+    def answered(self):
+        with self.lock:
+            self.first = not self.primary_done.is_set()
+
+    def finish_primary(self):
+        """(hedge sent?, hedge answered first?) as of the primary finishing"""
+        with self.lock:
+            self.primary_done.set()
+            return self.sent, self.first
+
+
+class _Failed(Exception):
+    """A response that counts as a failure, carried through the retry loop as an error"""
+
+    def __init__(self, response):
+        super().__init__(f"status {response.status_code}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+class Upstream(_Policy):
+    """Runs upstream calls for threaded workers
+
+    attempt(timeout) makes one call and returns its response.
+    """
+
+    def read(self, table, attempt, timeout=5):
+        """A hedged, retried read; raises UpstreamUnavailable if no good answer came in time"""
+        self.retry_budget.deposit()
+        tries = 0
+        while True:
+            tries += 1
+            this_timeout = self._timeout(table, timeout)
+            self._admit(table)
+            try:
+                return self._first_good(table, attempt, this_timeout)
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                delay = self._retrying(table, tries, e)
+                if delay is None:
+                    raise self._unavailable(table, e) from e
+                time.sleep(delay)
+
+    def write(self, table, attempt, timeout=5):
+        """One attempt, within the deadline and the circuit; raises UpstreamUnavailable on failure"""
+        self.retry_budget.deposit()
+        this_timeout = self._timeout(table, timeout)
+        self._admit(table)
+        try:
+            return self._attempt(table, attempt, this_timeout)
+        except Exception as e:
+            raise self._unavailable(table, e) from e
+
+    def _attempt(self, table, attempt, timeout):
+        started = time.perf_counter()
+        try:
+            response = attempt(timeout)
+        except Exception:
+            self._record(table, False)
+            raise
+        if failed(response):
+            self._record(table, False)
+            raise _Failed(response)
+        self._record(table, True, time.perf_counter() - started)
+        return response
+
+    def _first_good(self, table, attempt, timeout):
+        delay = self._hedge_delay(table, timeout)
+        if delay is None or not _hedge_slots.acquire(blocking=False):
+            return self._attempt(table, attempt, timeout)
+
+        hedge = _Hedge()
+        try:
+            hedge.future = _submit(self._hedge, hedge, table, attempt, delay, timeout, time.monotonic())
+        except BaseException:
+            _hedge_slots.release()
+            raise
+
+        # The primary runs on the request's own thread; only the hedge takes a pool thread
+        error = None
+        try:
+            response = self._attempt(table, attempt, timeout)
+        except Exception as e:
+            error = e
+        sent, hedge_first = hedge.finish_primary()
+        if not sent:
+            if error is not None:
+                raise error
+            return response
+        if hedge_first:
+            self._hedged(table, True)
+            return hedge.future.result()
+        if error is None:
+            self._hedged(table, False)
+            return response
+
+        # The primary failed while the hedge was out: the hedge's answer may still be good
+        try:
+            response = hedge.future.result()
+        except Exception:
+            self._hedged(table, False)
+            raise error
+        self._hedged(table, True)
+        return response
+
+    def _hedge(self, hedge, table, attempt, delay, timeout, started):
+        """Runs on a hedge thread: a second attempt once the primary has been out for delay seconds"""
+        try:
+            if hedge.primary_done.wait(delay) or not self.breaker.allow() or not self._spend(table):
+                return None
+            if not hedge.send():
+                return None
+            response = self._attempt(table, attempt, max(0.001, timeout - (time.monotonic() - started)))
+            hedge.answered()
+            return response
+        finally:
+            _hedge_slots.release()
+
+
+class AsyncUpstream(_Policy):
+    """Runs upstream calls for one event loop
+
+    attempt(timeout) is a coroutine function making one call.
+    """
+
+    async def read(self, table, attempt, timeout=5):
+        """A hedged, retried read; raises UpstreamUnavailable if no good answer came in time"""
+        self.retry_budget.deposit()
+        tries = 0
+        while True:
+            tries += 1
+            this_timeout = self._timeout(table, timeout)
+            self._admit(table)
+            try:
+                return await self._first_good(table, attempt, this_timeout)
+            except UpstreamUnavailable:
+                raise
+            except Exception as e:
+                delay = self._retrying(table, tries, e)
+                if delay is None:
+                    raise self._unavailable(table, e) from e
+                await asyncio.sleep(delay)
+
+    async def write(self, table, attempt, timeout=5):
+        """One attempt, within the deadline and the circuit; raises UpstreamUnavailable on failure"""
+        self.retry_budget.deposit()
+        this_timeout = self._timeout(table, timeout)
+        self._admit(table)
+        try:
+            return await self._attempt(table, attempt, this_timeout)
+        except Exception as e:
+            raise self._unavailable(table, e) from e
+
+    async def _attempt(self, table, attempt, timeout):
+        started = time.perf_counter()
+        try:
+            response = await attempt(timeout)
+        except Exception:
+            self._record(table, False)
+            raise
+        if failed(response):
+            self._record(table, False)
+            raise _Failed(response)
+        self._record(table, True, time.perf_counter() - started)
+        return response
+
+    async def _first_good(self, table, attempt, timeout):
+        delay = self._hedge_delay(table, timeout)
+        if delay is None:
+            return await self._attempt(table, attempt, timeout)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(self._attempt(table, attempt, timeout))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done or not self.breaker.allow() or not self._spend(table):
+            return await primary
+
+        hedge = asyncio.ensure_future(
+            self._attempt(table, attempt, max(0.001, timeout - (loop.time() - started)))
+        )
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._hedged(table, task is hedge)
+                        return task.result()
+            self._hedged(table, False)
+            return await primary
+        finally:
+            # The loser's answer is not needed; unlike a thread, a task can be stopped
+            for task in pending:
+                task.cancel()
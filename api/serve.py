@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Serve - Production launcher for the handler apps (pre-fork, like gunicorn)
+
+    python serve.py                                   # main.py, one worker per core
+    python serve.py --app async                       # async_group_handler.py on uvicorn workers
+    python serve.py --app fast --workers 4 --threads 16 --bind 0.0.0.0:8080
+
+The master process imports the app once, opens the listening socket and
+forks the workers, which all accept on that socket. A broken deploy fails
+before any worker starts, and workers share the imported code
+copy-on-write.
+
+- sync workers serve WSGI apps on a bounded thread pool. A worker only
+  accepts while it has a free thread, so busy workers leave new
+  connections to idle ones.
+- async workers run uvicorn (ASGI apps, or WSGI apps on its thread pool)
+- A worker is recycled after --max-requests, plus up to
+  --max-requests-jitter more so that workers do not all restart at once.
+  A fresh fork replaces it. A worker that dies is also replaced.
+- On SIGTERM or SIGINT, workers drain: they stop accepting, finish
+  in-flight requests for up to --graceful-timeout seconds and exit.
+  SIGHUP forks a new set of workers, then drains the old ones.
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import socket
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import app_factory
+
+logger = logging.getLogger("serve")
+
+
+def cpu_count():
+    """Cores this process may run on (respects CPU affinity and container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# ================================
+# CONFIGURATION
+# ================================
+# Requests mostly wait on Supabase, so one worker per core, each with a few threads
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_count()
+THREADS = int(os.getenv("WEB_THREADS", "8"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+BIND = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+BACKLOG = 2048
+# Seconds a client may stall while sending its request or reading the response
+CLIENT_TIMEOUT = 30
+# Workers that die sooner than this after starting are respawned with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+
+# ================================
+# SYNC (THREADED) WORKER
+# ================================
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = CLIENT_TIMEOUT
+
+    def log_request(self, *args, **kwargs):
+        # upstream_trace already logs one line per request
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that serves requests on a fixed-size thread pool (like gunicorn --threads)
+
+    A connection is only accepted while a thread is free; the rest wait in
+    the listen backlog, where other workers sharing the socket pick them up.
+    """
+
+    def __init__(self, host, port, app, threads, fd=None, max_requests=0, on_limit=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self._free = threading.Semaphore(threads)
+        self._count_lock = threading.Lock()
+        self.served = 0
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        if fd is not None:
+            # Shared with the other workers: accept() must not block when one of them wins the race
+            self.socket.setblocking(False)
+
+    def process_request(self, request, client_address):
+        self._free.acquire()
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._free.release()
+            with self._count_lock:
+                self.served += 1
+                reached = self.served == self.max_requests
+            if reached and self.on_limit:
+                self.on_limit()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight requests; True if they all finished"""
+        deadline = time.monotonic() + timeout
+        for _ in range(self.threads):
+            if not self._free.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+
+def run_sync_worker(app, sock, threads, max_requests, graceful_timeout):
+    """Serve until SIGTERM/SIGINT or max_requests, then drain; returns the exit code"""
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno(), max_requests=max_requests,
+                              on_limit=stopping.set)
+    sock.close()
+    threading.Thread(target=server.serve_forever, args=(0.5,), name="accept", daemon=True).start()
+
+    while not stopping.wait(1.0):
+        pass
+    server.shutdown()
+    server.server_close()
+    if not server.drain(graceful_timeout):
+        logger.warning(f"⚠️ Worker {os.getpid()}: requests still running after {graceful_timeout:.0f}s, exiting")
+        return 1
+    return 0
+
+
+# ================================
+# ASYNC (UVICORN) WORKER
+# ================================
+
+def run_async_worker(app, sock, interface, max_requests, graceful_timeout):
+    """Serve on a uvicorn event loop; uvicorn drains on SIGTERM/SIGINT itself"""
+    import uvicorn
+
+    config = uvicorn.Config(
+        app, interface="asgi3" if interface == "asgi" else "wsgi", lifespan="auto" if interface == "asgi" else "off",
+        timeout_graceful_shutdown=graceful_timeout, limit_max_requests=max_requests or None,
+        access_log=False, log_config=None
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+    return 0
+
+
+# ================================
+# MASTER
+# ================================
+
+def create_socket(bind, backlog=BACKLOG):
+    """Listening TCP socket for "host:port", shared by every worker"""
+    host, _, port = bind.rpartition(":")
+    host = host.strip("[]") or "0.0.0.0"
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    return sock
+
+
+class Arbiter:
+    """Forks and supervises the workers"""
+
+    def __init__(self, app, interface, sock, workers=WORKERS, threads=THREADS, worker_class=None,
+                 max_requests=MAX_REQUESTS, max_requests_jitter=MAX_REQUESTS_JITTER,
+                 graceful_timeout=GRACEFUL_TIMEOUT):
+        self.app = app
+        self.interface = interface
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.worker_class = worker_class or ("async" if interface == "asgi" else "sync")
+        if self.worker_class == "sync" and interface != "wsgi":
+            raise ValueError("sync workers serve WSGI apps only; use --worker-class async")
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.children = {}
+        self._stopping = False
+        self._reloading = False
+
+    def _request_limit(self):
+        if not self.max_requests:
+            return 0
+        return self.max_requests + random.randint(0, self.max_requests_jitter)
+
+    def spawn(self):
+        limit = self._request_limit()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        # Worker process: never returns into the master's loop
+        code = 1
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            if self.worker_class == "sync":
+                code = run_sync_worker(self.app, self.sock, self.threads, limit, self.graceful_timeout)
+            else:
+                code = run_async_worker(self.app, self.sock, self.interface, limit, self.graceful_timeout)
+            _flush_metrics()
+        except BaseException:
+            logger.exception(f"❌ Worker {os.getpid()} crashed")
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reloading = True
+        else:
+            self._stopping = True
+
+    def reap(self):
+        """Collect exited workers; returns [(pid, exit code, seconds it ran)]"""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            started = self.children.pop(pid, None)
+            if started is not None:
+                exited.append((pid, os.waitstatus_to_exitcode(status), time.monotonic() - started))
+        return exited
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._signal)
+        host, port = self.sock.getsockname()[:2]
+        logger.info(f"🚀 Serving on http://{host}:{port} with {self.workers} {self.worker_class} workers"
+                    + (f" x {self.threads} threads" if self.worker_class == "sync" else ""))
+
+        for _ in range(self.workers):
+            self.spawn()
+        try:
+            while not self._stopping:
+                for pid, code, lifetime in self.reap():
+                    if code:
+                        logger.error(f"❌ Worker {pid} exited with {code} after {lifetime:.1f}s")
+                        if lifetime < MIN_WORKER_LIFETIME:
+                            # Crashing at startup: don't fork in a tight loop
+                            time.sleep(1.0)
+                if self._reloading:
+                    self._reloading = False
+                    self.reload()
+                while len(self.children) < self.workers and not self._stopping:
+                    self.spawn()
+                time.sleep(0.1)
+        finally:
+            self.stop()
+
+    def reload(self):
+        """Start a new set of workers, then drain the old ones"""
+        old = list(self.children)
+        logger.info(f"🔄 Replacing {len(old)} workers")
+        for _ in range(self.workers):
+            self.spawn()
+        # Until they exit, the old workers count towards the target, so none are respawned
+        self._kill(old, signal.SIGTERM)
+
+    def stop(self):
+        """Drain every worker, then kill whatever outlives the graceful timeout"""
+        logger.info(f"🛑 Draining {len(self.children)} workers")
+        self._kill(list(self.children), signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        if self.children:
+            logger.warning(f"⚠️ Killing {len(self.children)} workers that did not drain")
+            self._kill(list(self.children), signal.SIGKILL)
+            deadline = time.monotonic() + 5
+            while self.children and time.monotonic() < deadline:
+                self.reap()
+                time.sleep(0.05)
+        self.sock.close()
+
+    def _kill(self, pids, signum):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+
+def _flush_metrics():
+    # Workers leave through os._exit, which skips atexit, so metrics are flushed here
+    metrics = sys.modules.get("metrics")
+    if metrics is not None:
+        try:
+            metrics.flush()
+        except OSError as e:
+            logger.warning(f"⚠️ Metrics flush failed: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Production server for the ExpenseTracker API")
+    parser.add_argument("--app", choices=sorted(app_factory.VARIANTS), default=os.getenv("APP_VARIANT", "main"))
+    parser.add_argument("--bind", default=BIND, help="host:port to listen on")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: one per core)")
+    parser.add_argument("--threads", type=int, default=THREADS, help="threads per sync worker")
+    parser.add_argument("--worker-class", choices=("sync", "async"),
+                        help="sync (threaded, WSGI apps) or async (uvicorn); default: by app")
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS, help="recycle workers after this many (0: never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    # Preload: import errors surface here, before anything is forked
+    app = app_factory.create_app(args.app)
+    logging.getLogger().setLevel(args.log_level.upper())
+    logger.setLevel(logging.INFO)
+
+    arbiter = Arbiter(
+        app, app_factory.interface(args.app), create_socket(args.bind), workers=args.workers,
+        threads=args.threads, worker_class=args.worker_class, max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter, graceful_timeout=args.graceful_timeout
+    )
+    arbiter.run()
+
+
+if __name__ == "__main__":
+    main()
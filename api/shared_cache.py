@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Shared Cache - State shared by all worker processes, and the invalidation bus
+
+Under gunicorn every worker has its own ownership, expense and ETag caches.
+A write served by one worker must reach the others, or they keep serving
+what it replaced. SHARED_CACHE_URL selects where the shared state lives:
+
+- unset: nothing is shared (one worker process)
+- sqlite:///path/to/cache.db: a local SQLite file (WAL, memory-mapped), no
+  service to run; every worker on the host opens the same file
+- redis://host:port/db: any server speaking the Redis protocol; workers
+  may then run on several hosts
+
+Each backend keeps TTL'd string entries (ETag versions, so every worker
+issues and accepts the same ETags), rate-limit buckets and a feed of
+invalidated cache keys.
+Mutations publish the keys they changed (`user:<id>`, `group:<id>`), and
+every other worker drops those entries before serving its next request.
+With SQLite a request sees every write that finished before it started;
+Redis pub/sub delivers within a round trip. A worker that may have missed
+invalidations (log trimmed, Redis reconnect) receives "*" and drops
+everything.
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlsplit, unquote
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+# Invalidations older than this are trimmed from the SQLite log
+INVALIDATION_LOG_SECONDS = float(os.getenv("INVALIDATION_LOG_SECONDS", "300"))
+KEY_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "expense-tracker:")
+# Redis bucket updates lost to a concurrent writer are retried this many times
+TAKE_ATTEMPTS = int(os.getenv("SHARED_CACHE_TAKE_ATTEMPTS", "5"))
+
+# Published key meaning "assume everything changed"
+EVERYTHING = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invalidations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    key TEXT NOT NULL,
+    at REAL NOT NULL
+);
+"""
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+def _gcra(tat, now, cost, rate, burst):
+    """A token bucket kept as one timestamp (GCRA): when the bucket will be full again
+
+    Returns (new timestamp, 0) if cost tokens are there, else (old timestamp,
+    seconds until they are).
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + cost / rate
+    wait = new_tat - burst / rate - now
+    if wait > 0:
+        return tat, wait
+    return new_tat, 0.0
+
+
+# ================================
+# BACKENDS
+# ================================
+
+class SharedBackend:
+    """TTL'd string entries plus an ordered feed of invalidated keys"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl, only_if_absent=False):
+        """Store a value for ttl seconds; with only_if_absent, returns False if one exists"""
+        raise NotImplementedError
+
+    def take(self, key, cost, rate, burst):
+        """Spend cost tokens from a bucket of burst refilled at rate/s; 0 if spent, else seconds to wait"""
+        raise NotImplementedError
+
+    def publish(self, origin, keys):
+        raise NotImplementedError
+
+    def receive(self):
+        """[(origin, key)] published by anyone since the last call in this process"""
+        raise NotImplementedError
+
+
+class SQLiteSharedBackend(SharedBackend):
+    """Shared state in one SQLite file; readers never block the writer (WAL)"""
+
+    def __init__(self, path, log_seconds=INVALIDATION_LOG_SECONDS):
+        self.path = path
+        self.log_seconds = log_seconds
+        self._pid = None
+        self._connection().executescript(SCHEMA)
+
+    def _reset(self):
+        # Connections and locks are not shared with a forked child
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._seen = None
+        self._writes = 0
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            self._reset()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, cached_statements=64, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA mmap_size=67108864")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl, only_if_absent=False):
+        connection = self._connection()
+        now = time.time()
+        sql = ("INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+               "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at")
+        if only_if_absent:
+            # An expired entry counts as absent
+            cursor = connection.execute(sql + " WHERE entries.expires_at <= ?", (key, value, now + ttl, now))
+        else:
+            cursor = connection.execute(sql, (key, value, now + ttl))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        return cursor.rowcount == 1
+
+    def take(self, key, cost, rate, burst):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            tat, wait = _gcra(float(row[0]) if row else None, now, cost, rate, burst)
+            if not wait:
+                # Once full again the bucket needs no entry
+                connection.execute(
+                    "INSERT INTO entries (key, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                    (key, repr(tat), tat)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def publish(self, origin, keys):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO invalidations (origin, key, at) VALUES (?, ?, ?)", [(origin, key, now) for key in keys]
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                # The newest entry always stays, so readers can tell a trimmed gap from no news
+                connection.execute(
+                    "DELETE FROM invalidations WHERE at < ? AND seq < (SELECT max(seq) FROM invalidations)",
+                    (now - self.log_seconds,)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def receive(self):
+        connection = self._connection()
+        with self._lock:
+            if self._seen is None:
+                # Only what is published from now on concerns this process
+                self._seen = connection.execute("SELECT coalesce(max(seq), 0) FROM invalidations").fetchone()[0]
+                return []
+            rows = connection.execute(
+                "SELECT seq, origin, key FROM invalidations WHERE seq > ? ORDER BY seq", (self._seen,)
+            ).fetchall()
+            if not rows:
+                return []
+            # Writers are serialized, so sequence numbers have no holes unless trimmed
+            missed = rows[0][0] != self._seen + 1
+            self._seen = rows[-1][0]
+        if missed:
+            return [(None, EVERYTHING)]
+        return [(origin, key) for _, origin, key in rows]
+
+
+class RespConnection:
+    """One connection to a Redis-protocol server (RESP2)"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=2.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+
+    def read(self):
+        line = self._file.readline()
+        if not line:
+            raise SharedCacheError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise SharedCacheError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            return None if size < 0 else self._file.read(size + 2)[:-2].decode()
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self.read() for _ in range(size)]
+        raise SharedCacheError(f"Unexpected reply: {line!r}")
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def pipeline(self, *commands):
+        """Send several commands in one round trip; their replies in order"""
+        for args in commands:
+            self.send(*args)
+        return [self.read() for _ in commands]
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisSharedBackend(SharedBackend):
+    """Shared state in Redis (or anything speaking its protocol); invalidations via pub/sub"""
+
+    def __init__(self, url, prefix=KEY_PREFIX):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.strip("/") or 0)
+        self.password = unquote(parts.password) if parts.password else None
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidations"
+        self._pid = None
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inbox = deque()
+        self._subscriber = None
+
+    def _connect(self, timeout=2.0):
+        return RespConnection(self.host, self.port, self.db, self.password, timeout)
+
+    def _command(self, *args):
+        return self._call(lambda connection: connection.command(*args))
+
+    def _pipeline(self, *commands):
+        return self._call(lambda connection: connection.pipeline(*commands))
+
+    def _call(self, request):
+        if self._pid != os.getpid():
+            self._reset()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        try:
+            return request(connection)
+        except (OSError, SharedCacheError):
+            # Reconnect on the next call; the caller decides what a failure means
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def get(self, key):
+        return self._command("GET", self.prefix + key)
+
+    def set(self, key, value, ttl, only_if_absent=False):
+        args = ["SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000))]
+        if only_if_absent:
+            args.append("NX")
+        return self._command(*args) == "OK"
+
+    def take(self, key, cost, rate, burst):
+        key = self.prefix + key
+        for _ in range(TAKE_ATTEMPTS):
+            # Optimistic: the update is dropped if another worker wrote the bucket after WATCH
+            _, value = self._pipeline(("WATCH", key), ("GET", key))
+            now = time.time()
+            tat, wait = _gcra(float(value) if value else None, now, cost, rate, burst)
+            if wait:
+                self._command("UNWATCH")
+                return wait
+            ttl = max(1, int((tat - now) * 1000) + 1)
+            *_, applied = self._pipeline(("MULTI",), ("SET", key, repr(tat), "PX", ttl), ("EXEC",))
+            if applied is not None:
+                return 0.0
+        # Too contended to tell; come back after about one request's worth of refill
+        return cost / rate
+
+    def publish(self, origin, keys):
+        self._command("PUBLISH", self.channel, "\n".join([origin, *keys]))
+
+    def receive(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._subscriber is None:
+            with self._lock:
+                if self._subscriber is None:
+                    subscribed = threading.Event()
+                    self._subscriber = threading.Thread(
+                        target=self._listen, args=(subscribed,), name="shared-cache-subscriber", daemon=True
+                    )
+                    self._subscriber.start()
+                    subscribed.wait(2.0)
+        events = []
+        while self._inbox:
+            events.append(self._inbox.popleft())
+        return events
+
+    def _listen(self, subscribed):
+        delay = 0.1
+        first = True
+        while True:
+            try:
+                connection = self._connect(timeout=None)
+                connection.command("SUBSCRIBE", self.channel)
+                if not first:
+                    # Anything published while disconnected was lost
+                    self._inbox.append((None, EVERYTHING))
+                first = False
+                delay = 0.1
+                subscribed.set()
+                while True:
+                    kind, _, message = connection.read()
+                    if kind == "message":
+                        origin, *keys = message.split("\n")
+                        self._inbox.extend((origin, key) for key in keys)
+            except (OSError, SharedCacheError, ValueError) as e:
+                logger.warning(f"⚠️ Shared cache subscription lost ({e}); reconnecting")
+                subscribed.set()
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+
+def from_env(url=SHARED_CACHE_URL):
+    """The backend SHARED_CACHE_URL selects, or None when nothing is shared"""
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        return RedisSharedBackend(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL: {url}")
+
+
+# ================================
+# INVALIDATION BUS
+# ================================
+
+class InvalidationBus:
+    """Tells the other workers which cache keys a write changed; a no-op without a backend"""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._listeners = []
+        self._origin = (None, None)
+        self.published = 0
+        self.received = 0
+        self.resyncs = 0
+        self.errors = 0
+
+    @property
+    def origin(self):
+        """Unique per process, so a worker skips its own invalidations"""
+        pid, origin = self._origin
+        if pid != os.getpid():
+            origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self._origin = (os.getpid(), origin)
+        return origin
+
+    def subscribe(self, listener):
+        """listener(keys) is called with the keys other workers invalidated"""
+        self._listeners.append(listener)
+
+    def publish(self, *keys):
+        if self.backend is None or not keys:
+            return
+        try:
+            self.backend.publish(self.origin, keys)
+            self.published += len(keys)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Publishing invalidations {keys} failed: {e}")
+
+    def poll(self):
+        """Apply other workers' invalidations; called before serving each request"""
+        if self.backend is None:
+            return
+        try:
+            events = self.backend.receive()
+        except Exception as e:
+            # Nothing is marked seen, so the next poll retries
+            self.errors += 1
+            logger.warning(f"⚠️ Receiving invalidations failed: {e}")
+            return
+        origin = self.origin
+        keys = [key for sender, key in events if sender != origin]
+        if not keys:
+            return
+        if EVERYTHING in keys:
+            self.resyncs += 1
+            keys = [EVERYTHING]
+        self.received += len(keys)
+        for listener in self._listeners:
+            listener(keys)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "published": self.published,
+            "received": self.received,
+            "resyncs": self.resyncs,
+            "errors": self.errors
+        }
+
+    def init_flask(self, app):
+        """Poll before every request of a Flask app"""
+        app.before_request(self.poll)
+
+
+class InvalidationMiddleware:
+    """ASGI middleware polling the bus before every request of the Starlette app"""
+
+    def __init__(self, app, bus):
+        self.app = app
+        self.bus = bus
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.bus.poll()
+        await self.app(scope, receive, send)
+
+
+def evict_from(owned_groups, expense_cache):
+    """Bus listener dropping invalidated users and groups from a handler's local caches"""
+
+    def evict(keys):
+        for key in keys:
+            if key == EVERYTHING:
+                owned_groups.clear()
+                expense_cache.clear()
+                return
+            kind, _, value = key.partition(":")
+            if kind == "user":
+                owned_groups.invalidate(value)
+            elif kind == "group" and value.isdigit():
+                expense_cache.invalidate(int(value))
+
+    return evict
@@ -4,7 +4,9 @@ Simple Group Handler - Works without complex dependencies
 Uses direct HTTP requests to Supabase REST API
 """
 
-import requests
+from http_pool import get_session, pool_stats
+from jwt_auth import verifier_from_env
+from json_provider import FastJSONProvider
 import json
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -51,13 +53,18 @@ class SupabaseClient:
             "Content-Type": "application/json"
         }
 
+    @property
+    def session(self):
+        """Shared keep-alive session for this worker"""
+        return get_session()
+
     def create_group(self, group_data):
         """Create a new group in Supabase"""
         try:
             logger.info(f"Creating group: {group_data}")
             
             url = f"{self.base_url}/groups"
-            response = requests.post(url, headers=self.db_headers, json=group_data)
+            response = self.session.post(url, headers=self.db_headers, json=group_data)
             
             if response.status_code in [200, 201]:
                 result = response.json()
@@ -85,7 +92,7 @@ class SupabaseClient:
                 "order": "created_at.desc"
             }
             
-            response = requests.get(url, headers=self.db_headers, params=params)
+            response = self.session.get(url, headers=self.db_headers, params=params)
             
             if response.status_code == 200:
                 return response.json()
@@ -106,7 +113,7 @@ class SupabaseClient:
                 "Content-Type": "application/json"
             }
             
-            response = requests.get(auth_url, headers=headers)
+            response = self.session.get(auth_url, headers=headers)
             
             if response.status_code == 200:
                 user_data = response.json()
@@ -129,7 +136,7 @@ class SupabaseClient:
             url = f"{self.base_url}/groups"
             params = {"limit": "1"}
             
-            response = requests.get(url, headers=self.db_headers, params=params)
+            response = self.session.get(url, headers=self.db_headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -146,8 +153,12 @@ supabase = SupabaseClient()
 # FLASK APPLICATION
 # ================================
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, origins=Config.CORS_ORIGINS)
 
+# Local JWT verification when configured, cached remote verification otherwise
+token_verifier = verifier_from_env(Config.SUPABASE_URL, remote_verify=lambda token: supabase.verify_user_token(token))
+
 def get_current_user():
     """Extract and verify user from Authorization header"""
     auth_header = request.headers.get('Authorization')
@@ -156,7 +167,7 @@ def get_current_user():
     
     try:
         token = auth_header.replace("Bearer ", "")
-        user = supabase.verify_user_token(token)
+        user = token_verifier.verify(token)
         if not user:
             return None, {"error": "Invalid token"}, 401
         return user, None, None
@@ -186,7 +197,11 @@ def root():
 @app.route("/health")
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "Simple Group Handler API"})
+    return jsonify({
+        "status": "healthy",
+        "service": "Simple Group Handler API",
+        "upstream_pool": pool_stats()
+    })
 
 @app.route("/test")
 def test_connection():
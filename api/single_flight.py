@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Single Flight - Identical concurrent upstream reads share one call
+
+GroupDetailPage loads the group list and the expenses in parallel, so the
+same user's identical reads often reach a worker at the same moment. The
+first caller for a key makes the upstream call. Callers that arrive while
+it is in flight wait for it and get the same response instead of making
+their own. Nothing is kept once the call returns: this is not a cache.
+
+Keys are (URL, query params, headers). The headers carry the user's token,
+so a call is only shared between requests that would read the same rows
+under row-level security. Callers share the response object, whose body is
+already read; each one parses its own copy.
+
+A write calls forget(): reads already in flight may have started before
+it, so later callers start a fresh call instead of joining them.
+
+A caller that joins another's call waits no longer than what is left of its
+own request's budget (resilience.remaining()). The call may be serving a
+route with a longer budget. A caller whose budget runs out gets
+DeadlineExceeded while the call carries on for the others.
+
+SingleFlight serves threaded workers; AsyncSingleFlight serves one event loop.
+"""
+
+import asyncio
+import threading
+
+from resilience import DeadlineExceeded, remaining
+
+
+def read_key(url, params=None, headers=None):
+    """Key for a GET: identical only if the URL, every filter and every header match"""
+    return (
+        str(url),
+        tuple(sorted((params or {}).items())),
+        tuple(sorted((headers or {}).items()))
+    )
+
+
+def _wait_budget():
+    """Seconds a joining caller may wait: what is left of its request's budget, or no limit outside a request"""
+    left = remaining()
+    return None if left is None else max(0.0, left)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stats:
+    def __init__(self, on_shared):
+        self.on_shared = on_shared
+        self.calls = 0
+        self.shared = 0
+        self.forgotten = 0
+
+    def _joined(self, key):
+        self.shared += 1
+        if self.on_shared:
+            self.on_shared(key)
+
+    def _stats(self, in_flight):
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "in_flight": in_flight,
+            "forgotten": self.forgotten
+        }
+
+
+class SingleFlight(_Stats):
+    """Coalesces identical calls made from several threads
+
+    on_shared(key) is called once for every caller served by another's call.
+    """
+
+    def __init__(self, on_shared=None):
+        super().__init__(on_shared)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """fn()'s result, or the result of the identical call already in flight; errors are shared too"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if self.on_shared:
+                self.on_shared(key)
+            if not call.done.wait(_wait_budget()):
+                raise DeadlineExceeded("Request budget spent waiting for a shared read")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self):
+        """Calls already in flight finish for their callers, but nobody new joins them"""
+        with self._lock:
+            self._calls.clear()
+            self.forgotten += 1
+
+    def stats(self):
+        with self._lock:
+            return self._stats(len(self._calls))
+
+
+class AsyncSingleFlight(_Stats):
+    """Coalesces identical calls made from coroutines on one event loop
+
+    The call runs as its own task, so a caller that is cancelled (say, its
+    client disconnected) leaves it running for the others.
+    """
+
+    def __init__(self, on_shared=None):
+        super().__init__(on_shared)
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """The result of await fn(), or of the identical call already in flight"""
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is not asyncio.get_running_loop():
+            # Left over from a loop that was shut down mid-call
+            task = None
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.calls += 1
+            return await asyncio.shield(task)
+
+        self._joined(key)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), _wait_budget())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request budget spent waiting for a shared read")
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so a call whose callers were all cancelled logs no warning
+            task.exception()
+
+    def forget(self):
+        """Calls already in flight finish for their callers, but nobody new joins them"""
+        self._calls.clear()
+        self.forgotten += 1
+
+    def stats(self):
+        return self._stats(len(self._calls))
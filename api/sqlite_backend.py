@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+SQLite Backend - Embedded storage behind the DatabaseBackend interface
+
+For single-node deployments and perf tests: no network, sub-millisecond
+queries. Selected with DATABASE_BACKEND=sqlite (file at SQLITE_PATH).
+
+- WAL journal, so readers never block the single writer
+- Indexes match the listings: groups(created_by, created_at, id) and
+  expenses(group_id, created_at, id), so keyset pages are index range scans
+- Every statement is parameterized and built from whitelisted identifiers;
+  sqlite3's per-connection statement cache keeps them prepared
+- Amounts are stored as integer cents and read back as numbers
+- One connection per thread
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from database import DatabaseBackend
+from money import to_cents
+import streaming
+from pagination import encode_cursor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS groups_created_by_idx ON groups (created_by, created_at, id);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    description TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    group_id INTEGER NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+    created_by TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS expenses_group_created_idx ON expenses (group_id, created_at, id);
+"""
+
+# Public column name -> SQL expression, per table
+COLUMNS = {
+    "groups": {
+        "id": "id", "name": "name", "description": "description",
+        "created_by": "created_by", "created_at": "created_at", "updated_at": "updated_at"
+    },
+    "expenses": {
+        "id": "id", "description": "description", "amount": "amount_cents / 100.0", "group_id": "group_id",
+        "created_by": "created_by", "created_at": "created_at", "updated_at": "updated_at"
+    }
+}
+
+WRITABLE = {
+    "groups": ("name", "description", "created_by"),
+    "expenses": ("description", "amount", "group_id", "created_by")
+}
+
+
+class SQLiteDatabaseClient(DatabaseBackend):
+    def __init__(self, path: str = "expenses.db"):
+        self.path = path
+        self._local = threading.local()
+        self._clock_lock = threading.Lock()
+        self._last_stamp = None
+        self._connection().executescript(SCHEMA)
+
+    @property
+    def errors(self) -> Tuple[type, ...]:
+        return (sqlite3.Error,)
+
+    # ----- connections and SQL building -----
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, cached_statements=256, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def _stamp(self) -> str:
+        """Strictly increasing, fixed-width UTC timestamps, so text order is insert order"""
+        with self._clock_lock:
+            now = datetime.now(timezone.utc)
+            if self._last_stamp is not None and now <= self._last_stamp:
+                now = self._last_stamp + timedelta(microseconds=1)
+            self._last_stamp = now
+            return now.isoformat(timespec="microseconds")
+
+    def _columns(self, table: str) -> Dict[str, str]:
+        try:
+            return COLUMNS[table]
+        except KeyError:
+            raise ValueError(f"Unknown table: {table}")
+
+    def _select_list(self, table: str, columns: str) -> str:
+        known = self._columns(table)
+        names = list(known) if columns.strip() == "*" else [name.strip() for name in columns.split(",")]
+        for name in names:
+            if name not in known:
+                raise ValueError(f"Unknown column {table}.{name}")
+        return ", ".join(f"{known[name]} AS {name}" if known[name] != name else name for name in names)
+
+    def _where(self, table: str, filters: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+        known = self._columns(table)
+        clauses, values = [], []
+        for name, value in (filters or {}).items():
+            if name not in known or name == "amount":
+                raise ValueError(f"Cannot filter on {table}.{name}")
+            clauses.append(f"{name} = ?")
+            values.append(value)
+        return clauses, values
+
+    @staticmethod
+    def _rows(cursor) -> List[Dict[Any, Any]]:
+        return [dict(row) for row in cursor.fetchall()]
+
+    # ----- DatabaseBackend -----
+    def insert(self, table: str, data) -> List[Dict[Any, Any]]:
+        rows = data if isinstance(data, list) else [data]
+        writable = WRITABLE.get(table)
+        if writable is None:
+            raise ValueError(f"Unknown table: {table}")
+
+        columns = [("amount_cents" if name == "amount" else name) for name in writable]
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}, created_at, updated_at) "
+               f"VALUES ({', '.join('?' for _ in columns)}, ?, ?) RETURNING {self._select_list(table, '*')}")
+
+        connection = self._connection()
+        created = []
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for row in rows:
+                unknown = set(row) - set(writable)
+                if unknown:
+                    raise ValueError(f"Unknown column(s) for {table}: {', '.join(sorted(unknown))}")
+                values = [to_cents(row.get(name)) if name == "amount" else row.get(name) for name in writable]
+                stamp = self._stamp()
+                created.extend(self._rows(connection.execute(sql, [*values, stamp, stamp])))
+        return created
+
+    def load_rows(self, table: str, rows: List[Dict[Any, Any]]) -> int:
+        """Bulk insert without returning rows, for fixtures and synthetic data"""
+        writable = WRITABLE[table]
+        columns = [("amount_cents" if name == "amount" else name) for name in writable]
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}, created_at, updated_at) "
+               f"VALUES ({', '.join('?' for _ in columns)}, ?, ?)")
+
+        def values():
+            for row in rows:
+                stamp = self._stamp()
+                yield [*(to_cents(row.get(name)) if name == "amount" else row.get(name) for name in writable), stamp, stamp]
+
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(sql, values())
+        return len(rows)
+
+    def delete(self, table: str, filters: Dict[str, Any], columns: str = "id") -> List[Dict[Any, Any]]:
+        clauses, values = self._where(table, filters)
+        sql = f"DELETE FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" RETURNING {self._select_list(table, columns)}"
+        connection = self._connection()
+        with connection:
+            return self._rows(connection.execute(sql, values))
+
+    def delete_group(self, group_id: int, user_id: str) -> List[Dict[Any, Any]]:
+        # Expenses go with the group through ON DELETE CASCADE
+        return self.delete("groups", {"id": group_id, "created_by": user_id})
+
+    def select(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, order: str = None) -> List[Dict[Any, Any]]:
+        clauses, values = self._where(table, filters)
+        sql = f"SELECT {self._select_list(table, columns)} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if order:
+            column, _, direction = order.partition(".")
+            if column not in self._columns(table):
+                raise ValueError(f"Cannot order by {table}.{column}")
+            sql += f" ORDER BY {column} {'DESC' if direction.lower() == 'desc' else 'ASC'}"
+        return self._rows(self._connection().execute(sql, values))
+
+    def _keyset_rows(self, table: str, columns: str, filters: Optional[Dict[str, Any]], limit: int,
+                     after: Optional[Tuple[str, int]]) -> Tuple[List[Dict[Any, Any]], List[str]]:
+        """Up to limit + 1 rows past the cursor, newest first, and the helper columns added to them"""
+        clauses, values = self._where(table, filters)
+        if after is not None:
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            values.extend([after[0], after[0], after[1]])
+
+        # The keyset columns ride along for the cursor and are dropped again if not asked for
+        select = self._select_list(table, columns)
+        requested = None if columns.strip() == "*" else [name.strip() for name in columns.split(",")]
+        extra = [name for name in ("created_at", "id") if requested is not None and name not in requested]
+        if extra:
+            select += ", " + ", ".join(extra)
+
+        sql = f"SELECT {select} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        rows = self._rows(self._connection().execute(sql, [*values, limit + 1]))
+        return rows, extra
+
+    def select_page(self, table: str, columns: str = "*", filters: Dict[str, Any] = None, limit: int = 50,
+                    after: Optional[Tuple[str, int]] = None, count: bool = False) -> Tuple[List[Dict[Any, Any]], Optional[str], Optional[int]]:
+        rows, extra = self._keyset_rows(table, columns, filters, limit, after)
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+        for name in extra:
+            for row in rows:
+                del row[name]
+
+        total = None
+        if count and after is None:
+            clauses, values = self._where(table, filters)
+            sql = f"SELECT COUNT(*) FROM {table}" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            total = self._connection().execute(sql, values).fetchone()[0]
+        return rows, next_cursor, total
+
+    def iter_chunks(self, table: str, columns: str = "*", filters: Dict[str, Any] = None) -> Iterator[List[Dict[Any, Any]]]:
+        chunk_size = streaming.EXPORT_CHUNK_SIZE
+        after = None
+        while True:
+            rows, extra = self._keyset_rows(table, columns, filters, chunk_size, after)
+            more = len(rows) > chunk_size
+            rows = rows[:chunk_size]
+            if rows:
+                after = (rows[-1]["created_at"], rows[-1]["id"])
+                for name in extra:
+                    for row in rows:
+                        del row[name]
+                yield rows
+            if not more:
+                return
+
+    def summarize_expenses(self, group_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        summaries = {group_id: {"expense_count": 0, "total_cents": 0} for group_id in group_ids}
+        if not group_ids:
+            return summaries
+        sql = (f"SELECT group_id, COUNT(*), SUM(amount_cents) FROM expenses "
+               f"WHERE group_id IN ({', '.join('?' for _ in group_ids)}) GROUP BY group_id")
+        for group_id, expense_count, total_cents in self._connection().execute(sql, list(group_ids)):
+            summaries[group_id] = {"expense_count": expense_count, "total_cents": total_cents}
+        return summaries
+
+    def verify_user_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """There is no auth server here; tokens are verified locally with SUPABASE_JWT_SECRET/JWKS"""
+        print("SQLite backend cannot verify tokens remotely; set SUPABASE_JWT_SECRET or SUPABASE_JWKS_PATH")
+        return None
@@ -2,11 +2,13 @@
 """
 Flask ExpenseTracker API Server
 Run this script to start the API server
+
+    python start.py           # production server (serve.py), one worker per core
+    python start.py --dev     # Flask development server with auto-reload
 """
 
 import sys
 import os
-from main import app
 
 # Add the api directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -16,10 +18,17 @@ if __name__ == "__main__":
     print("📡 Server will be available at: http://localhost:8000")
     print("📖 API Documentation available in code")
     print("\n" + "="*50)
-    
-    # Run the Flask server
-    app.run(
-        host="localhost",
-        port=8000,
-        debug=True  # Auto-reload on code changes
-    ) 
\ No newline at end of file
+
+    if "--dev" in sys.argv[1:]:
+        from app_factory import create_app
+
+        # Single process with the debugger and auto-reload on code changes; never use in production
+        create_app("main").run(
+            host="localhost",
+            port=8000,
+            debug=True
+        )
+    else:
+        import serve
+
+        serve.main(sys.argv[1:])
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Streaming - Incremental JSON export of large expense listings
+
+Rows are pulled from upstream in keyset-ordered chunks and written out as
+soon as each chunk arrives, so a request never holds more than one chunk
+in memory. The document has the same shape as the paged listing:
+
+    {"group_id": 1, "expenses": [...], "count": 123, "total_amount": 456.78}
+
+`count` and `total_amount` are computed while streaming and written in the
+trailing keys after the array. If upstream fails part way through, the
+status line has already gone out, so the trailer carries `"error"` instead
+of totals and `"complete": false`.
+"""
+
+import os
+import logging
+from json_provider import dumps_bytes
+from money import sum_cents, to_amount
+from pagination import keyset_params, split_page
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+STREAM_MIMETYPE = "application/json"
+
+
+def wants_stream(args):
+    """True for ?stream=1 / ?stream=true on a listing request"""
+    return str(args.get("stream", "")).lower() in ("1", "true", "yes")
+
+
+def _encode(value):
+    """Same encoder as the JSON responses, so an export row matches the paged listing byte for byte"""
+    return dumps_bytes(value)
+
+
+def iter_keyset_chunks(fetch, chunk_size=None):
+    """Yield lists of rows from fetch(params) until the listing is exhausted
+
+    fetch receives the keyset params for one chunk and returns the raw rows;
+    it should raise on upstream errors so the export is not silently cut short.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    after = None
+    while True:
+        rows, next_cursor = split_page(fetch(keyset_params(chunk_size, after)), chunk_size)
+        if rows:
+            yield rows
+        if next_cursor is None:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+async def aiter_keyset_chunks(fetch, chunk_size=None):
+    """Async variant of iter_keyset_chunks for an awaitable fetch(params)"""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    after = None
+    while True:
+        rows, next_cursor = split_page(await fetch(keyset_params(chunk_size, after)), chunk_size)
+        if rows:
+            yield rows
+        if next_cursor is None:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+class ExportWriter:
+    """Encodes one export document piece by piece and keeps running totals
+
+    project, if given, trims each chunk after it has been totalled, so the
+    trailer stays correct when the client did not ask for `amount`.
+    """
+
+    def __init__(self, key="expenses", project=None, **fields):
+        self.key = key
+        self.project = project
+        self.fields = fields
+        self.count = 0
+        self.cents = 0
+
+    def head(self):
+        prefix = b"".join(_encode(name) + b":" + _encode(value) + b"," for name, value in self.fields.items())
+        return b"{" + prefix + _encode(self.key) + b":["
+
+    def chunk(self, rows):
+        separator = b"," if self.count else b""
+        self.count += len(rows)
+        self.cents += sum_cents(row.get("amount") or 0 for row in rows)
+        if self.project is not None:
+            rows = self.project(rows)
+        return separator + b",".join(_encode(row) for row in rows)
+
+    def trailer(self, error=None):
+        if error is not None:
+            return b'],"complete":false,"error":' + _encode(error) + b"}"
+        return f'],"count":{self.count},"total_amount":{to_amount(self.cents)},"complete":true}}'.encode()
+
+
+def stream_export(chunks, key="expenses", project=None, **fields):
+    """Generator of bytes for a Flask streaming response"""
+    writer = ExportWriter(key, project, **fields)
+    yield writer.head()
+    try:
+        for rows in chunks:
+            yield writer.chunk(rows)
+    except Exception as e:
+        logger.error(f"Export stream failed after {writer.count} rows: {e}")
+        yield writer.trailer(error="Upstream error while streaming export")
+        return
+    yield writer.trailer()
+
+
+async def astream_export(chunks, key="expenses", project=None, **fields):
+    """Async generator of bytes for a Starlette StreamingResponse"""
+    writer = ExportWriter(key, project, **fields)
+    yield writer.head()
+    try:
+        async for rows in chunks:
+            yield writer.chunk(rows)
+    except Exception as e:
+        logger.error(f"Export stream failed after {writer.count} rows: {e}")
+        yield writer.trailer(error="Upstream error while streaming export")
+        return
+    yield writer.trailer()
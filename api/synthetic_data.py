@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data - Deterministic users, groups and expenses for load tests
+
+Rows are generated lazily in batches from a seeded RNG, so the same
+(scale, seed) always produces the same dataset and even the largest scale
+never has to be held in memory. Group sizes are skewed: a few groups get
+thousands of expenses while most have a handful, like real usage.
+
+Scales:
+    tiny    20 users      100 groups       2,000 expenses   (unit tests)
+    small   1k users      10k groups     200,000 expenses   (stand-in default)
+    medium  5k users      50k groups   1,000,000 expenses
+    large   10k users    100k groups  10,000,000 expenses   (SQLite backend)
+"""
+
+import uuid
+import random
+from collections import namedtuple
+
+from money import to_amount
+
+Scale = namedtuple("Scale", "users groups expenses")
+
+SCALES = {
+    "tiny": Scale(20, 100, 2_000),
+    "small": Scale(1_000, 10_000, 200_000),
+    "medium": Scale(5_000, 50_000, 1_000_000),
+    "large": Scale(10_000, 100_000, 10_000_000),
+}
+
+BATCH_SIZE = 10_000
+
+WORDS = ("Dinner", "Taxi", "Hotel", "Groceries", "Fuel", "Tickets", "Coffee", "Rent", "Snacks", "Museum")
+
+
+class Dataset:
+    """What was loaded: user IDs and each user's group IDs, for picking request targets"""
+
+    def __init__(self, scale, seed):
+        self.scale = scale
+        self.seed = seed
+        self.users = []
+        self.groups_by_user = {}
+        self.expenses = 0
+
+    @property
+    def group_count(self):
+        return sum(len(groups) for groups in self.groups_by_user.values())
+
+    def add_groups(self, rows):
+        for row in rows:
+            self.groups_by_user.setdefault(row["created_by"], []).append(row["id"])
+
+
+def resolve_scale(scale):
+    return SCALES[scale] if isinstance(scale, str) else scale
+
+
+def make_users(scale, seed=0):
+    rng = random.Random(f"users:{seed}")
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(resolve_scale(scale).users)]
+
+
+def iter_groups(scale, users, seed=0, batch_size=BATCH_SIZE):
+    """Batches of group rows, owners spread evenly at random"""
+    scale = resolve_scale(scale)
+    rng = random.Random(f"groups:{seed}")
+    batch = []
+    for i in range(scale.groups):
+        batch.append({
+            "name": f"{rng.choice(WORDS)} group {i}",
+            "description": None if i % 3 else f"Synthetic group {i}",
+            "created_by": users[rng.randrange(len(users))]
+        })
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_expenses(scale, groups, seed=0, batch_size=BATCH_SIZE):
+    """Batches of expense rows for groups given as [(group_id, owner)]; sizes are skewed"""
+    scale = resolve_scale(scale)
+    rng = random.Random(f"expenses:{seed}")
+    batch = []
+    for _ in range(scale.expenses):
+        # Squaring a uniform draw favours the first groups, giving a long tail
+        group_id, owner = groups[int(len(groups) * rng.random() ** 2)]
+        batch.append({
+            "description": rng.choice(WORDS),
+            "amount": to_amount(rng.randrange(100, 20_000)),
+            "group_id": group_id,
+            "created_by": owner
+        })
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _owned_pairs(dataset):
+    return [(group_id, user) for user, group_ids in dataset.groups_by_user.items() for group_id in group_ids]
+
+
+def load_stand_in(server, scale="small", seed=0):
+    """Seed a LocalSupabase in memory"""
+    dataset = Dataset(resolve_scale(scale), seed)
+    dataset.users = make_users(dataset.scale, seed)
+    for batch in iter_groups(dataset.scale, dataset.users, seed):
+        dataset.add_groups(server.seed("groups", batch))
+    for batch in iter_expenses(dataset.scale, sorted(_owned_pairs(dataset)), seed):
+        server.seed("expenses", batch)
+        dataset.expenses += len(batch)
+    return dataset
+
+
+def load_sqlite(db, scale="small", seed=0):
+    """Bulk load a SQLiteDatabaseClient"""
+    dataset = Dataset(resolve_scale(scale), seed)
+    dataset.users = make_users(dataset.scale, seed)
+    for batch in iter_groups(dataset.scale, dataset.users, seed):
+        db.load_rows("groups", batch)
+    dataset.add_groups(db.select("groups", columns="id,created_by"))
+    for batch in iter_expenses(dataset.scale, sorted(_owned_pairs(dataset)), seed):
+        db.load_rows("expenses", batch)
+        dataset.expenses += len(batch)
+    return dataset
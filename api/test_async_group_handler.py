@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test the ASGI handler against the local Supabase stand-in
+"""
+
+import time
+
+from conftest import USER_ID
+
+
+def test_group_and_expense_lifecycle(async_client, auth_headers):
+    group = async_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"}).json()
+    expense = async_client.post(f"/api/groups/{group['id']}/expenses", headers=auth_headers,
+                                json={"description": "Fuel", "amount": 40.5}).json()
+
+    listing = async_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers).json()
+    assert listing["count"] == 1
+    assert listing["total_amount"] == 40.5
+
+    groups = async_client.get("/api/groups", headers=auth_headers).json()
+    assert groups["groups"][0]["expense_count"] == 1
+
+    assert async_client.get(f"/api/expenses/{expense['id']}", headers=auth_headers).status_code == 200
+    assert async_client.delete(f"/api/expenses/{expense['id']}", headers=auth_headers).status_code == 200
+    assert async_client.delete(f"/api/groups/{group['id']}", headers=auth_headers).status_code == 200
+
+
+def test_missing_or_invalid_token_is_rejected(async_client):
+    assert async_client.get("/api/groups").status_code == 401
+    assert async_client.get("/api/groups", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_foreign_group_expenses_are_hidden(server, async_client, auth_headers):
+    other = server.seed("groups", [{"name": "Not mine", "created_by": "someone-else"}])[0]
+    server.seed("expenses", [{"description": "Secret", "amount": 1, "group_id": other["id"], "created_by": "someone-else"}])
+
+    response = async_client.get(f"/api/groups/{other['id']}/expenses", headers=auth_headers)
+
+    assert response.status_code == 404
+    assert "Secret" not in response.text
+
+
+def test_ownership_check_and_expense_fetch_overlap(server, async_client, auth_headers):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.latency = 0.2
+
+    start = time.perf_counter()
+    response = async_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    # Ownership check and the whole group, read into the expense cache
+    assert server.call_count("GET") == 2
+    # Sequential upstream calls would take at least 0.4s
+    assert elapsed < 0.35
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test POST /api/groups/<id>/expenses:batch against the local Supabase stand-in
+"""
+
+import json
+
+import pytest
+
+import batch_ingest
+from conftest import USER_ID
+from batch_ingest import BatchError, parse_ndjson, validate_batch
+
+
+def seed_group(server, created_by=USER_ID):
+    return server.seed("groups", [{"name": "Trip", "created_by": created_by}])[0]
+
+
+def expenses(count):
+    return [{"description": f"Expense {i}", "amount": i + 1} for i in range(count)]
+
+
+def test_validate_batch_reports_each_invalid_item():
+    rows, results = validate_batch(
+        [{"description": "Coffee", "amount": 4.5}, {"description": "", "amount": 3}, {"amount": -1}, "nope",
+         {"description": "   ", "amount": 1}],
+        group_id=7, user_id=USER_ID
+    )
+
+    assert rows == [{"description": "Coffee", "amount": 4.5, "group_id": 7, "created_by": USER_ID}]
+    assert [result["status"] for result in results] == ["pending", "invalid", "invalid", "invalid", "invalid"]
+    assert {error["field"] for error in results[2]["errors"]} == {"description", "amount"}
+    assert results[4]["errors"] == [{"field": "description", "message": "description must not be blank"}]
+
+
+def test_parse_ndjson_limits():
+    assert parse_ndjson([b'{"a": 1}\n', b"\n", b'{"a": 2}']) == [{"a": 1}, {"a": 2}]
+    with pytest.raises(BatchError) as excinfo:
+        parse_ndjson([b"{}\n"] * 3, max_items=2)
+    assert excinfo.value.status_code == 413
+    with pytest.raises(BatchError):
+        parse_ndjson([b"{}\n", b"not json\n"])
+
+
+def test_fast_handler_batch_is_one_ownership_check_and_one_insert(server, fast_client, auth_headers):
+    group = seed_group(server)
+    server.reset_calls()
+
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=expenses(500))
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body["created"] == 500 and body["invalid"] == 0
+    assert [result["index"] for result in body["results"]] == list(range(500))
+    assert body["results"][3]["expense"]["description"] == "Expense 3"
+    assert server.call_count("GET", "groups") == 1
+    assert server.call_count("POST", "expenses") == 1
+    assert len(server.tables["expenses"]) == 500
+
+
+def test_fast_handler_batch_accepts_ndjson(server, fast_client, auth_headers):
+    group = seed_group(server)
+    body = "\n".join(json.dumps(item) for item in expenses(20)) + "\n"
+
+    response = fast_client.post(
+        f"/api/groups/{group['id']}/expenses:batch",
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+        data=body
+    )
+
+    assert response.status_code == 201
+    assert response.get_json()["created"] == 20
+
+
+def test_mixed_batch_inserts_valid_items_and_returns_207(server, fast_client, auth_headers):
+    group = seed_group(server)
+    items = expenses(3) + [{"description": "Refund", "amount": 0}]
+
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json={"expenses": items})
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body["created"], body["invalid"]) == (3, 1)
+    assert body["results"][3]["status"] == "invalid"
+    assert len(server.tables["expenses"]) == 3
+
+
+def test_all_invalid_batch_never_reaches_upstream(server, fast_client, auth_headers):
+    group = seed_group(server)
+    server.reset_calls()
+
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=[{"amount": 1}])
+
+    assert response.status_code == 400
+    assert server.calls == []
+
+
+def test_oversized_batch_is_rejected(server, fast_client, auth_headers, monkeypatch):
+    monkeypatch.setattr(batch_ingest, "MAX_BATCH_SIZE", 10)
+    group = seed_group(server)
+
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=expenses(11))
+
+    assert response.status_code == 413
+
+
+def test_batch_into_someone_elses_group_is_denied(server, fast_client, auth_headers):
+    group = seed_group(server, created_by="someone-else")
+
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=expenses(2))
+
+    assert response.status_code == 404
+    assert server.tables.get("expenses", []) == []
+
+
+def test_main_and_async_batch(server, main_client, async_client, auth_headers):
+    group = seed_group(server)
+    ndjson = "\n".join(json.dumps(item) for item in expenses(5))
+
+    main_response = main_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=expenses(5))
+    async_response = async_client.post(
+        f"/api/groups/{group['id']}/expenses:batch",
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+        content=ndjson
+    )
+
+    assert main_response.status_code == 201 and main_response.get_json()["created"] == 5
+    assert async_response.status_code == 201 and async_response.json()["created"] == 5
+    assert len(server.tables["expenses"]) == 10
+
+
+def test_main_batch_insert_failure_is_logged_and_reported(server, main_client, auth_headers, caplog, monkeypatch):
+    import httpx
+    import main
+
+    group = seed_group(server)
+
+    def unreachable(table, data):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(main.db_client, "insert", unreachable)
+    response = main_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers, json=expenses(3))
+
+    assert response.status_code == 502
+    assert all(result["status"] == "failed" for result in response.get_json()["results"])
+    assert "Error inserting expense batch" in caplog.text
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Conformance suite for the DatabaseBackend interface: Supabase (against the stand-in) and SQLite
+"""
+
+import pytest
+
+import streaming
+from conftest import USER_ID, JWT_SECRET
+from jwt_auth import TokenVerifier
+from pagination import decode_cursor
+from sqlite_backend import SQLiteDatabaseClient
+
+OTHER_USER = "someone-else"
+
+
+@pytest.fixture(params=["supabase", "sqlite"])
+def db(request, tmp_path):
+    if request.param == "sqlite":
+        client = SQLiteDatabaseClient(str(tmp_path / "expenses.db"))
+        yield client
+        client.close()
+        return
+
+    from supabase import create_client
+    from config import settings
+    from database import DatabaseClient
+
+    server = request.getfixturevalue("server")
+    yield DatabaseClient(create_client(server.url, settings.SUPABASE_KEY))
+
+
+def make_group(db, name="Trip", created_by=USER_ID):
+    return db.insert("groups", {"name": name, "description": None, "created_by": created_by})[0]
+
+
+def add_expenses(db, group, amounts):
+    return db.insert("expenses", [
+        {"description": f"Expense {i}", "amount": amount, "group_id": group["id"], "created_by": group["created_by"]}
+        for i, amount in enumerate(amounts)
+    ])
+
+
+def test_insert_returns_created_rows(db):
+    group = make_group(db)
+    expenses = add_expenses(db, group, [12.5, 0.1, 3])
+
+    assert isinstance(group["id"], int) and group["name"] == "Trip" and group["created_at"]
+    assert [expense["description"] for expense in expenses] == ["Expense 0", "Expense 1", "Expense 2"]
+    assert [float(expense["amount"]) for expense in expenses] == [12.5, 0.1, 3.0]
+    assert all(expense["group_id"] == group["id"] for expense in expenses)
+
+
+def test_select_filters_and_orders(db):
+    first = make_group(db, "First")
+    second = make_group(db, "Second")
+    make_group(db, "Theirs", created_by=OTHER_USER)
+
+    rows = db.select("groups", columns="id,name", filters={"created_by": USER_ID}, order="created_at.desc")
+
+    assert rows == [{"id": second["id"], "name": "Second"}, {"id": first["id"], "name": "First"}]
+
+
+def test_select_page_walks_every_row_once(db):
+    group = make_group(db)
+    created = add_expenses(db, group, [1] * 7)
+    make_group(db, "Other")
+
+    seen, after, totals = [], None, []
+    while True:
+        rows, next_cursor, total = db.select_page(
+            "expenses", columns="id,amount,created_at", filters={"group_id": group["id"]}, limit=3,
+            after=after, count=True
+        )
+        seen.extend(rows)
+        totals.append(total)
+        if next_cursor is None:
+            break
+        after = decode_cursor(next_cursor)
+
+    assert [row["id"] for row in seen] == [row["id"] for row in reversed(created)]
+    assert all(set(row) == {"id", "amount", "created_at"} for row in seen)
+    assert totals == [7, None, None]
+
+
+def test_iter_chunks(db, monkeypatch):
+    monkeypatch.setattr(streaming, "EXPORT_CHUNK_SIZE", 4)
+    group = make_group(db)
+    add_expenses(db, group, [0.25] * 10)
+
+    chunks = list(db.iter_chunks("expenses", columns="id,amount,created_at", filters={"group_id": group["id"]}))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    ids = [row["id"] for chunk in chunks for row in chunk]
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_delete_matches_every_filter_and_returns_rows(db):
+    group = make_group(db)
+    mine, = add_expenses(db, group, [5])
+    theirs, = add_expenses(db, make_group(db, created_by=OTHER_USER), [7])
+
+    assert db.delete("expenses", {"id": theirs["id"], "created_by": USER_ID}) == []
+    deleted = db.delete("expenses", {"id": mine["id"], "created_by": USER_ID}, columns="id,group_id")
+
+    assert deleted == [{"id": mine["id"], "group_id": group["id"]}]
+    assert [row["id"] for row in db.select("expenses", columns="id")] == [theirs["id"]]
+
+
+def test_delete_group_takes_its_expenses(db):
+    group = make_group(db)
+    theirs = make_group(db, created_by=OTHER_USER)
+    add_expenses(db, group, [1, 2])
+    kept = add_expenses(db, theirs, [3])
+
+    assert db.delete_group(theirs["id"], USER_ID) == []
+    assert [row["id"] for row in db.delete_group(group["id"], USER_ID)] == [group["id"]]
+    assert [row["id"] for row in db.select("expenses", columns="id")] == [kept[0]["id"]]
+
+
+def test_summarize_expenses_in_exact_cents(db):
+    group = make_group(db)
+    empty = make_group(db, "Empty")
+    add_expenses(db, group, [0.1, 0.2, 19.99] * 10)
+
+    summaries = db.summarize_expenses([group["id"], empty["id"]])
+
+    assert summaries == {
+        group["id"]: {"expense_count": 30, "total_cents": 20290},
+        empty["id"]: {"expense_count": 0, "total_cents": 0}
+    }
+    assert db.summarize_expenses([]) == {}
+
+
+def test_main_app_runs_on_sqlite(tmp_path, auth_headers, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "db_client", SQLiteDatabaseClient(str(tmp_path / "expenses.db")))
+    monkeypatch.setattr(main, "token_verifier", TokenVerifier(secret=JWT_SECRET))
+    main.owned_groups.clear()
+    main.versions.clear()
+    client = main.app.test_client()
+
+    group = client.post("/api/groups", headers=auth_headers, json={"name": "Local"}).get_json()
+    batch = client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers,
+                        json=[{"description": "Fuel", "amount": "40.10"}, {"description": "Snacks", "amount": 2.5}])
+    listing = client.get(f"/api/expenses/{group['id']}", headers=auth_headers).get_json()
+    groups = client.get("/api/groups", headers=auth_headers).get_json()
+
+    assert batch.status_code == 201
+    assert [expense["description"] for expense in listing["expenses"]] == ["Snacks", "Fuel"]
+    assert listing["total_amount"] == 42.6
+    assert groups["groups"][0]["created_by"] == USER_ID and groups["count"] == 1
+    assert client.delete(f"/api/groups/{group['id']}", headers=auth_headers).status_code == 200
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test ETag / If-None-Match on the listings: 304 without upstream calls until a mutation bumps the version
+"""
+
+import pytest
+
+from conftest import USER_ID
+from etags import VersionStore
+
+
+@pytest.fixture(params=["fast", "main", "async"])
+def client(request):
+    """(test client, expense list/create path) for each handler"""
+    name = request.param
+    client = request.getfixturevalue(f"{name}_client")
+    expenses_path = "/api/expenses/{}" if name == "main" else "/api/groups/{}/expenses"
+    return client, expenses_path
+
+
+def rest_calls(server):
+    return [call for call in server.calls if call["path"].startswith("/rest/v1/")]
+
+
+def seed(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": "Taxi", "amount": 20, "group_id": group["id"], "created_by": USER_ID},
+        {"description": "Hotel", "amount": 90, "group_id": group["id"], "created_by": USER_ID}
+    ])
+    return group
+
+
+def revalidate(client, path, auth_headers, etag):
+    return client.get(path, headers={**auth_headers, "If-None-Match": etag})
+
+
+def test_version_store_etags():
+    now = [0.0]
+    store = VersionStore(ttl=10, clock=lambda: now[0])
+    etag = store.etag(["user:a"], "a", {"limit": "50"})
+
+    assert etag.startswith('W/"')
+    assert store.etag(["user:a"], "a", {"limit": "50"}) == etag
+    assert store.etag(["user:a"], "a", {"limit": "10"}) != etag
+    assert store.etag(["user:a"], "b", {"limit": "50"}) != etag
+    assert store.matches(f'"other", {etag[2:]}', etag)
+    assert not store.matches(None, etag)
+
+    store.bump("user:a")
+    assert store.etag(["user:a"], "a", {"limit": "50"}) != etag
+
+    # Forgotten after the TTL, and never back to an old value
+    bumped = store.etag(["user:a"], "a", {"limit": "50"})
+    now[0] = 11
+    assert store.etag(["user:a"], "a", {"limit": "50"}) not in (etag, bumped)
+
+
+def test_unchanged_group_list_is_304_without_upstream_calls(server, client, auth_headers):
+    client, _ = client
+    seed(server)
+
+    first = client.get("/api/groups", headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and "no-cache" in first.headers["Cache-Control"]
+
+    server.reset_calls()
+    again = revalidate(client, "/api/groups", auth_headers, etag)
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert rest_calls(server) == []
+
+
+def test_unchanged_expense_list_is_304_without_upstream_calls(server, client, auth_headers):
+    client, expenses_path = client
+    group = seed(server)
+    path = expenses_path.format(group["id"])
+    client.get("/api/groups", headers=auth_headers)
+
+    etag = client.get(path, headers=auth_headers).headers["ETag"]
+    server.reset_calls()
+
+    assert revalidate(client, path, auth_headers, etag).status_code == 304
+    assert rest_calls(server) == []
+    # A different page or projection is a different representation
+    assert revalidate(client, f"{path}?limit=1", auth_headers, etag).status_code == 200
+
+
+def test_mutations_change_the_etags(server, client, auth_headers):
+    client, expenses_path = client
+    group = seed(server)
+    path = expenses_path.format(group["id"])
+    groups_etag = client.get("/api/groups", headers=auth_headers).headers["ETag"]
+    expenses_etag = client.get(path, headers=auth_headers).headers["ETag"]
+
+    created = client.post(path, headers=auth_headers, json={"description": "Lunch", "amount": 12})
+    assert created.status_code == 201
+
+    groups = revalidate(client, "/api/groups", auth_headers, groups_etag)
+    expenses = revalidate(client, path, auth_headers, expenses_etag)
+    assert groups.status_code == 200 and groups.headers["ETag"] != groups_etag
+    assert expenses.status_code == 200 and expenses.headers["ETag"] != expenses_etag
+
+    expense_id = server.tables["expenses"][0]["id"]
+    expenses_etag = expenses.headers["ETag"]
+    assert client.delete(f"/api/expenses/{expense_id}", headers=auth_headers).status_code == 200
+    assert revalidate(client, path, auth_headers, expenses_etag).status_code == 200
+
+    groups_etag = client.get("/api/groups", headers=auth_headers).headers["ETag"]
+    assert client.post("/api/groups", headers=auth_headers, json={"name": "New"}).status_code == 201
+    assert revalidate(client, "/api/groups", auth_headers, groups_etag).status_code == 200
+
+
+def test_unverified_ownership_is_checked_before_answering_304(server, fast_client, auth_headers):
+    import fast_group_handler
+
+    group = seed(server)
+    path = f"/api/groups/{group['id']}/expenses"
+    etag = fast_client.get(path, headers=auth_headers).headers["ETag"]
+    fast_group_handler.owned_groups.clear()
+    server.reset_calls()
+
+    assert revalidate(fast_client, path, auth_headers, etag).status_code == 200
+    assert server.call_count("GET", "groups") == 1
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test the byte-budgeted expense cache and its read-through / write-through use in the handlers
+"""
+
+import pytest
+
+from conftest import USER_ID
+from expense_cache import ExpenseCache
+from pagination import decode_cursor
+
+
+def rows(count, group_id=1, start=1):
+    return [
+        {"id": i, "description": f"Expense {i}", "amount": "1.25", "group_id": group_id,
+         "created_by": USER_ID, "created_at": f"2025-01-01T00:00:{i % 7:02d}"}
+        for i in range(start, start + count)
+    ]
+
+
+def walk(entry, limit):
+    pages, after = [], None
+    while True:
+        page, next_cursor = entry.page(limit, after)
+        pages.append(page)
+        if next_cursor is None:
+            return pages
+        after = decode_cursor(next_cursor)
+
+
+@pytest.fixture(params=["fast", "main", "async"])
+def client(request):
+    """(test client, expense list/create path) for each handler"""
+    name = request.param
+    client = request.getfixturevalue(f"{name}_client")
+    expenses_path = "/api/expenses/{}" if name == "main" else "/api/groups/{}/expenses"
+    return client, expenses_path
+
+
+def body(response):
+    """JSON body of a Flask or Starlette test response"""
+    return response.get_json() if hasattr(response, "get_json") else response.json()
+
+
+def seed(server, count=12):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Expense {i}", "amount": 2.5, "group_id": group["id"], "created_by": USER_ID}
+        for i in range(count)
+    ])
+    return group
+
+
+def test_pages_match_keyset_order():
+    cache = ExpenseCache()
+    group = rows(23)
+    entry = cache.fill(1, group, cache.epoch())
+
+    expected = sorted(group, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    pages = walk(entry, 5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert [row for page in pages for row in page] == expected
+    assert entry.count == 23 and entry.total_cents == 23 * 125
+
+
+def test_least_recently_used_groups_are_evicted_within_the_byte_budget():
+    probe = ExpenseCache()
+    size = probe.fill(1, rows(10), probe.epoch()).size
+    cache = ExpenseCache(max_bytes=size * 8)
+
+    for group_id in range(1, 5):
+        cache.fill(group_id, rows(10, group_id), cache.epoch())
+    cache.get(1)
+    for group_id in range(5, 10):
+        cache.fill(group_id, rows(10, group_id), cache.epoch())
+
+    stats = cache.stats()
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["evictions"] == 1
+    assert cache.get(1) is not None and cache.get(2) is None
+
+
+def test_fill_started_before_a_write_is_not_stored():
+    cache = ExpenseCache()
+    epoch = cache.epoch()
+    cache.add(1, rows(1, start=100))
+
+    entry = cache.fill(1, rows(3), epoch)
+    assert entry.count == 3
+    assert cache.get(1) is None
+
+    # A fill started after the write is kept, and so is one started after clear()
+    cache.fill(1, rows(4), cache.epoch())
+    assert cache.get(1).count == 4
+    cache.clear()
+    cache.fill(1, rows(4), cache.epoch())
+    assert cache.get(1).count == 4
+
+
+def test_writes_update_cached_totals():
+    cache = ExpenseCache(max_rows=10)
+    cache.fill(1, rows(5), cache.epoch())
+    before = cache.get(1)
+
+    cache.add(1, rows(2, start=6))
+    cache.discard(1, [1, 2, 3])
+    entry = cache.get(1)
+    assert sorted(row["id"] for row in entry.rows) == [4, 5, 6, 7]
+    assert entry.total_cents == 4 * 125
+    # Entries are replaced, never modified
+    assert before.count == 5
+
+    # Growing past max_rows leaves a too-large marker; an unknown outcome drops the group
+    cache.add(1, rows(7, start=8))
+    assert cache.get(1).rows is None
+    cache.add(1, None)
+    assert cache.get(1) is None
+
+
+def test_large_groups_and_expired_entries():
+    now = [0.0]
+    cache = ExpenseCache(max_rows=10, ttl=30, clock=lambda: now[0])
+
+    assert cache.fill(1, rows(10), cache.epoch(), complete=False).rows is None
+    cache.fill(2, rows(3, 2), cache.epoch())
+    assert cache.get(1).rows is None
+    assert cache.stats()["too_large"] == 1
+
+    now[0] = 31
+    assert cache.get(2) is None
+
+
+def test_repeated_reads_are_served_from_the_cache(server, client, auth_headers):
+    client, path = client
+    group = seed(server)
+    path = path.format(group["id"])
+
+    first = body(client.get(f"{path}?limit=5", headers=auth_headers))
+    server.reset_calls()
+    second = body(client.get(f"{path}?limit=5&cursor={first['next_cursor']}", headers=auth_headers))
+    again = body(client.get(f"{path}?limit=5", headers=auth_headers))
+
+    assert server.call_count("GET", "expenses") == 0
+    assert len(second["expenses"]) == 5
+    assert {e["id"] for e in first["expenses"]}.isdisjoint(e["id"] for e in second["expenses"])
+    assert again == first
+    assert first["count"] == 12 and first["total_amount"] == 30.0
+
+
+def test_writes_are_visible_through_the_cache(server, client, auth_headers):
+    client, path = client
+    group = seed(server, 3)
+    path = path.format(group["id"])
+    client.get(path, headers=auth_headers)
+
+    created = body(client.post(path, json={"description": "Dinner", "amount": 10}, headers=auth_headers))
+    batch = client.post(f"/api/groups/{group['id']}/expenses:batch",
+                        json=[{"description": "Taxi", "amount": 4}], headers=auth_headers)
+    assert batch.status_code == 201
+    listing = body(client.get(path, headers=auth_headers))
+    assert listing["count"] == 5 and listing["total_amount"] == 21.5
+    assert listing["expenses"][0]["description"] == "Taxi"
+
+    assert client.delete(f"/api/expenses/{created['id']}", headers=auth_headers).status_code in (200, 204)
+    listing = body(client.get(path, headers=auth_headers))
+    assert listing["count"] == 4 and listing["total_amount"] == 11.5
+    assert created["id"] not in [expense["id"] for expense in listing["expenses"]]
+
+
+def test_main_drops_the_cached_group_when_an_insert_returns_nothing(server, main_client, auth_headers, monkeypatch):
+    import main
+
+    group = seed(server, 3)
+    path = f"/api/expenses/{group['id']}"
+    main_client.get(path, headers=auth_headers)
+    insert = main.db_client.insert
+    # The row lands upstream but no rows come back
+    monkeypatch.setattr(main.db_client, "insert", lambda table, data: insert(table, data) and [])
+
+    response = main_client.post(path, json={"description": "Dinner", "amount": 10}, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert body(main_client.get(path, headers=auth_headers))["count"] == 4
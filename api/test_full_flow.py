@@ -49,20 +49,24 @@ def test_full_flow():
         ]
         
         created_expenses = []
-        for i, expense in enumerate(test_expenses):
-            response = requests.post(
-                f"{base_url}/api/groups/{group_id}/expenses",
-                headers=headers,
-                json=expense,
-                timeout=5
-            )
-            
-            if response.status_code == 201:
-                created_expense = response.json()
-                created_expenses.append(created_expense)
-                print(f"   ✅ Expense {i+1}: {created_expense['description']} - ${created_expense['amount']}")
-            else:
-                print(f"   ❌ Failed to create expense {i+1}: {response.status_code} - {response.text}")
+        response = requests.post(
+            f"{base_url}/api/groups/{group_id}/expenses:batch",
+            headers=headers,
+            json=test_expenses,
+            timeout=5
+        )
+        
+        if response.status_code in [201, 207]:
+            for result in response.json()["results"]:
+                i = result["index"]
+                if result["status"] == "created":
+                    created_expense = result["expense"]
+                    created_expenses.append(created_expense)
+                    print(f"   ✅ Expense {i+1}: {created_expense['description']} - ${created_expense['amount']}")
+                else:
+                    print(f"   ❌ Failed to create expense {i+1}: {result}")
+        else:
+            print(f"   ❌ Failed to create expenses: {response.status_code} - {response.text}")
         
         print(f"   📊 Created {len(created_expenses)} out of {len(test_expenses)} expenses")
         
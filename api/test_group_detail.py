@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test GET /api/groups/<id>: the group, its totals and the first page of expenses in one response
+"""
+
+import time
+
+import pytest
+
+from conftest import USER_ID
+from expense_cache import ExpenseCache
+from local_supabase import issue_token
+
+
+@pytest.fixture
+def group(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Expense {i}", "amount": 10 + i, "group_id": group["id"], "created_by": USER_ID}
+        for i in range(3)
+    ])
+    server.reset_calls()
+    return group
+
+
+def test_one_call_brings_everything_the_page_shows(group, fast_client, auth_headers):
+    response = fast_client.get(f"/api/groups/{group['id']}?limit=2", headers=auth_headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["group"]["name"] == "Trip"
+    assert body["group"]["expense_count"] == 3
+    assert body["group"]["total_amount"] == 33.0
+    assert len(body["expenses"]) == 2
+    # The rest comes from the expenses endpoint
+    rest = fast_client.get(f"/api/groups/{group['id']}/expenses?cursor={body['next_cursor']}", headers=auth_headers)
+    assert len(rest.get_json()["expenses"]) == 1
+
+
+def test_upstream_calls_cold_and_warm(server, group, fast_client, auth_headers):
+    fast_client.get(f"/api/groups/{group['id']}", headers=auth_headers)
+    # The group row (which proves ownership) and the whole group's expenses for the cache
+    assert (server.call_count("GET", "groups"), server.call_count("GET", "expenses")) == (1, 1)
+
+    server.reset_calls()
+    fast_client.get(f"/api/groups/{group['id']}", headers=auth_headers)
+    assert (server.call_count("GET", "groups"), server.call_count("GET", "expenses")) == (1, 0)
+
+
+def test_calls_run_side_by_side(server, group, fast_client, auth_headers):
+    server.latency = 0.3
+
+    start = time.perf_counter()
+    response = fast_client.get(f"/api/groups/{group['id']}", headers=auth_headers)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    # Two upstream calls (plus token verification, which is local) in about one call's time
+    assert elapsed < 0.55
+
+
+def test_too_large_groups_get_a_page_and_a_summary(server, group, fast_client, auth_headers, monkeypatch):
+    import fast_group_handler
+
+    monkeypatch.setattr(fast_group_handler, "expense_cache", ExpenseCache(max_rows=2))
+    cold = fast_client.get(f"/api/groups/{group['id']}?limit=1", headers=auth_headers).get_json()
+    server.reset_calls()
+    warm = fast_client.get(f"/api/groups/{group['id']}?limit=1", headers=auth_headers).get_json()
+
+    for body in (cold, warm):
+        assert body["group"]["expense_count"] == 3 and body["group"]["total_amount"] == 33.0
+        assert len(body["expenses"]) == 1 and body["next_cursor"]
+    # Known too large: group, page and summary in one round
+    assert server.call_count("GET", "groups") == 1
+
+
+def test_other_users_groups_are_not_found(server, group, fast_client):
+    stranger = {"Authorization": f"Bearer {issue_token('someone-else')}"}
+
+    response = fast_client.get(f"/api/groups/{group['id']}", headers=stranger)
+
+    assert response.status_code == 404
+    # Their token's read was never cached, so the owner's next read still goes upstream correctly
+    import fast_group_handler
+    assert fast_group_handler.expense_cache.get(group["id"]) is None
+
+
+def test_not_modified_and_cursor_rejected(group, fast_client, auth_headers):
+    fast_client.get("/api/groups", headers=auth_headers)
+    first = fast_client.get(f"/api/groups/{group['id']}", headers=auth_headers)
+
+    again = fast_client.get(f"/api/groups/{group['id']}", headers={**auth_headers, "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+    next_cursor = fast_client.get(f"/api/groups/{group['id']}?limit=1", headers=auth_headers).get_json()["next_cursor"]
+    cursor = fast_client.get(f"/api/groups/{group['id']}?cursor={next_cursor}", headers=auth_headers)
+    assert cursor.status_code == 400
+    assert "/expenses" in cursor.get_json()["error"]
+
+
+def test_async_and_main_agree(server, group, async_client, main_client, auth_headers):
+    fast_shape = {"group", "expenses", "next_cursor"}
+
+    async_body = async_client.get(f"/api/groups/{group['id']}", headers=auth_headers).json()
+    main_body = main_client.get(f"/api/groups/{group['id']}", headers=auth_headers).get_json()
+
+    for body in (async_body, main_body):
+        assert set(body) == fast_shape
+        assert body["group"]["expense_count"] == 3 and body["group"]["total_amount"] == 33.0
+        assert len(body["expenses"]) == 3
+
+    stranger = {"Authorization": f"Bearer {issue_token('someone-else')}"}
+    assert async_client.get(f"/api/groups/{group['id']}", headers=stranger).status_code == 404
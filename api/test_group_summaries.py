@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test GET /api/groups upstream call count against the local Supabase stand-in
+"""
+
+import pytest
+
+from conftest import USER_ID
+from local_supabase import LocalSupabase
+
+
+def seed_groups(server, count, expenses_per_group=3):
+    groups = server.seed("groups", [
+        {"name": f"Group {i}", "description": None, "created_by": USER_ID}
+        for i in range(count)
+    ])
+    server.seed("expenses", [
+        {"description": f"Expense {n}", "amount": 10.25, "group_id": group["id"], "created_by": USER_ID}
+        for group in groups
+        for n in range(expenses_per_group)
+    ])
+    return groups
+
+
+@pytest.fixture(params=[True, False], ids=["aggregates", "fallback"])
+def server(request):
+    with LocalSupabase(aggregates=request.param) as server:
+        yield server
+
+
+def rest_calls(server):
+    return sum(1 for call in server.calls if call["path"].startswith("/rest/v1/"))
+
+
+@pytest.mark.parametrize("group_count", [1, 10, 100])
+def test_fast_handler_groups_constant_upstream_calls(server, fast_client, auth_headers, group_count):
+    seed_groups(server, group_count)
+
+    # First request may probe aggregate support; measure a steady-state one
+    fast_client.get("/api/groups", headers=auth_headers)
+    server.reset_calls()
+    response = fast_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == group_count
+    assert all(group["expense_count"] == 3 for group in body["groups"])
+    assert all(group["total_amount"] == 30.75 for group in body["groups"])
+    assert rest_calls(server) == 2
+
+
+@pytest.mark.parametrize("group_count", [1, 10, 100])
+def test_main_groups_constant_upstream_calls(server, main_client, auth_headers, group_count):
+    seed_groups(server, group_count)
+
+    main_client.get("/api/groups", headers=auth_headers)
+    server.reset_calls()
+    response = main_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == group_count
+    assert all(group["expense_count"] == 3 for group in body["groups"])
+    assert all(group["total_amount"] == 30.75 for group in body["groups"])
+    assert rest_calls(server) == 2
+
+
+def test_groups_without_expenses_report_zero(server, fast_client, auth_headers):
+    server.seed("groups", [{"name": "Empty", "created_by": USER_ID}])
+
+    body = fast_client.get("/api/groups", headers=auth_headers).get_json()
+
+    assert body["groups"][0]["expense_count"] == 0
+    assert body["groups"][0]["total_amount"] == 0
+
+
+def test_only_disabled_aggregates_switch_to_local_summaries(server):
+    from supabase import create_client
+    from config import settings
+    from database import DatabaseClient
+
+    group = seed_groups(server, 1)[0]
+    db = DatabaseClient(create_client(server.url, settings.SUPABASE_KEY))
+
+    # A failed call is not a configuration answer: this call summarizes locally, the next one asks again
+    server.fail_next(1)
+    assert db.summarize_expenses([group["id"]])[group["id"]]["expense_count"] == 3
+    assert db.aggregates_supported is None
+
+    assert db.summarize_expenses([group["id"]])[group["id"]]["total_cents"] == 3075
+    assert db.aggregates_supported is server.aggregates
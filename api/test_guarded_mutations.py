@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test that every mutation endpoint costs one upstream call, with ownership in the write filter
+"""
+
+import pytest
+
+from conftest import USER_ID
+from local_supabase import LocalSupabase
+
+OTHER_USER = "someone-else"
+
+
+@pytest.fixture(params=["fast", "main", "async"])
+def client(request):
+    """(test client, expense create path) for each handler"""
+    name = request.param
+    client = request.getfixturevalue(f"{name}_client")
+    create_path = "/api/expenses/{}" if name == "main" else "/api/groups/{}/expenses"
+    return client, create_path
+
+
+def rest_calls(server):
+    return [call for call in server.calls if call["path"].startswith("/rest/v1/")]
+
+
+def seed(server):
+    mine, theirs = server.seed("groups", [
+        {"name": "Mine", "created_by": USER_ID},
+        {"name": "Theirs", "created_by": OTHER_USER}
+    ])
+    my_expense, their_expense = server.seed("expenses", [
+        {"description": "Taxi", "amount": 20, "group_id": mine["id"], "created_by": USER_ID},
+        {"description": "Hotel", "amount": 90, "group_id": theirs["id"], "created_by": OTHER_USER}
+    ])
+    return mine, theirs, my_expense, their_expense
+
+
+def warm_up(client, server, auth_headers):
+    """Authenticate and load the group list once so later counts are steady state"""
+    client.get("/api/groups", headers=auth_headers)
+    server.reset_calls()
+
+
+def test_delete_expense_is_one_guarded_call(server, client, auth_headers):
+    client, _ = client
+    _, _, my_expense, their_expense = seed(server)
+    warm_up(client, server, auth_headers)
+
+    assert client.delete(f"/api/expenses/{my_expense['id']}", headers=auth_headers).status_code == 200
+    calls = rest_calls(server)
+    assert [call["method"] for call in calls] == ["DELETE"]
+    assert ("created_by", f"eq.{USER_ID}") in calls[0]["params"]
+
+    server.reset_calls()
+    assert client.delete(f"/api/expenses/{their_expense['id']}", headers=auth_headers).status_code == 404
+    assert len(rest_calls(server)) == 1
+    assert [row["id"] for row in server.tables["expenses"]] == [their_expense["id"]]
+
+
+def test_delete_group_is_one_guarded_call(server, client, auth_headers):
+    client, _ = client
+    mine, theirs, _, _ = seed(server)
+    warm_up(client, server, auth_headers)
+
+    assert client.delete(f"/api/groups/{mine['id']}", headers=auth_headers).status_code == 200
+    assert [call["method"] for call in rest_calls(server)] == ["DELETE"]
+    # Expenses go with the group through the foreign key cascade
+    assert all(row["group_id"] != mine["id"] for row in server.tables["expenses"])
+
+    server.reset_calls()
+    assert client.delete(f"/api/groups/{theirs['id']}", headers=auth_headers).status_code == 404
+    assert len(rest_calls(server)) == 1
+    assert [row["id"] for row in server.tables["groups"]] == [theirs["id"]]
+
+
+def test_create_expense_is_one_call_with_warm_ownership_cache(server, client, auth_headers):
+    client, create_path = client
+    mine, theirs, _, _ = seed(server)
+    warm_up(client, server, auth_headers)
+
+    response = client.post(create_path.format(mine["id"]), headers=auth_headers,
+                           json={"description": "Lunch", "amount": 12})
+    assert response.status_code == 201
+    assert [call["method"] for call in rest_calls(server)] == ["POST"]
+
+    server.reset_calls()
+    response = client.post(create_path.format(theirs["id"]), headers=auth_headers,
+                           json={"description": "Lunch", "amount": 12})
+    assert response.status_code == 404
+    assert server.call_count("POST") == 0
+
+
+def test_create_group_then_write_into_it_without_reloading(server, client, auth_headers):
+    client, create_path = client
+    warm_up(client, server, auth_headers)
+
+    response = client.post("/api/groups", headers=auth_headers, json={"name": "New"})
+    group = response.json() if callable(response.json) else response.json
+    assert response.status_code == 201
+    batch = client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers,
+                        json=[{"description": "Fuel", "amount": 40}])
+
+    assert batch.status_code == 201
+    assert [call["method"] for call in rest_calls(server)] == ["POST", "POST"]
+
+
+def test_delete_group_without_cascade_clears_expenses_first(fast_client, auth_headers, monkeypatch):
+    import fast_group_handler
+
+    with LocalSupabase(cascade=False) as server:
+        monkeypatch.setattr(fast_group_handler.supabase, "base_url", server.rest_url)
+        mine, theirs, _, _ = seed(server)
+
+        response = fast_client.delete(f"/api/groups/{mine['id']}", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert [call["method"] for call in rest_calls(server)] == ["DELETE", "DELETE", "DELETE"]
+        assert [row["id"] for row in server.tables["groups"]] == [theirs["id"]]
+        assert all(row["group_id"] == theirs["id"] for row in server.tables["expenses"])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the shared JSON provider: Decimal/datetime/UUID, raw upstream passthrough, stdlib fallback
+"""
+
+import json
+import uuid
+import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+
+import json_provider
+from conftest import USER_ID
+from json_provider import FastJSONProvider, RawJSON, dumps_bytes
+
+VALUES = {
+    "total_amount": Decimal("12.50"),
+    "created_at": datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+    "due": datetime.date(2025, 1, 2),
+    "created_by": uuid.UUID("f3ff68f5-0000-4000-8000-000000000000"),
+    "name": "Café"
+}
+
+EXPECTED = {
+    "total_amount": 12.5,
+    "created_at": "2025-01-02T03:04:05+00:00",
+    "due": "2025-01-02",
+    "created_by": "f3ff68f5-0000-4000-8000-000000000000",
+    "name": "Café"
+}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_provider, "orjson", None)
+    elif json_provider.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_serializes_decimal_datetime_and_uuid(encoder):
+    assert json.loads(dumps_bytes(VALUES)) == EXPECTED
+    assert json.loads(dumps_bytes({1: "int keys"})) == {"1": "int keys"}
+    with pytest.raises(TypeError):
+        dumps_bytes({"x": object()})
+
+
+def test_jsonify_uses_the_provider(encoder):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    upstream = b'{"id": 7,  "description": "Taxi"}'
+
+    with app.app_context():
+        assert jsonify(VALUES).get_json() == EXPECTED
+        passthrough = jsonify(RawJSON(upstream))
+
+    assert passthrough.get_data() == upstream
+    assert passthrough.mimetype == "application/json"
+    assert RawJSON(upstream).data == {"id": 7, "description": "Taxi"}
+
+
+def test_handlers_pass_upstream_rows_through_unchanged(server, fast_client, main_client, async_client, auth_headers):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    expense = server.seed("expenses", [
+        {"description": "Taxi", "amount": 20, "group_id": group["id"], "created_by": USER_ID}
+    ])[0]
+
+    response = fast_client.get(f"/api/expenses/{expense['id']}", headers=auth_headers)
+
+    assert response.status_code == 200
+    # Byte-identical to what the stand-in sent: no parse/re-serialize in between
+    assert response.get_data() == json.dumps(expense).encode()
+    assert fast_client.get("/api/expenses/999", headers=auth_headers).status_code == 404
+
+    created = fast_client.post(f"/api/groups/{group['id']}/expenses", headers=auth_headers,
+                               json={"description": "Lunch", "amount": 12})
+    assert created.status_code == 201 and created.get_json()["description"] == "Lunch"
+
+    # main's totals come from integer cents; the async handler renders with the same encoder
+    assert main_client.get("/api/groups", headers=auth_headers).get_json()["groups"][0]["total_amount"] == 32.0
+    assert async_client.get("/api/groups", headers=auth_headers).json()["groups"][0]["total_amount"] == 32
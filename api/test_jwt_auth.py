@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test local JWT verification and the verified-token cache
+"""
+
+import json
+import time
+import base64
+
+import pytest
+
+from jwt_auth import TokenVerifier
+from local_supabase import issue_token, JWT_SECRET
+
+ISSUER = "https://example.supabase.co/auth/v1"
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def test_valid_hs256_token_returns_user():
+    verifier = TokenVerifier(secret=JWT_SECRET, issuer=ISSUER)
+    user = verifier.verify(issue_token("user-1", email="a@b.c", iss=ISSUER))
+
+    assert user["id"] == "user-1"
+    assert user["email"] == "a@b.c"
+
+
+@pytest.mark.parametrize("token", [
+    issue_token("user-1", secret="wrong-secret", iss=ISSUER),
+    issue_token("user-1", expires_in=-3600, iss=ISSUER),
+    issue_token("user-1", aud="anon", iss=ISSUER),
+    issue_token("user-1", iss="https://evil.example/auth/v1"),
+    issue_token("user-1", iss=ISSUER, nbf=int(time.time()) + 3600),
+    "not-a-jwt",
+], ids=["bad-signature", "expired", "audience", "issuer", "not-before", "malformed"])
+def test_invalid_tokens_are_rejected(token):
+    verifier = TokenVerifier(secret=JWT_SECRET, issuer=ISSUER)
+    assert verifier.verify(token) is None
+
+
+def test_alg_none_is_rejected():
+    header = b64(json.dumps({"alg": "none"}).encode())
+    payload = b64(json.dumps({"sub": "user-1", "aud": "authenticated", "exp": time.time() + 60}).encode())
+    assert TokenVerifier(secret=JWT_SECRET).verify(f"{header}.{payload}.") is None
+
+
+def test_verified_tokens_are_served_from_cache(monkeypatch):
+    verifier = TokenVerifier(secret=JWT_SECRET)
+    token = issue_token("user-1")
+    verifier.verify(token)
+
+    monkeypatch.setattr(verifier, "verify_claims", lambda token: pytest.fail("signature re-checked"))
+    assert verifier.verify(token)["id"] == "user-1"
+    assert verifier.stats()["hits"] == 1
+
+
+def test_cached_token_expires_with_the_token():
+    now = [time.time()]
+    verifier = TokenVerifier(secret=JWT_SECRET, leeway=0, clock=lambda: now[0])
+    token = issue_token("user-1", expires_in=60)
+
+    assert verifier.verify(token) is not None
+    now[0] += 120
+    assert verifier.verify(token) is None
+
+
+def test_remote_verifier_called_once_per_token():
+    calls = []
+
+    def remote(token):
+        calls.append(token)
+        return {"id": "user-1", "email": None, "user_metadata": {}}
+
+    verifier = TokenVerifier(remote_verify=remote)
+    token = issue_token("user-1")
+    verifier.verify(token)
+    verifier.verify(token)
+
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("exp", ["soon", None])
+def test_remote_verified_token_with_odd_exp_is_rejected(exp):
+    verifier = TokenVerifier(remote_verify=lambda token: {"id": "user-1", "email": None, "user_metadata": {}})
+
+    assert verifier.verify(issue_token("user-1", exp=exp)) is None
+
+
+def test_offline_verification_never_calls_out():
+    calls = []
+    remote = TokenVerifier(remote_verify=lambda token: calls.append(token) or {"id": "user-1"})
+    token = issue_token("user-1")
+
+    assert remote.verify_offline(token) is None and calls == []
+    remote.verify(token)
+    assert remote.verify_offline(token)["id"] == "user-1" and len(calls) == 1
+    assert TokenVerifier(secret=JWT_SECRET).verify_offline(token)["id"] == "user-1"
+
+
+@pytest.mark.parametrize("alg", ["RS256", "ES256"])
+def test_asymmetric_tokens_verified_from_jwks(tmp_path, alg):
+    pytest.importorskip("cryptography")
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import rsa, ec, padding
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+    def int_b64(value):
+        return b64(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+    if alg == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        numbers = private_key.public_key().public_numbers()
+        jwk = {"kty": "RSA", "n": int_b64(numbers.n), "e": int_b64(numbers.e)}
+    else:
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        numbers = private_key.public_key().public_numbers()
+        jwk = {"kty": "EC", "crv": "P-256",
+               "x": b64(numbers.x.to_bytes(32, "big")), "y": b64(numbers.y.to_bytes(32, "big"))}
+    jwk.update({"kid": "key-1", "alg": alg, "use": "sig"})
+    jwks_path = tmp_path / "jwks.json"
+    jwks_path.write_text(json.dumps({"keys": [jwk]}))
+
+    header = b64(json.dumps({"alg": alg, "kid": "key-1", "typ": "JWT"}).encode())
+    payload = b64(json.dumps({"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 60}).encode())
+    signing_input = f"{header}.{payload}".encode()
+    if alg == "RS256":
+        signature = private_key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+    else:
+        r, s = decode_dss_signature(private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        signature = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+    token = f"{header}.{payload}.{b64(signature)}"
+
+    verifier = TokenVerifier(jwks_path=str(jwks_path))
+    assert verifier.verify(token)["id"] == "user-1"
+    assert verifier.verify(token[:-4] + "AAAA") is None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the offline load harness: synthetic data, fault injection and a short run against each kind of target
+"""
+
+import pytest
+
+import load_harness
+from conftest import USER_ID
+from local_supabase import LocalSupabase
+from synthetic_data import Scale, load_stand_in, load_sqlite, make_users
+from sqlite_backend import SQLiteDatabaseClient
+
+SCALE = Scale(5, 20, 300)
+
+
+def test_synthetic_data_is_deterministic_and_complete(server, tmp_path):
+    dataset = load_stand_in(server, SCALE, seed=3)
+    again = load_stand_in(LocalSupabase(), SCALE, seed=3)
+    db = SQLiteDatabaseClient(str(tmp_path / "expenses.db"))
+    in_sqlite = load_sqlite(db, SCALE, seed=3)
+
+    assert dataset.users == again.users == in_sqlite.users == make_users(SCALE, seed=3)
+    assert dataset.groups_by_user == again.groups_by_user == in_sqlite.groups_by_user
+    assert dataset.group_count == 20 and len(server.tables["groups"]) == 20
+    assert dataset.expenses == len(server.tables["expenses"]) == 300
+    assert db.summarize_expenses(list(range(1, 21))) == {
+        group_id: {
+            "expense_count": len(rows),
+            "total_cents": sum(round(row["amount"] * 100) for row in rows)
+        }
+        for group_id in range(1, 21)
+        for rows in [[row for row in server.tables["expenses"] if row["group_id"] == group_id]]
+    }
+    db.close()
+
+
+def test_index_follows_inserts_and_deletes(server):
+    server.seed("groups", [{"name": f"G{i}", "created_by": USER_ID if i % 2 else "other"} for i in range(6)])
+
+    assert [row["name"] for row in server.query("groups", [("created_by", f"eq.{USER_ID}")])] == ["G1", "G3", "G5"]
+
+    server.delete("groups", [("name", "eq.G3")])
+    server.seed("groups", [{"name": "G6", "created_by": USER_ID}])
+
+    assert [row["name"] for row in server.query("groups", [("created_by", f"eq.{USER_ID}")])] == ["G1", "G5", "G6"]
+    assert [row["name"] for row in server.query("groups", [("created_by", f'in.("other",{USER_ID})')])] == [
+        "G0", "G1", "G2", "G4", "G5", "G6"
+    ]
+
+
+def test_error_injection(server, fast_client, auth_headers):
+    server.error_rate = 1.0
+
+    response = fast_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"})
+
+    assert response.status_code >= 500
+    assert server.injected_errors == 1 and server.tables.get("groups", []) == []
+
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert load_harness.percentile(values, 0.5) == 50
+    assert load_harness.percentile(values, 0.99) == 99
+    assert load_harness.percentile([7], 0.95) == 7
+    assert load_harness.percentile([], 0.5) == 0.0
+
+
+@pytest.mark.parametrize("target, module, client", [
+    ("fast", "fast_group_handler", "supabase"),
+    ("async", "async_group_handler", "supabase"),
+    ("main-sqlite", "main", "db_client")
+])
+def test_harness_runs_every_scenario(target, module, client, monkeypatch):
+    # The harness rewires the handler module; put it back afterwards
+    module = __import__(module)
+    monkeypatch.setattr(module, client, getattr(module, client))
+    monkeypatch.setattr(module, "token_verifier", module.token_verifier)
+    monkeypatch.setattr(module.rate_limiter, "enabled", module.rate_limiter.enabled)
+
+    reports = load_harness.run(target=target, scale=SCALE, scenarios=list(load_harness.SCENARIOS),
+                               requests=30, concurrency=4, quiet=True)
+
+    assert [report["scenario"] for report in reports] == list(load_harness.SCENARIOS)
+    for report in reports:
+        assert report["errors"] == 0 and sum(report["statuses"].values()) == 30
+        assert set(report["statuses"]) <= {"200", "201"}
+        assert 0 < report["p50_ms"] <= report["p95_ms"] <= report["p99_ms"] <= report["max_ms"]
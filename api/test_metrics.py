@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus /metrics endpoint: request, upstream and cache metrics, and merging across processes
+"""
+
+import re
+import multiprocessing
+
+import pytest
+
+import metrics
+from conftest import USER_ID
+
+
+def sample(text, name, **labels):
+    """Value of one sample in exposition text (0 if absent)"""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{wanted}}}" if wanted else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+@pytest.fixture
+def group(server):
+    return server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+
+
+def test_request_counts_and_latency_histogram(group, fast_client, auth_headers):
+    before = fast_client.get("/metrics").get_data(as_text=True)
+    for _ in range(3):
+        fast_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+    fast_client.get("/api/groups", headers={})
+
+    response = fast_client.get("/metrics")
+    text = response.get_data(as_text=True)
+
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    labels = {"route": "get_group_expenses", "method": "GET", "status": "200"}
+    assert sample(text, "http_requests_total", **labels) - sample(before, "http_requests_total", **labels) == 3
+    assert sample(text, "http_requests_total", route="get_user_groups", method="GET", status="401") >= 1
+
+    histogram = {"route": "get_group_expenses", "method": "GET"}
+    buckets = [float(value) for value in re.findall(
+        r'^http_request_duration_seconds_bucket\{route="get_group_expenses",method="GET",le="[^"]+"\} (\S+)$',
+        text, re.MULTILINE)]
+    assert buckets == sorted(buckets) and len(buckets) == len(metrics.LATENCY_BUCKETS) + 1
+    assert buckets[-1] == sample(text, "http_request_duration_seconds_count", **histogram) >= 3
+    assert sample(text, "http_request_duration_seconds_sum", **histogram) > 0
+    # Only the /metrics request itself is in flight
+    assert sample(text, "http_requests_in_flight") == 1
+
+
+def test_upstream_latency_and_errors_by_table_and_operation(server, fast_client, auth_headers):
+    before = metrics.render()
+    fast_client.get("/api/groups", headers=auth_headers)
+    server.error_rate = 1.0
+    fast_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"})
+
+    text = metrics.render()
+
+    ok = {"table": "groups", "operation": "select", "outcome": "ok"}
+    failed = {"table": "groups", "operation": "insert", "outcome": "error"}
+    assert (sample(text, "upstream_request_duration_seconds_count", **ok)
+            > sample(before, "upstream_request_duration_seconds_count", **ok))
+    assert (sample(text, "upstream_request_duration_seconds_count", **failed)
+            - sample(before, "upstream_request_duration_seconds_count", **failed)) == 1
+    errors = {"table": "groups", "operation": "insert", "status": "503"}
+    assert sample(text, "upstream_errors_total", **errors) - sample(before, "upstream_errors_total", **errors) == 1
+
+
+def test_cache_hit_ratio(group, main_client, auth_headers):
+    before = main_client.get("/metrics").get_data(as_text=True)
+    for _ in range(3):
+        main_client.post(f"/api/expenses/{group['id']}", headers=auth_headers, json={"description": "Taxi", "amount": 3})
+
+    text = main_client.get("/metrics").get_data(as_text=True)
+
+    hits = sample(text, "cache_hits_total", cache="owned_groups")
+    misses = sample(text, "cache_misses_total", cache="owned_groups")
+    assert (hits - sample(before, "cache_hits_total", cache="owned_groups"),
+            misses - sample(before, "cache_misses_total", cache="owned_groups")) == (2, 1)
+    assert sample(text, "cache_hit_ratio", cache="owned_groups") == pytest.approx(hits / (hits + misses))
+    assert "cache_hits_total{cache=\"etags\"}" in text and "cache_hits_total{cache=\"tokens\"}" in text
+    assert "cache_evictions_total{cache=\"expenses\"}" in text
+
+
+def test_async_app_exposes_metrics(group, async_client, auth_headers):
+    async_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+
+    response = async_client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert sample(response.text, "http_requests_total", route="get_group_expenses", method="GET", status="200") >= 1
+
+
+def _worker(requests_served):
+    for _ in range(requests_served):
+        metrics.request_started()
+        metrics.request_finished("get_user_groups", "GET", 200, 0.02)
+    metrics.observe_upstream("GET", "groups", 503, 0.01)
+    # Left in flight; the gauge must not count it once this worker is gone
+    metrics.request_started()
+    metrics.flush()
+
+
+def test_totals_merge_across_worker_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    labels = {"route": "get_user_groups", "method": "GET", "status": "200"}
+    before = sample(metrics.render(), "http_requests_total", **labels)
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_worker, args=(n,)) for n in (5, 7)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    text = metrics.render()
+
+    assert len(list(tmp_path.glob("metrics-*.json"))) == 2
+    assert sample(text, "http_requests_total", **labels) - before == 12
+    assert sample(text, "upstream_errors_total", table="groups", operation="select", status="503") >= 2
+    assert sample(text, "http_requests_in_flight") == sample(metrics.render(metrics.snapshot()), "http_requests_in_flight")
+
+
+def test_forked_worker_starts_from_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    metrics.request_finished("parent_only", "GET", 200, 0.01)
+
+    worker = multiprocessing.get_context("fork").Process(target=_worker, args=(1,))
+    worker.start()
+    worker.join()
+
+    child, = tmp_path.glob("metrics-*.json")
+    assert "parent_only" not in child.read_text()
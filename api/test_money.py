@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test integer-cents money handling: exact parsing and sums, and one total across handlers
+"""
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from conftest import USER_ID
+from money import MoneyError, parse_amount, to_cents, sum_cents, to_amount, format_cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    ("12.50", 1250), (12.5, 1250), (3, 300), ("0.01", 1), (Decimal("19.99"), 1999), (" 7 ", 700), ("-4.2", -420)
+])
+def test_parse_amount(value, cents):
+    assert parse_amount(value) == cents
+
+
+@pytest.mark.parametrize("value", ["12.345", "abc", "", None, True, "nan", "inf", 1e20, [1]])
+def test_parse_amount_rejects(value):
+    with pytest.raises(MoneyError):
+        parse_amount(value)
+
+
+def test_upstream_amounts_convert_exactly():
+    assert to_cents("0.29") == 29
+    assert to_cents(0.29) == 29
+    assert to_cents(Decimal("1234567.89")) == 123456789
+    assert to_cents(None) == 0
+    assert sum_cents([0.1, 0.2]) == 30
+    assert to_amount(sum_cents([0.1, 0.2])) == 0.3
+
+
+def test_sum_cents_matches_decimal_on_many_amounts():
+    rng = random.Random(7)
+    amounts = [rng.randrange(1, 10 ** 8) / 100 for _ in range(50_000)]
+    strings = [f"{amount:.2f}" for amount in amounts]
+
+    expected = sum(Decimal(string) for string in strings)
+
+    assert Decimal(sum_cents(amounts)) / 100 == expected
+    assert Decimal(sum_cents(strings)) / 100 == expected
+    assert repr(to_amount(sum_cents(strings))) == str(expected.normalize())
+
+
+def test_sum_cents_stays_exact_beyond_the_fsum_range():
+    amounts = ["99999999999.99", "0.01", "12345678901.23"] * 100
+
+    assert sum_cents(amounts) == sum(Decimal(amount) for amount in amounts) * 100
+
+
+def test_format_cents():
+    assert format_cents(1250) == "12.50"
+    assert format_cents(-5) == "-0.05"
+    assert format_cents(0) == "0.00"
+
+
+def test_every_handler_reports_the_same_exact_total(server, fast_client, main_client, async_client, auth_headers):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Item {i}", "amount": amount, "group_id": group["id"], "created_by": USER_ID}
+        for i, amount in enumerate([0.1, 0.2, 0.7, 19.99, 1000.01] * 20)
+    ])
+
+    totals = {
+        fast_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers).get_json()["total_amount"],
+        main_client.get(f"/api/expenses/{group['id']}", headers=auth_headers).get_json()["total_amount"],
+        async_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers).json()["total_amount"]
+    }
+
+    assert totals == {20420.0}
+
+
+def test_amount_with_fractional_cents_is_rejected(server, fast_client, auth_headers):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+
+    single = fast_client.post(f"/api/groups/{group['id']}/expenses", headers=auth_headers,
+                              json={"description": "Coffee", "amount": "3.999"})
+    batch = fast_client.post(f"/api/groups/{group['id']}/expenses:batch", headers=auth_headers,
+                             json=[{"description": "Coffee", "amount": "3.999"}])
+
+    assert single.status_code == 400
+    assert batch.status_code == 400 and batch.get_json()["results"][0]["errors"][0]["field"] == "amount"
+    assert server.tables.get("expenses", []) == []
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test the owned-group cache and the upstream calls it saves in the fast handler
+"""
+
+from ownership_cache import OwnedGroupCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = OwnedGroupCache(ttl=10, clock=clock)
+    cache.put("user", [1, 2])
+
+    assert cache.get("user") == {1, 2}
+    clock.now = 10
+    assert cache.get("user") is None
+
+
+def test_least_recently_used_user_is_evicted():
+    cache = OwnedGroupCache(max_users=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {1}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_add_and_discard_only_touch_known_users():
+    cache = OwnedGroupCache()
+    cache.add("unknown", 5)
+    assert cache.get("unknown") is None
+
+    cache.put("user", [1])
+    cache.add("user", 2)
+    cache.discard("user", 1)
+    assert cache.get("user") == {2}
+
+
+def test_writes_skip_group_lookup_once_cached(server, fast_client, auth_headers):
+    group = fast_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"}).get_json()
+
+    # First ownership check loads the owned IDs; later ones are pure cache hits
+    fast_client.post(f"/api/groups/{group['id']}/expenses", headers=auth_headers,
+                     json={"description": "Fuel", "amount": 40})
+    server.reset_calls()
+    response = fast_client.post(f"/api/groups/{group['id']}/expenses", headers=auth_headers,
+                                json={"description": "Food", "amount": 25})
+
+    assert response.status_code == 201
+    assert server.call_count() == 1
+    assert server.call_count("POST", "expenses") == 1
+
+
+def test_deleted_group_is_no_longer_owned(server, fast_client, auth_headers):
+    group = fast_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"}).get_json()
+    fast_client.get("/api/groups", headers=auth_headers)
+
+    assert fast_client.delete(f"/api/groups/{group['id']}", headers=auth_headers).status_code == 200
+    response = fast_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+
+    assert response.status_code == 404
+
+
+def test_foreign_group_is_rejected(server, fast_client, auth_headers):
+    other = server.seed("groups", [{"name": "Not mine", "created_by": "someone-else"}])[0]
+
+    response = fast_client.post(f"/api/groups/{other['id']}/expenses", headers=auth_headers,
+                                json={"description": "Sneaky", "amount": 1})
+
+    assert response.status_code == 404
+    assert server.call_count("POST", "expenses") == 0
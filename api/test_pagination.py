@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test keyset pagination of group and expense listings
+"""
+
+import json
+import base64
+
+import pytest
+
+from conftest import USER_ID
+from pagination import PaginationError, encode_cursor, decode_cursor, parse_page_args, MAX_PAGE_SIZE
+
+
+def seed_group_with_expenses(server, count):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Expense {i}", "amount": 1.5, "group_id": group["id"], "created_by": USER_ID}
+        for i in range(count)
+    ])
+    return group
+
+
+def walk(client, url, headers, limit):
+    pages, cursor = [], None
+    while True:
+        query = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url + query, headers=headers)
+        assert response.status_code == 200
+        # Flask test responses expose .json as a property, Starlette's as a method
+        body = response.json() if callable(response.json) else response.json
+        pages.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("created_at", ['2024-01-01",id.gt.0)', "yesterday", ""])
+def test_cursor_with_a_malformed_timestamp_is_rejected(created_at):
+    cursor = base64.urlsafe_b64encode(json.dumps([created_at, 1]).encode()).decode()
+
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor)
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2024-01-01T00:00:00.000001+00:00", "id": 42}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], 42)
+
+
+@pytest.mark.parametrize("args", [{"limit": "0"}, {"limit": "ten"}, {"cursor": "not-a-cursor"}])
+def test_invalid_page_args(args):
+    with pytest.raises(PaginationError):
+        parse_page_args(args)
+
+
+def test_limit_is_capped():
+    assert parse_page_args({"limit": str(MAX_PAGE_SIZE * 10)})[0] == MAX_PAGE_SIZE
+
+
+def test_fast_handler_walks_expenses_without_duplicates(server, fast_client, auth_headers):
+    group = seed_group_with_expenses(server, 23)
+
+    pages = walk(fast_client, f"/api/groups/{group['id']}/expenses", auth_headers, limit=5)
+
+    ids = [expense["id"] for page in pages for expense in page["expenses"]]
+    assert len(pages) == 5
+    assert len(ids) == len(set(ids)) == 23
+    assert ids == sorted(ids, reverse=True)
+    # Totals describe the whole group on every page, not just the rows returned
+    assert all(page["count"] == 23 and page["total_amount"] == 34.5 for page in pages)
+
+
+def test_fast_handler_pages_use_keyset_not_offset(server, fast_client, auth_headers, monkeypatch):
+    import fast_group_handler
+
+    # Groups over one row are too large for the expense cache, so every read pages upstream
+    monkeypatch.setattr(fast_group_handler.expense_cache, "max_rows", 1)
+    group = seed_group_with_expenses(server, 12)
+    first = fast_client.get(f"/api/groups/{group['id']}/expenses?limit=5", headers=auth_headers).get_json()
+
+    server.reset_calls()
+    fast_client.get(f"/api/groups/{group['id']}/expenses?limit=5&cursor={first['next_cursor']}", headers=auth_headers)
+
+    page_call = next(call for call in server.calls if dict(call["params"]).get("order"))
+    params = dict(page_call["params"])
+    assert "offset" not in params
+    assert params["limit"] == "6"
+    assert params["or"].startswith("(created_at.lt.")
+
+
+def test_fast_handler_groups_count_on_first_page(server, fast_client, auth_headers):
+    server.seed("groups", [{"name": f"Group {i}", "created_by": USER_ID} for i in range(7)])
+
+    pages = walk(fast_client, "/api/groups", auth_headers, limit=3)
+
+    names = [group["name"] for page in pages for group in page["groups"]]
+    assert len(names) == len(set(names)) == 7
+    # The total is counted once, on the first page
+    assert pages[0]["count"] == 7
+    assert all(page["count"] is None for page in pages[1:])
+
+
+def test_failed_groups_read_is_an_error_not_an_empty_list(server, fast_client, main_client, async_client,
+                                                          auth_headers, monkeypatch):
+    import fast_group_handler, async_group_handler, main
+
+    server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])
+    query = server.query
+
+    def failing_query(table, params, with_total=False):
+        if table == "groups":
+            raise ValueError("upstream went away")
+        return query(table, params, with_total)
+
+    monkeypatch.setattr(server, "query", failing_query)
+    for client, module in ((fast_client, fast_group_handler), (main_client, main), (async_client, async_group_handler)):
+        response = client.get("/api/groups", headers=auth_headers)
+
+        assert response.status_code >= 500
+        assert "ETag" not in response.headers
+        # An unread group list must not be remembered as "owns nothing"
+        assert module.owned_groups.get(USER_ID) is None
+
+
+def test_invalid_cursor_returns_400(server, fast_client, main_client, async_client, auth_headers):
+    group = seed_group_with_expenses(server, 1)
+
+    assert fast_client.get("/api/groups?cursor=bogus", headers=auth_headers).status_code == 400
+    assert main_client.get(f"/api/expenses/{group['id']}?cursor=bogus", headers=auth_headers).status_code == 400
+    assert async_client.get(f"/api/groups/{group['id']}/expenses?limit=-1", headers=auth_headers).status_code == 400
+
+
+def test_main_and_async_walk_expenses(server, main_client, async_client, auth_headers):
+    group = seed_group_with_expenses(server, 11)
+
+    for client, url in [(main_client, f"/api/expenses/{group['id']}"),
+                        (async_client, f"/api/groups/{group['id']}/expenses")]:
+        pages = walk(client, url, auth_headers, limit=4)
+        ids = [expense["id"] for page in pages for expense in page["expenses"]]
+        assert len(ids) == len(set(ids)) == 11
+        assert pages[0]["count"] == 11
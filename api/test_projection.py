@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test ?fields= projection on the list endpoints
+"""
+
+import json
+
+import pytest
+
+from conftest import USER_ID
+from projection import ProjectionError, parse_fields, EXPENSE_COLUMNS, GROUP_COLUMNS, GROUP_SUMMARY_FIELDS
+
+
+def seed_group(server, count=40):
+    group = server.seed("groups", [{"name": "Trip", "description": "Summer trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Dinner at restaurant number {i}", "amount": 2.5, "group_id": group["id"], "created_by": USER_ID}
+        for i in range(count)
+    ])
+    return group
+
+
+def test_parse_fields():
+    assert parse_fields({}, EXPENSE_COLUMNS).select("id") == "*"
+    projection = parse_fields({"fields": "amount, amount,description"}, EXPENSE_COLUMNS)
+    assert projection.fields == ("amount", "description")
+    assert projection.select("id", "created_at") == "amount,description,id,created_at"
+
+    groups = parse_fields({"fields": "name,total_amount"}, GROUP_COLUMNS, GROUP_SUMMARY_FIELDS)
+    assert groups.select("id") == "name,id"
+    assert groups.wants("total_amount") and not groups.wants("expense_count")
+
+
+@pytest.mark.parametrize("raw", ["", " , ", "amount,password"])
+def test_parse_fields_rejects_bad_lists(raw):
+    with pytest.raises(ProjectionError):
+        parse_fields({"fields": raw}, EXPENSE_COLUMNS)
+
+
+def test_fast_handler_projects_expenses_upstream_and_in_response(server, fast_client, auth_headers, monkeypatch):
+    import fast_group_handler
+
+    # Groups over one row are too large for the expense cache, so every read pages upstream
+    monkeypatch.setattr(fast_group_handler.expense_cache, "max_rows", 1)
+    group = seed_group(server)
+    url = f"/api/groups/{group['id']}/expenses"
+
+    fast_client.get(url, headers=auth_headers)
+    server.reset_calls()
+    full = fast_client.get(url, headers=auth_headers)
+    full_upstream = server.bytes_sent("expenses")
+
+    server.reset_calls()
+    slim = fast_client.get(f"{url}?fields=amount", headers=auth_headers)
+    slim_upstream = server.bytes_sent("expenses")
+
+    page_call = next(call for call in server.calls if dict(call["params"]).get("order"))
+    assert dict(page_call["params"])["select"] == "amount,id,created_at"
+
+    body = slim.get_json()
+    assert all(set(expense) == {"amount"} for expense in body["expenses"])
+    assert body["count"] == 40 and body["total_amount"] == 100.0
+    assert slim_upstream < full_upstream / 2
+    assert len(slim.get_data()) < len(full.get_data()) / 2
+
+
+def test_fast_handler_group_fields_skip_unrequested_summaries(server, fast_client, auth_headers):
+    seed_group(server)
+    server.reset_calls()
+
+    response = fast_client.get("/api/groups?fields=id,name", headers=auth_headers)
+
+    assert response.get_json()["groups"] == [{"id": 1, "name": "Trip"}]
+    assert server.call_count("GET", "expenses") == 0
+
+
+def test_unknown_field_returns_400(server, fast_client, main_client, async_client, auth_headers):
+    group = seed_group(server, 1)
+
+    assert fast_client.get("/api/groups?fields=secret", headers=auth_headers).status_code == 400
+    assert main_client.get(f"/api/expenses/{group['id']}?fields=secret", headers=auth_headers).status_code == 400
+    assert async_client.get(f"/api/groups/{group['id']}/expenses?fields=", headers=auth_headers).status_code == 400
+
+
+def test_main_and_async_project_expenses(server, main_client, async_client, auth_headers):
+    group = seed_group(server, 5)
+
+    main_body = main_client.get(f"/api/expenses/{group['id']}?fields=id,amount", headers=auth_headers).get_json()
+    async_body = async_client.get(f"/api/groups/{group['id']}/expenses?fields=id,amount", headers=auth_headers).json()
+
+    for body in (main_body, async_body):
+        assert all(set(expense) == {"id", "amount"} for expense in body["expenses"])
+        assert body["total_amount"] == 12.5
+
+
+def test_streamed_export_projects_rows_but_keeps_totals(server, fast_client, auth_headers):
+    group = seed_group(server, 30)
+
+    response = fast_client.get(f"/api/groups/{group['id']}/expenses?stream=1&fields=description", headers=auth_headers)
+
+    document = json.loads(response.get_data())
+    assert all(set(expense) == {"description"} for expense in document["expenses"])
+    assert document["count"] == 30 and document["total_amount"] == 75.0
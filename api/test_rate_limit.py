@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Test per-user and per-route token buckets, their shared backends and the 429s the handlers return
+"""
+
+import threading
+
+import pytest
+
+import metrics
+from rate_limit import RateLimiter
+from shared_cache import SQLiteSharedBackend, RedisSharedBackend
+from local_redis import LocalRedis
+from local_supabase import issue_token
+from test_metrics import sample
+
+COSTS = {"list": 2, "cheap": 1, "health": 0}
+
+
+def limiter(clock, **options):
+    return RateLimiter(**{"rate": 1, "burst": 4, "costs": COSTS, "route_rates": {}, "clock": lambda: clock[0],
+                          **options})
+
+
+# ================================
+# BUCKETS
+# ================================
+
+def test_requests_spend_their_route_cost_and_buckets_refill():
+    clock = [0.0]
+    limits = limiter(clock)
+
+    assert limits.take("user:a", "list") == 0 and limits.take("user:a", "list") == 0
+    assert limits.take("user:a", "list") == 2.0
+    assert limits.take("user:a", "health") == 0
+
+    clock[0] = 1.0
+    assert limits.take("user:a", "cheap") == 0
+    assert limits.take("user:a", "cheap") == 1.0
+    # Someone else's bucket is untouched
+    assert limits.take("user:b", "list") == 0
+    assert limits.stats()["limited"] == 2
+
+
+def test_route_buckets_cap_all_callers_and_refund_rejected_requests():
+    clock = [0.0]
+    limits = limiter(clock, burst=100, route_rates={"list": 4})
+
+    assert limits.take("user:a", "list") == 0 and limits.take("user:b", "list") == 0
+    before = sample(metrics.render(), "rate_limited_total", route="list", scope="route")
+    assert limits.take("user:c", "list") == 0.5
+    assert sample(metrics.render(), "rate_limited_total", route="list", scope="route") - before == 1
+
+    # A caller turned away by its own bucket leaves the route's tokens for others
+    limits = limiter(clock, burst=2, route_rates={"list": 4})
+    assert limits.take("user:a", "list") == 0
+    assert limits.take("user:a", "list") > 0
+    assert limits.take("user:b", "list") == 0
+
+
+def test_a_cost_above_the_burst_empties_a_full_bucket():
+    clock = [0.0]
+    limits = limiter(clock, costs={"batch": 10})
+
+    assert limits.take("user:a", "batch") == 0
+    assert limits.take("user:a", "batch") == 4.0
+
+
+def test_counters_add_up_under_concurrent_requests():
+    limits = limiter([0.0], burst=100)
+
+    def hammer():
+        for _ in range(200):
+            limits.take("user:a", "cheap")
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = limits.stats()
+    assert (stats["allowed"], stats["limited"]) == (100, 1500)
+
+
+def test_disabled_limiter_lets_everything_through():
+    limits = limiter([0.0], enabled=False)
+
+    assert all(limits.take("user:a", "list") == 0 for _ in range(10))
+
+
+# ================================
+# SHARED BACKENDS
+# ================================
+
+class Counting:
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = 0
+
+    def take(self, *args):
+        self.calls += 1
+        return self.backend.take(*args)
+
+
+def test_workers_share_a_bucket_through_sqlite(tmp_path):
+    path = str(tmp_path / "shared.db")
+    backend = Counting(SQLiteSharedBackend(path))
+    first = RateLimiter(rate=0.01, burst=4, costs=COSTS, route_rates={}, backend=backend)
+    second = RateLimiter(rate=0.01, burst=4, costs=COSTS, route_rates={}, backend=SQLiteSharedBackend(path))
+
+    assert first.take("user:a", "list") == 0
+    assert second.take("user:a", "list") == 0
+    assert first.take("user:a", "cheap") > 0
+    calls = backend.calls
+    # Known to be over the limit: turned away without asking the backend again
+    assert first.take("user:a", "cheap") > 0
+    assert backend.calls == calls
+    assert second.take("user:b", "list") == 0
+
+
+def test_concurrent_workers_never_overspend_through_redis():
+    with LocalRedis() as redis:
+        limiters = [RateLimiter(rate=0.01, burst=20, costs=COSTS, route_rates={},
+                                backend=RedisSharedBackend(redis.url)) for _ in range(4)]
+        allowed = []
+
+        def hammer(limits):
+            for _ in range(20):
+                if limits.take("user:a", "cheap") == 0:
+                    allowed.append(1)
+
+        threads = [threading.Thread(target=hammer, args=(limits,)) for limits in limiters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(allowed) == 20
+
+
+def test_a_failing_backend_falls_back_to_local_buckets():
+    class Broken:
+        def take(self, *args):
+            raise ConnectionError("refused")
+
+    limits = limiter([0.0], backend=Broken())
+
+    assert limits.take("user:a", "list") == 0 and limits.take("user:a", "list") == 0
+    assert limits.take("user:a", "list") > 0
+    assert limits.errors == 3
+
+
+# ================================
+# HANDLERS
+# ================================
+
+@pytest.fixture
+def tight(monkeypatch):
+    """Room for one groups listing per user, refilled too slowly to matter"""
+    import fast_group_handler, async_group_handler, main
+
+    for module in (fast_group_handler, async_group_handler, main):
+        monkeypatch.setattr(module.rate_limiter, "rate", 0.01)
+        monkeypatch.setattr(module.rate_limiter, "burst", 3)
+        monkeypatch.setattr(module.rate_limiter, "enabled", True)
+
+
+def test_fast_handler_answers_429_before_calling_upstream(server, tight, fast_client, auth_headers):
+    assert fast_client.get("/api/groups", headers=auth_headers).status_code == 200
+    calls = server.call_count()
+    before = sample(metrics.render(), "rate_limited_total", route="get_user_groups", scope="user")
+
+    response = fast_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert server.call_count() == calls
+    assert sample(metrics.render(), "rate_limited_total", route="get_user_groups", scope="user") - before == 1
+    # Free routes and other users are not affected
+    assert fast_client.get("/health").get_json()["rate_limit"]["backend"] is None
+    other = {"Authorization": f"Bearer {issue_token('someone-else')}"}
+    assert fast_client.get("/api/groups", headers=other).status_code == 200
+
+
+def test_requests_without_a_valid_token_are_limited_by_address(tight, fast_client, auth_headers):
+    statuses = [fast_client.get("/api/groups").status_code for _ in range(3)]
+
+    assert statuses == [401, 429, 429]
+    assert fast_client.get("/api/groups", headers=auth_headers).status_code == 200
+
+
+def test_bad_tokens_are_throttled_without_asking_supabase_auth(server, tight, main_client):
+    # main.py verifies remotely here, and rejected tokens are not cached
+    bad = {"Authorization": "Bearer not-a-token"}
+
+    statuses = [main_client.get("/api/groups", headers=bad).status_code for _ in range(3)]
+
+    assert statuses == [401, 429, 429]
+    # Only the one request that got through asked
+    assert server.call_count("GET", "user") == 1
+
+
+def test_unverified_tokens_do_not_share_the_address_bucket(tight, main_client, auth_headers):
+    # main.py verifies remotely here, so neither token is known to the limiter on its first request
+    other = {"Authorization": f"Bearer {issue_token('someone-else')}"}
+
+    assert main_client.get("/api/groups", headers=auth_headers).status_code == 200
+    assert main_client.get("/api/groups", headers=other).status_code == 200
+
+
+def test_async_and_main_handlers_limit_too(tight, async_client, main_client, auth_headers):
+    # main.py verifies remotely here: the token's first request is counted against its hash
+    for client, allowed in ((async_client, 1), (main_client, 2)):
+        for _ in range(allowed):
+            assert client.get("/api/groups", headers=auth_headers).status_code == 200
+        response = client.get("/api/groups", headers=auth_headers)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert client.get("/health").status_code == 200
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Test deadlines, hedged reads, the retry budget and the circuit breaker, alone and through the handlers
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+import metrics
+import resilience
+from conftest import USER_ID
+from resilience import (Upstream, AsyncUpstream, CircuitBreaker, RetryBudget, UpstreamUnavailable,
+                        DeadlineExceeded, CircuitOpen, start_deadline, end_deadline)
+from test_metrics import sample
+
+
+class Response:
+    def __init__(self, status_code=200, body="ok"):
+        self.status_code = status_code
+        self.body = body
+
+
+def script(*steps):
+    """attempt(timeout) that plays one step per call: a delay in seconds, a Response or an exception"""
+    calls = []
+
+    def attempt(timeout):
+        calls.append(timeout)
+        step = steps[min(len(calls), len(steps)) - 1]
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, Response):
+            return step
+        time.sleep(step)
+        return Response(body=f"after {step}")
+
+    attempt.calls = calls
+    return attempt
+
+
+def warmed(upstream, table="groups", seconds=0.01):
+    """Give a table enough known latencies to be hedged"""
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        upstream._record(table, True, seconds)
+    return upstream
+
+
+# ================================
+# BUILDING BLOCKS
+# ================================
+
+def test_breaker_opens_fails_fast_and_probes_after_the_cooldown():
+    now = [0.0]
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, cooldown=5, clock=lambda: now[0])
+
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == "open"
+    assert not breaker.allow() and breaker.retry_after() == 5
+
+    now[0] = 5
+    # One probe only; a failed probe reopens for another cooldown
+    assert breaker.allow() and not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.stats() == {"state": "closed", "opened": 2, "rejected": 3}
+
+
+def test_retry_budget_earns_a_fraction_per_call():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+
+    assert budget.withdraw() and budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+# ================================
+# THREADED
+# ================================
+
+def test_reads_are_retried_but_writes_are_not():
+    upstream = Upstream(hedging=False, backoff=0)
+    read = script(ConnectionError("reset"), Response(503), Response(200))
+
+    assert upstream.read("groups", read).status_code == 200
+    assert len(read.calls) == 3 and upstream.retries == 2
+
+    write = script(ConnectionError("reset"), Response(201))
+    with pytest.raises(UpstreamUnavailable):
+        upstream.write("groups", write)
+    assert len(write.calls) == 1
+
+
+def test_client_errors_are_answers_not_failures():
+    upstream = Upstream(hedging=False)
+    read = script(Response(404))
+
+    assert upstream.read("groups", read).status_code == 404
+    assert len(read.calls) == 1 and upstream.breaker.stats()["state"] == "closed"
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    upstream = Upstream(hedging=False, backoff=0, retry_budget=RetryBudget(ratio=0, max_tokens=1))
+    before = sample(metrics.render(), "upstream_retry_budget_exhausted_total", table="groups")
+    read = script(Response(503))
+
+    with pytest.raises(UpstreamUnavailable, match="status 503"):
+        upstream.read("groups", read)
+    assert len(read.calls) == 2
+    assert sample(metrics.render(), "upstream_retry_budget_exhausted_total", table="groups") - before == 1
+
+
+def test_a_slow_read_is_hedged_and_the_first_answer_wins():
+    upstream = warmed(Upstream())
+    read = script(0.3, 0.0)
+    before = sample(metrics.render(), "upstream_hedges_total", table="groups", outcome="won")
+
+    response = upstream.read("groups", read)
+
+    assert response.body == "after 0.0" and len(read.calls) == 2
+    assert upstream.hedges == upstream.hedges_won == 1
+    assert sample(metrics.render(), "upstream_hedges_total", table="groups", outcome="won") - before == 1
+
+
+def test_the_primary_runs_on_the_request_thread_and_its_failure_falls_back_on_the_hedge():
+    upstream = warmed(Upstream(backoff=0))
+    threads = []
+
+    def read(timeout):
+        threads.append(threading.current_thread())
+        if len(threads) == 1:
+            time.sleep(0.2)
+            raise ConnectionError("reset")
+        time.sleep(0.3)
+        return Response(body="hedge")
+
+    assert upstream.read("groups", read).body == "hedge"
+    assert threads[0] is threading.current_thread() and threads[1] is not threads[0]
+    # The hedge answered for the failed primary; no retry was needed
+    assert len(threads) == 2 and upstream.retries == 0 and upstream.hedges_won == 1
+
+
+def test_reads_go_unhedged_while_every_hedge_thread_is_busy():
+    upstream = warmed(Upstream())
+    read = script(0.1)
+    taken = 0
+    while resilience._hedge_slots.acquire(blocking=False):
+        taken += 1
+    try:
+        assert upstream.read("groups", read).body == "after 0.1"
+    finally:
+        for _ in range(taken):
+            resilience._hedge_slots.release()
+
+    assert len(read.calls) == 1 and upstream.hedges == 0
+
+
+def test_fast_reads_and_cold_tables_are_not_hedged():
+    upstream = warmed(Upstream(), seconds=0.2)
+    read = script(0.0)
+    upstream.read("groups", read)
+    cold = script(0.05)
+    upstream.read("expenses", cold)
+
+    assert len(read.calls) == len(cold.calls) == 1 and upstream.hedges == 0
+
+
+def test_attempts_get_what_is_left_of_the_deadline():
+    upstream = Upstream(hedging=False)
+    read = script(Response(200))
+    token = start_deadline("get_user_groups")
+    try:
+        upstream.read("groups", read, timeout=30)
+        assert read.calls[0] <= resilience.UPSTREAM_BUDGET
+    finally:
+        end_deadline(token)
+
+    clock = [0.0]
+    token = start_deadline("get_user_groups", clock=lambda: clock[0])
+    try:
+        clock[0] = resilience.UPSTREAM_BUDGET
+        with pytest.raises(DeadlineExceeded):
+            upstream.read("groups", read)
+    finally:
+        end_deadline(token)
+    assert len(read.calls) == 1 and upstream.deadlines_exceeded == 1
+
+
+def test_an_open_circuit_fails_without_calling():
+    upstream = Upstream(hedging=False, backoff=0, breaker=CircuitBreaker(min_calls=2, failure_rate=1.0))
+    read = script(Response(503))
+
+    with pytest.raises(UpstreamUnavailable):
+        upstream.read("groups", read)
+    calls = len(read.calls)
+    with pytest.raises(CircuitOpen) as raised:
+        upstream.read("groups", read)
+
+    assert len(read.calls) == calls
+    assert raised.value.retry_after >= 1
+
+
+# ================================
+# ASYNC
+# ================================
+
+def async_script(*delays):
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        delay = delays[len(calls) - 1]
+        await asyncio.sleep(delay)
+        return Response(body=f"after {delay}")
+
+    attempt.calls = calls
+    return attempt
+
+
+def test_async_slow_read_is_hedged():
+    upstream = warmed(AsyncUpstream())
+    read = async_script(1.0, 0.0)
+
+    async def scenario():
+        started = time.perf_counter()
+        response = await upstream.read("groups", read)
+        return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(scenario())
+    assert response.body == "after 0.0" and elapsed < 0.5
+    assert upstream.hedges_won == 1
+
+
+def test_async_retries_then_gives_up():
+    upstream = AsyncUpstream(hedging=False, backoff=0)
+    calls = []
+
+    async def failing(timeout):
+        calls.append(timeout)
+        return Response(503)
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(upstream.read("groups", failing))
+    assert len(calls) == resilience.RETRY_ATTEMPTS
+
+
+# ================================
+# HANDLERS
+# ================================
+
+@pytest.fixture
+def group(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.reset_calls()
+    return group
+
+
+def test_fast_handler_surfaces_an_outage_as_503_then_fails_fast(server, group, fast_client, auth_headers):
+    import fast_group_handler
+
+    server.error_rate = 1.0
+
+    response = fast_client.get("/api/groups", headers=auth_headers)
+    # Not 200 with no groups
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+    for _ in range(resilience.BREAKER_MIN_CALLS):
+        if fast_group_handler.upstream.breaker.state == "open":
+            break
+        assert fast_client.get("/api/groups", headers=auth_headers).status_code == 503
+    calls = server.call_count()
+    before = sample(metrics.render(), "upstream_circuit_rejected_total", upstream="supabase")
+
+    response = fast_client.get("/api/groups", headers=auth_headers)
+    assert response.status_code == 503
+    assert server.call_count() == calls
+    assert sample(metrics.render(), "upstream_circuit_rejected_total", upstream="supabase") - before == 1
+    assert fast_client.get("/health").get_json()["upstream"]["circuit"]["state"] == "open"
+
+
+def test_fast_handler_rides_out_a_transient_error(server, group, fast_client, auth_headers):
+    server.fail_next(1)
+
+    response = fast_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["groups"][0]["name"] == "Trip"
+
+
+def test_fast_handler_writes_are_not_retried(server, fast_client, auth_headers):
+    server.fail_next(1)
+
+    response = fast_client.post("/api/groups", headers=auth_headers, json={"name": "Trip"})
+
+    assert response.status_code == 503
+    assert server.call_count("POST", "groups") == 1
+
+
+def test_fast_handler_hedges_a_stalled_read(server, group, fast_client, auth_headers, monkeypatch):
+    import fast_group_handler
+
+    monkeypatch.setattr(fast_group_handler, "upstream", warmed(warmed(Upstream(), "groups"), "expenses"))
+    # Far beyond the 10ms hedge delay, so the hedge answers first
+    server.stall(0.5)
+
+    response = fast_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert fast_group_handler.upstream.hedges_won == 1
+    assert server.call_count("GET", "groups") == 2
+
+
+def test_fast_handler_stops_at_the_route_budget(server, group, fast_client, auth_headers, monkeypatch):
+    monkeypatch.setitem(resilience.ROUTE_BUDGETS, "get_user_groups", 0.3)
+    server.latency = 0.2
+
+    started = time.perf_counter()
+    response = fast_client.get("/api/groups", headers=auth_headers)
+
+    # Two sequential 0.2s calls do not fit in 0.3s: the second is cut off at the budget
+    assert response.status_code == 503
+    assert time.perf_counter() - started < 0.45
+
+
+@pytest.mark.parametrize("handler", ["fast", "async"])
+def test_a_write_cut_off_by_its_budget_still_refreshes_the_listing(server, group, handler, request, auth_headers,
+                                                                   monkeypatch):
+    client = request.getfixturevalue(f"{handler}_client")
+    body = lambda response: response.get_json() if hasattr(response, "get_json") else response.json()
+    path = f"/api/groups/{group['id']}/expenses"
+    listing = client.get(path, headers=auth_headers)
+    assert body(listing)["count"] == 0
+    monkeypatch.setitem(resilience.ROUTE_BUDGETS, "create_expense", 0.2)
+    server.stall(0.5)
+
+    response = client.post(path, json={"description": "Dinner", "amount": 10}, headers=auth_headers)
+    assert response.status_code == 503
+    # The insert lands upstream after the handler gave up on it
+    time.sleep(0.6)
+
+    again = client.get(path, headers={**auth_headers, "If-None-Match": listing.headers["ETag"]})
+    assert again.status_code == 200
+    assert body(again)["count"] == 1
+
+
+def test_a_delete_cut_off_by_its_budget_drops_every_group_it_could_touch(server, group, fast_client, auth_headers,
+                                                                          monkeypatch):
+    expense = server.seed("expenses", [{"description": "Dinner", "amount": 10, "group_id": group["id"],
+                                        "created_by": USER_ID}])[0]
+    path = f"/api/groups/{group['id']}/expenses"
+    assert fast_client.get(path, headers=auth_headers).get_json()["count"] == 1
+    monkeypatch.setitem(resilience.ROUTE_BUDGETS, "delete_expense", 0.2)
+    server.stall(0.5)
+
+    # The response names no group, so every group of the user is dropped
+    assert fast_client.delete(f"/api/expenses/{expense['id']}", headers=auth_headers).status_code == 503
+    time.sleep(0.6)
+
+    assert fast_client.get(path, headers=auth_headers).get_json()["count"] == 0
+
+
+def test_async_handler_surfaces_an_outage_as_503(server, group, async_client, auth_headers):
+    server.error_rate = 1.0
+
+    response = async_client.get("/api/groups", headers=auth_headers)
+
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+    server.error_rate = 0.0
+    assert async_client.get("/api/groups", headers=auth_headers).json()["groups"][0]["name"] == "Trip"
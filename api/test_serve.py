@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test the production launcher: pre-forked workers, recycling, crash recovery and draining on SIGTERM
+"""
+
+import os
+import time
+import signal
+import threading
+import multiprocessing
+
+import pytest
+import requests
+
+import app_factory
+from serve import Arbiter, create_socket, cpu_count
+
+
+def pid_app(environ, start_response):
+    """Answers with the worker's pid; /slow takes a while, /crash kills the worker"""
+    if environ["PATH_INFO"] == "/crash":
+        os._exit(3)
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(1.0)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [str(os.getpid()).encode()]
+
+
+async def async_pid_app(scope, receive, send):
+    if scope["type"] != "http":
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+
+@pytest.fixture
+def launch():
+    """Run an Arbiter in a forked process; returns (process, base_url)"""
+    started = []
+
+    def start(app=pid_app, interface="wsgi", **options):
+        sock = create_socket("127.0.0.1:0")
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        options = {"workers": 1, "threads": 2, "max_requests": 0, "max_requests_jitter": 0,
+                   "graceful_timeout": 5, **options}
+        arbiter = Arbiter(app, interface, sock, **options)
+        process = multiprocessing.get_context("fork").Process(target=arbiter.run)
+        process.start()
+        sock.close()
+        started.append(process)
+        return process, url
+
+    yield start
+    for process in started:
+        if process.is_alive():
+            process.terminate()
+        process.join(10)
+
+
+def pid(url, path="/"):
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            return int(requests.get(url + path, timeout=5).text)
+        except requests.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_workers_are_forked_from_the_master(launch):
+    process, url = launch(workers=2)
+    pids = {pid(url) for _ in range(20)}
+
+    assert pids and process.pid not in pids and os.getpid() not in pids
+
+
+def test_workers_are_recycled_after_max_requests(launch):
+    _, url = launch(max_requests=3)
+    pids = [pid(url) for _ in range(9)]
+
+    assert len(set(pids)) == 3
+    assert pids[:3] == [pids[0]] * 3
+
+
+def test_a_crashed_worker_is_replaced(launch):
+    _, url = launch()
+    first = pid(url)
+    with pytest.raises(requests.ConnectionError):
+        requests.get(url + "/crash", timeout=5)
+
+    assert pid(url) != first
+
+
+def test_sigterm_drains_in_flight_requests(launch):
+    process, url = launch()
+    pid(url)
+    slow = {}
+    request = threading.Thread(target=lambda: slow.update(response=requests.get(url + "/slow", timeout=10)))
+    request.start()
+    time.sleep(0.3)
+
+    os.kill(process.pid, signal.SIGTERM)
+    request.join()
+    process.join(10)
+
+    assert slow["response"].status_code == 200
+    assert process.exitcode == 0
+    with pytest.raises(requests.ConnectionError):
+        requests.get(url, timeout=1)
+
+
+@pytest.mark.parametrize("app,interface", [(async_pid_app, "asgi"), (pid_app, "wsgi")])
+def test_async_workers(launch, app, interface):
+    process, url = launch(app=app, interface=interface, worker_class="async", max_requests=2)
+    pids = {pid(url)}
+    # uvicorn checks the request limit on its 0.1 s tick, so a worker may serve a few more
+    deadline = time.monotonic() + 5
+    while len(pids) == 1 and time.monotonic() < deadline:
+        pids.add(pid(url))
+        time.sleep(0.05)
+
+    assert process.pid not in pids and len(pids) == 2
+
+
+def test_configuration_errors():
+    with pytest.raises(ValueError):
+        Arbiter(async_pid_app, "asgi", None, worker_class="sync")
+    with pytest.raises(ValueError):
+        app_factory.interface("flask")
+    assert app_factory.interface("async") == "asgi"
+    assert cpu_count() >= 1
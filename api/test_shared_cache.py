@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Test the shared cache backends, the invalidation bus, and cache consistency across worker processes
+"""
+
+import time
+import multiprocessing
+
+import pytest
+import requests
+
+from conftest import USER_ID
+from etags import VersionStore
+from expense_cache import ExpenseCache
+from load_harness import PooledWSGIServer, free_port
+from local_redis import LocalRedis
+from ownership_cache import OwnedGroupCache
+from shared_cache import (SQLiteSharedBackend, RedisSharedBackend, InvalidationBus, EVERYTHING, evict_from,
+                          from_env)
+
+
+@pytest.fixture
+def redis_server():
+    with LocalRedis() as redis:
+        yield redis
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_backend(request, tmp_path):
+    """Factory for backends that share state, like those of separate workers"""
+    if request.param == "sqlite":
+        return lambda: SQLiteSharedBackend(str(tmp_path / "shared.db"))
+    redis = request.getfixturevalue("redis_server")
+    return lambda: RedisSharedBackend(redis.url)
+
+
+def eventually(check, timeout=2.0):
+    """Poll until check() is truthy; Redis pub/sub delivers asynchronously"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = check()
+        if result or time.monotonic() > deadline:
+            return result
+        time.sleep(0.01)
+
+
+def received(bus):
+    keys = []
+    bus.subscribe(keys.extend)
+    return keys
+
+
+def test_entries_expire_and_only_if_absent_keeps_the_first(make_backend):
+    first, second = make_backend(), make_backend()
+
+    assert first.set("etag:user:1", "a", ttl=60, only_if_absent=True)
+    assert not second.set("etag:user:1", "b", ttl=60, only_if_absent=True)
+    assert second.get("etag:user:1") == "a"
+
+    second.set("etag:user:1", "c", ttl=0.05)
+    assert first.get("etag:user:1") == "c"
+    time.sleep(0.1)
+    assert first.get("etag:user:1") is None
+    assert first.set("etag:user:1", "d", ttl=60, only_if_absent=True)
+
+
+def test_invalidations_reach_other_workers_only(make_backend):
+    writer, reader = InvalidationBus(make_backend()), InvalidationBus(make_backend())
+    writer_keys, reader_keys = received(writer), received(reader)
+    writer.poll()
+    reader.poll()
+
+    writer.publish("group:7", "user:u1")
+
+    assert eventually(lambda: reader.poll() or reader_keys) == ["group:7", "user:u1"]
+    writer.poll()
+    assert writer_keys == []
+    assert reader.stats()["received"] == 2 and writer.stats()["published"] == 2
+
+
+def test_trimmed_log_makes_readers_drop_everything(tmp_path):
+    path = str(tmp_path / "shared.db")
+    writer, reader = InvalidationBus(SQLiteSharedBackend(path, log_seconds=0)), InvalidationBus(SQLiteSharedBackend(path))
+    keys = received(reader)
+    reader.poll()
+
+    writer.publish("group:1")
+    writer.backend._writes = 99
+    time.sleep(0.01)
+    writer.publish("group:2")
+    writer.publish("group:3")
+    reader.poll()
+
+    assert keys == [EVERYTHING]
+    assert reader.stats()["resyncs"] == 1
+
+
+def test_redis_reconnect_makes_readers_drop_everything(redis_server):
+    bus = InvalidationBus(RedisSharedBackend(redis_server.url))
+    keys = received(bus)
+    bus.poll()
+
+    redis_server.drop_connections()
+
+    assert eventually(lambda: bus.poll() or keys) == [EVERYTHING]
+
+
+def test_shared_versions_give_every_worker_the_same_etags(make_backend):
+    first, second = VersionStore(shared=make_backend()), VersionStore(shared=make_backend())
+    etag = first.etag(["group:1"], "u1", {})
+
+    assert second.etag(["group:1"], "u1", {}) == etag
+    second.bump("group:1")
+    assert first.etag(["group:1"], "u1", {}) != etag
+
+
+def test_evicts_invalidated_users_and_groups():
+    owned_groups, expense_cache = OwnedGroupCache(), ExpenseCache()
+    evict = evict_from(owned_groups, expense_cache)
+    owned_groups.put("u1", [1])
+    owned_groups.put("u2", [2])
+    expense_cache.fill(1, [], expense_cache.epoch())
+
+    evict(["user:u1", "group:1"])
+    assert owned_groups.get("u1") is None and owned_groups.get("u2") == {2}
+    assert expense_cache.get(1) is None
+
+    evict([EVERYTHING])
+    assert owned_groups.get("u2") is None
+
+
+def test_from_env():
+    assert from_env("") is None
+    assert isinstance(from_env("redis://localhost:6380/2"), RedisSharedBackend)
+    with pytest.raises(ValueError):
+        from_env("memcached://localhost")
+
+
+# ================================
+# MULTI-PROCESS CONSISTENCY
+# ================================
+
+def _serve(app, port):
+    PooledWSGIServer("127.0.0.1", port, app, 4).serve_forever()
+
+
+@pytest.fixture
+def workers(fast_client):
+    """Start two forked worker processes serving the fast handler; returns their base URLs"""
+    import fast_group_handler
+
+    started = []
+
+    def start(count=2):
+        context = multiprocessing.get_context("fork")
+        urls = []
+        for _ in range(count):
+            port = free_port()
+            process = context.Process(target=_serve, args=(fast_group_handler.app, port), daemon=True)
+            process.start()
+            started.append(process)
+            urls.append(f"http://127.0.0.1:{port}")
+        for url in urls:
+            assert eventually(lambda: _reachable(url), timeout=5)
+        return urls
+
+    yield start
+    for process in started:
+        process.terminate()
+        process.join()
+
+
+def _reachable(url):
+    try:
+        return requests.get(f"{url}/health", timeout=1).status_code == 200
+    except requests.ConnectionError:
+        return False
+
+
+def share(monkeypatch, backend):
+    import fast_group_handler
+
+    monkeypatch.setattr(fast_group_handler.versions, "shared", backend)
+    monkeypatch.setattr(fast_group_handler.invalidations, "backend", backend)
+
+
+def seed(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Expense {i}", "amount": 5, "group_id": group["id"], "created_by": USER_ID} for i in range(3)
+    ])
+    return group
+
+
+def test_a_write_on_one_worker_is_seen_by_the_others(server, workers, make_backend, monkeypatch, auth_headers):
+    share(monkeypatch, make_backend())
+    group = seed(server)
+    first, second = workers()
+    listing = f"/api/groups/{group['id']}/expenses"
+
+    cached = requests.get(second + listing, headers=auth_headers)
+    assert cached.json()["count"] == 3
+    created = requests.post(first + listing, json={"description": "Dinner", "amount": 10}, headers=auth_headers)
+    assert created.status_code == 201
+
+    # The second worker dropped its cached list and ETag
+    assert eventually(lambda: requests.get(second + listing, headers=auth_headers).json()["count"] == 4)
+    revalidated = requests.get(second + listing, headers={**auth_headers, "If-None-Match": cached.headers["ETag"]})
+    assert revalidated.status_code == 200 and revalidated.json()["total_amount"] == 25.0
+
+    # ETags are shared: one issued by the second worker is current on the first
+    current = revalidated.headers["ETag"]
+    assert requests.get(first + listing, headers={**auth_headers, "If-None-Match": current}).status_code == 304
+
+    assert requests.delete(f"{first}/api/groups/{group['id']}", headers=auth_headers).status_code in (200, 204)
+    assert eventually(lambda: requests.get(second + listing, headers=auth_headers).status_code == 404)
+
+
+def test_without_a_shared_cache_workers_serve_stale_lists(server, workers, auth_headers):
+    group = seed(server)
+    first, second = workers()
+    listing = f"/api/groups/{group['id']}/expenses"
+
+    requests.get(second + listing, headers=auth_headers)
+    requests.post(first + listing, json={"description": "Dinner", "amount": 10}, headers=auth_headers)
+
+    assert requests.get(second + listing, headers=auth_headers).json()["count"] == 3
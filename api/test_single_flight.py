@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Test single-flight coalescing of identical concurrent upstream reads, threaded and async
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+import metrics
+from conftest import USER_ID
+from local_supabase import issue_token
+import resilience
+from resilience import DeadlineExceeded, start_deadline, end_deadline
+from single_flight import SingleFlight, AsyncSingleFlight, read_key
+from test_metrics import sample
+
+CONCURRENCY = 8
+
+
+def concurrently(fn, count=CONCURRENCY):
+    """Run fn(i) on count threads released together; returns the results in order"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# ================================
+# THREADED
+# ================================
+
+def slow_call(calls, result="rows", delay=0.2):
+    def call():
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        return result
+    return call
+
+
+def test_identical_calls_share_one_result():
+    flight, calls = SingleFlight(), []
+
+    results = concurrently(lambda i: flight.do("key", slow_call(calls)))
+
+    assert results == ["rows"] * CONCURRENCY
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "shared": CONCURRENCY - 1, "in_flight": 0, "forgotten": 0}
+
+
+def test_different_keys_and_later_calls_are_not_shared():
+    flight, calls = SingleFlight(), []
+
+    concurrently(lambda i: flight.do(i % 2, slow_call(calls)))
+    flight.do(0, slow_call(calls, delay=0))
+
+    assert len(calls) == 3
+
+
+def test_errors_reach_every_caller():
+    flight, saved = SingleFlight(), []
+
+    def failing():
+        time.sleep(0.2)
+        raise ConnectionError("upstream down")
+
+    def call(i):
+        try:
+            flight.do("key", failing)
+        except ConnectionError as e:
+            return str(e)
+
+    flight.on_shared = saved.append
+    assert concurrently(call) == ["upstream down"] * CONCURRENCY
+    assert saved == ["key"] * (CONCURRENCY - 1)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_forgotten_calls_are_not_joined():
+    flight, calls = SingleFlight(), []
+    leader = threading.Thread(target=flight.do, args=("key", slow_call(calls, "before write")))
+    leader.start()
+    time.sleep(0.05)
+
+    flight.forget()
+    assert flight.do("key", slow_call(calls, "after write", delay=0)) == "after write"
+    leader.join()
+    assert len(calls) == 2
+
+
+def test_a_joining_caller_waits_no_longer_than_its_own_budget(monkeypatch):
+    monkeypatch.setitem(resilience.ROUTE_BUDGETS, "quick", 0.1)
+    flight, calls = SingleFlight(), []
+    leader = threading.Thread(target=lambda: calls.append(flight.do("key", slow_call([], "rows", delay=0.5))))
+    leader.start()
+    time.sleep(0.05)
+
+    token = start_deadline("quick")
+    try:
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            flight.do("key", slow_call([]))
+        assert time.perf_counter() - started < 0.4
+    finally:
+        end_deadline(token)
+    leader.join()
+    # The call itself carried on for its leader
+    assert calls == ["rows"]
+
+
+def test_read_keys_include_every_filter_and_header():
+    key = read_key("http://x/rest/v1/groups", {"created_by": "eq.u1", "select": "id"}, {"Authorization": "Bearer a"})
+
+    assert key == read_key("http://x/rest/v1/groups", {"select": "id", "created_by": "eq.u1"}, {"Authorization": "Bearer a"})
+    assert key != read_key("http://x/rest/v1/groups", {"created_by": "eq.u1", "select": "id"}, {"Authorization": "Bearer b"})
+    assert key != read_key("http://x/rest/v1/groups", {"created_by": "eq.u1", "select": "*"}, {"Authorization": "Bearer a"})
+
+
+# ================================
+# ASYNC
+# ================================
+
+def test_async_calls_share_one_result_and_survive_a_cancelled_leader():
+    flight, calls = AsyncSingleFlight(), []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "rows"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("key", fetch)) for _ in range(CONCURRENCY - 1)]
+        await asyncio.sleep(0.01)
+        # The leader's client went away; the call carries on for everyone else
+        leader.cancel()
+        return await asyncio.gather(*followers), leader.cancelled()
+
+    results, cancelled = asyncio.run(scenario())
+    assert results == ["rows"] * (CONCURRENCY - 1) and cancelled
+    assert len(calls) == 1
+    assert flight.stats()["shared"] == CONCURRENCY - 1 and flight.stats()["in_flight"] == 0
+
+
+def test_async_joining_caller_waits_no_longer_than_its_own_budget(monkeypatch):
+    monkeypatch.setitem(resilience.ROUTE_BUDGETS, "quick", 0.1)
+    flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.5)
+        return "rows"
+
+    async def follower():
+        token = start_deadline("quick")
+        try:
+            return await flight.do("key", fetch)
+        finally:
+            end_deadline(token)
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            await follower()
+        return time.perf_counter() - started, await leader
+
+    elapsed, result = asyncio.run(scenario())
+    assert elapsed < 0.4 and result == "rows"
+
+
+def test_async_forget_and_errors():
+    flight, calls = AsyncSingleFlight(), []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ConnectionError("upstream down")
+
+    async def scenario():
+        first = [asyncio.ensure_future(flight.do("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        flight.forget()
+        second = asyncio.ensure_future(flight.do("key", failing))
+        return await asyncio.gather(*first, second, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert len(calls) == 2
+
+
+# ================================
+# HANDLERS
+# ================================
+
+@pytest.fixture
+def slow_group(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    server.seed("expenses", [{"description": "Taxi", "amount": 12, "group_id": group["id"], "created_by": USER_ID}])
+    server.reset_calls()
+    # Long enough that every concurrent request arrives while the first call is in flight
+    server.latency = 0.3
+    return group
+
+
+def test_fast_handler_coalesces_concurrent_listings(server, slow_group, fast_client, auth_headers):
+    import fast_group_handler
+
+    app = fast_group_handler.app
+    before = fast_group_handler.coalesced_reads.stats()["shared"]
+    metrics_before = sample(metrics.render(), "upstream_coalesced_total", table="expenses")
+
+    responses = concurrently(lambda i: app.test_client().get(f"/api/groups/{slow_group['id']}/expenses",
+                                                               headers=auth_headers))
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENCY
+    assert all(response.get_json()["count"] == 1 for response in responses)
+    # One ownership lookup and one expense read instead of one each per request
+    assert server.call_count("GET", "groups") == 1
+    assert server.call_count("GET", "expenses") == 1
+    assert fast_group_handler.coalesced_reads.stats()["shared"] - before == 2 * (CONCURRENCY - 1)
+    assert sample(metrics.render(), "upstream_coalesced_total", table="expenses") - metrics_before == CONCURRENCY - 1
+
+
+def test_different_users_never_share_a_read(server, fast_client):
+    import fast_group_handler
+
+    users = [f"user-{i}" for i in range(CONCURRENCY)]
+    server.seed("groups", [{"name": f"Group of {user}", "created_by": user} for user in users])
+    server.reset_calls()
+    server.latency = 0.2
+
+    responses = concurrently(lambda i: fast_group_handler.app.test_client().get(
+        "/api/groups", headers={"Authorization": f"Bearer {issue_token(users[i])}"}))
+
+    assert [response.get_json()["groups"][0]["name"] for response in responses] == [f"Group of {user}" for user in users]
+    assert server.call_count("GET", "groups") == CONCURRENCY
+
+
+def test_async_handler_coalesces_concurrent_listings(server, slow_group, async_client, auth_headers):
+    import async_group_handler
+
+    before = async_group_handler.coalesced_reads.stats()["shared"]
+
+    responses = concurrently(lambda i: async_client.get(f"/api/groups/{slow_group['id']}/expenses",
+                                                          headers=auth_headers))
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENCY
+    assert all(response.json()["count"] == 1 for response in responses)
+    assert server.call_count("GET", "expenses") == 1
+    assert async_group_handler.coalesced_reads.stats()["shared"] - before >= CONCURRENCY - 1
+
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test that the apps start fast: no heavy imports or backend setup at import time, and a time budget
+"""
+
+import threading
+
+import pytest
+
+import app_factory
+from bench_startup import IMPORT_BUDGET, FIRST_REQUEST_BUDGET, import_time, time_to_first_request
+from database import LazyDatabaseClient, DatabaseBackend
+
+
+@pytest.mark.parametrize("variant", sorted(app_factory.VARIANTS))
+def test_importing_an_app_is_cheap(variant):
+    seconds, heavy = min(import_time(variant) for _ in range(3))
+
+    assert heavy == []
+    assert seconds < IMPORT_BUDGET
+
+
+def test_first_request_within_budget():
+    assert min(time_to_first_request() for _ in range(2)) < FIRST_REQUEST_BUDGET
+
+
+class CountingBackend(DatabaseBackend):
+    def __init__(self):
+        self.tables = []
+
+    def select(self, table, columns="*", filters=None, order=None):
+        self.tables.append(table)
+        return [{"id": 1}]
+
+
+def test_the_backend_is_built_once_on_first_use():
+    built = []
+
+    def factory():
+        built.append(CountingBackend())
+        return built[-1]
+
+    db = LazyDatabaseClient(factory)
+    assert not db.started and built == []
+
+    threads = [threading.Thread(target=db.select, args=("groups",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1 and db.started
+    assert built[0].tables == ["groups"] * 8
+    # Backend-specific attributes pass through
+    assert db.tables is built[0].tables
+
+
+def test_a_failing_backend_fails_requests_not_the_import():
+    def factory():
+        raise ValueError("Unknown DATABASE_BACKEND: oracle")
+
+    db = LazyDatabaseClient(factory)
+    with pytest.raises(ValueError):
+        db.select("groups")
+    assert not db.started
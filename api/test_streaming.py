@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test streamed expense exports (?stream=1) against the local Supabase stand-in
+"""
+
+import json
+import uuid
+import datetime
+import tracemalloc
+from decimal import Decimal
+
+import pytest
+
+import streaming
+from conftest import USER_ID
+from json_provider import dumps_bytes
+from streaming import stream_export
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(streaming, "EXPORT_CHUNK_SIZE", 100)
+
+
+def seed_group(server, count):
+    group = server.seed("groups", [{"name": "Export", "created_by": USER_ID}])[0]
+    server.seed("expenses", [
+        {"description": f"Expense {i}", "amount": 0.1, "group_id": group["id"], "created_by": USER_ID}
+        for i in range(count)
+    ])
+    return group
+
+
+def check_export(body, group_id, count):
+    document = json.loads(body)
+    ids = [expense["id"] for expense in document["expenses"]]
+    assert document["group_id"] == group_id
+    assert document["complete"] is True
+    assert document["count"] == count == len(set(ids))
+    assert document["total_amount"] == round(count * 0.1, 2)
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_fast_handler_streams_whole_group_in_chunks(server, fast_client, auth_headers):
+    group = seed_group(server, 450)
+    server.reset_calls()
+
+    response = fast_client.get(f"/api/groups/{group['id']}/expenses?stream=1", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    check_export(response.get_data(), group["id"], 450)
+
+    chunk_calls = [call for call in server.calls if call["table"] == "expenses"]
+    assert len(chunk_calls) == 5
+    assert all(dict(call["params"])["limit"] == "101" for call in chunk_calls)
+
+
+def test_main_and_async_stream_whole_group(server, main_client, async_client, auth_headers):
+    group = seed_group(server, 230)
+
+    main_response = main_client.get(f"/api/expenses/{group['id']}?stream=true", headers=auth_headers)
+    check_export(main_response.get_data(), group["id"], 230)
+
+    async_response = async_client.get(f"/api/groups/{group['id']}/expenses?stream=1", headers=auth_headers)
+    assert async_response.headers["content-type"].startswith("application/json")
+    check_export(async_response.content, group["id"], 230)
+
+
+def test_empty_group_streams_valid_document(server, fast_client, auth_headers):
+    group = seed_group(server, 0)
+
+    response = fast_client.get(f"/api/groups/{group['id']}/expenses?stream=1", headers=auth_headers)
+
+    assert json.loads(response.get_data()) == {
+        "group_id": group["id"], "expenses": [], "count": 0, "total_amount": 0.0, "complete": True
+    }
+
+
+def test_upstream_failure_mid_stream_marks_export_incomplete(server, fast_client, auth_headers, monkeypatch):
+    group = seed_group(server, 250)
+    query = server.query
+
+    def failing_query(table, params, with_total=False):
+        if table == "expenses" and "or" in dict(params):
+            raise ValueError("upstream went away")
+        return query(table, params, with_total)
+
+    monkeypatch.setattr(server, "query", failing_query)
+    response = fast_client.get(f"/api/groups/{group['id']}/expenses?stream=1", headers=auth_headers)
+
+    document = json.loads(response.get_data())
+    assert document["complete"] is False
+    assert "error" in document
+    assert "count" not in document
+    assert len(document["expenses"]) == 100
+
+
+def test_export_rows_encode_like_the_json_responses():
+    row = {"id": 1, "description": "Café", "amount": Decimal("10.25"),
+           "created_at": datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc),
+           "created_by": uuid.UUID(int=1)}
+
+    body = b"".join(stream_export([[row]], group_id=1))
+
+    assert dumps_bytes(row) in body
+    document = json.loads(body)
+    assert document["expenses"][0]["amount"] == 10.25
+    assert document["expenses"][0]["created_at"] == "2025-01-01T00:00:00+00:00"
+
+
+def test_stream_peak_memory_is_flat():
+    def chunks(total, size=500):
+        for start in range(0, total, size):
+            yield [
+                {"id": i, "description": f"Expense {i}", "amount": 12.5, "created_at": "2025-01-01T00:00:00+00:00"}
+                for i in range(start, min(start + size, total))
+            ]
+
+    def peak(total):
+        tracemalloc.start()
+        try:
+            for _ in stream_export(chunks(total), group_id=1):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small, large = peak(2_000), peak(20_000)
+    # Ten times the rows must not mean ten times the memory
+    assert large < small * 2
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test per-request upstream accounting: Server-Timing, log lines and each endpoint's upstream-call budget
+"""
+
+import json
+import logging
+
+import pytest
+
+from conftest import USER_ID
+from upstream_trace import RequestTrace, UpstreamBudgetExceeded, record, start_trace, end_trace, upstream_budget
+
+# Most upstream calls each endpoint may make with cold caches, per handler
+BUDGETS = {
+    "list_groups": 2,
+    "list_expenses": 3,
+    "get_expense": 2,
+    "create_group": 1,
+    "create_expense": 2,
+    "create_batch": 2,
+    "delete_expense": 1,
+    "delete_group": 1,
+}
+
+
+def seed(server):
+    group = server.seed("groups", [{"name": "Trip", "created_by": USER_ID}])[0]
+    expenses = server.seed("expenses", [
+        {"description": f"Item {i}", "amount": 5, "group_id": group["id"], "created_by": USER_ID} for i in range(30)
+    ])
+    return group, expenses
+
+
+def requests_for(handler, group, expense):
+    expenses = f"/api/expenses/{group['id']}" if handler == "main" else f"/api/groups/{group['id']}/expenses"
+    return {
+        "list_groups": ("GET", "/api/groups", None),
+        "list_expenses": ("GET", expenses, None),
+        "get_expense": ("GET", f"/api/expenses/{expense['id']}", None),
+        "create_group": ("POST", "/api/groups", {"name": "New"}),
+        "create_expense": ("POST", expenses, {"description": "Taxi", "amount": 12}),
+        "create_batch": ("POST", f"/api/groups/{group['id']}/expenses:batch",
+                         [{"description": f"Row {i}", "amount": 1} for i in range(20)]),
+        "delete_expense": ("DELETE", f"/api/expenses/{expense['id']}", None),
+        "delete_group": ("DELETE", f"/api/groups/{group['id']}", None),
+    }
+
+
+@pytest.mark.parametrize("handler", ["fast", "main", "async"])
+@pytest.mark.parametrize("endpoint", list(BUDGETS))
+def test_endpoint_stays_within_upstream_budget(handler, endpoint, request, server, auth_headers):
+    if handler == "main" and endpoint == "get_expense":
+        pytest.skip("main.py has no single-expense endpoint")
+    client = request.getfixturevalue(f"{handler}_client")
+    # main verifies tokens through Supabase Auth; that call is cached per token
+    if handler == "main":
+        client.get("/api/groups", headers=auth_headers)
+    group, expenses = seed(server)
+    method, path, body = requests_for(handler, group, expenses[0])[endpoint]
+
+    with upstream_budget(BUDGETS[endpoint]) as traces:
+        if handler == "async":
+            response = client.request(method, path, headers=auth_headers, json=body)
+        else:
+            response = client.open(path, method=method, headers=auth_headers, json=body)
+
+    assert response.status_code < 400
+    assert response.headers["Server-Timing"].startswith("upstream;dur=")
+    assert f'desc="{traces[0].count} calls' in response.headers["Server-Timing"]
+
+
+def test_budget_helper_reports_the_calls(server, fast_client, auth_headers):
+    group, _ = seed(server)
+
+    with pytest.raises(UpstreamBudgetExceeded) as failure:
+        with upstream_budget(1):
+            fast_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+
+    assert "made" in str(failure.value) and "GET expenses -> 200" in str(failure.value)
+
+
+def test_budget_helper_needs_a_request():
+    with pytest.raises(UpstreamBudgetExceeded):
+        with upstream_budget(5):
+            pass
+
+
+def test_server_timing_lists_each_call_and_the_total():
+    token = start_trace("get_group_expenses", "GET")
+    record("GET", "http://db/rest/v1/groups?id=eq.1", 200, 0.0125, 100)
+    record("GET", "http://db/rest/v1/expenses?group_id=eq.1", 200, 0.0205, 2048)
+    trace = end_trace(token, 200)
+
+    header = trace.server_timing()
+
+    assert header.startswith('upstream;dur=33.0;desc="2 calls, 2148 B", ')
+    assert 'up1;dur=12.5;desc="GET groups 200"' in header
+    assert 'up2;dur=20.5;desc="GET expenses 200"' in header
+    assert ", app;dur=" in header
+
+
+def test_calls_outside_a_request_are_ignored():
+    record("GET", "http://db/rest/v1/groups", 200, 0.01, 10)
+
+    assert RequestTrace().count == 0
+
+
+def test_one_structured_log_line_per_request(server, fast_client, auth_headers, caplog):
+    group, _ = seed(server)
+
+    with caplog.at_level(logging.INFO, logger="upstream_trace"):
+        fast_client.get(f"/api/groups/{group['id']}/expenses", headers=auth_headers)
+
+    lines = [record.getMessage() for record in caplog.records if record.name == "upstream_trace"]
+    assert len(lines) == 1
+    entry = json.loads(lines[0].split(" ", 1)[1])
+    assert entry["route"] == "get_group_expenses" and entry["method"] == "GET" and entry["status"] == 200
+    assert entry["upstream_calls"] == len(entry["calls"]) >= 1 and entry["upstream_bytes"] > 0
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Upstream Trace - Per-request accounting of upstream Supabase calls
+
+Every call made through the shared requests session (FastSupabaseClient),
+supabase-py's httpx clients (DatabaseClient) or the async handler's httpx
+client is recorded against the request that made it: method, table,
+status, duration and response bytes. At the end of the request the totals
+go out as a Server-Timing header and one structured log line:
+
+    Server-Timing: upstream;dur=41.2;desc="2 calls, 5120 B", up1;dur=30.4;desc="GET groups 200", ...
+
+Tests wrap requests in upstream_budget(n) to fail on N+1 regressions.
+"""
+
+import json
+import time
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-call entries after this many are folded into the aggregate only
+MAX_TIMING_ENTRIES = 20
+
+UpstreamCall = namedtuple("UpstreamCall", "method target status duration_ms bytes")
+
+_current = ContextVar("upstream_trace", default=None)
+_observers = []
+
+
+# ================================
+# TRACE
+# ================================
+
+class RequestTrace:
+    """Upstream calls made while serving one request"""
+
+    def __init__(self, route=None, method=None):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.calls = []
+        # Reads that joined another request's identical call instead of making one
+        self.shared = 0
+
+    @property
+    def count(self):
+        return len(self.calls)
+
+    @property
+    def bytes(self):
+        return sum(call.bytes for call in self.calls)
+
+    @property
+    def upstream_ms(self):
+        return sum(call.duration_ms for call in self.calls)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        """Server-Timing header value: the upstream total, each call, then the whole request"""
+        entries = [f'upstream;dur={self.upstream_ms:.1f};desc="{self.count} calls, {self.bytes} B"']
+        for i, call in enumerate(self.calls[:MAX_TIMING_ENTRIES], 1):
+            entries.append(f'up{i};dur={call.duration_ms:.1f};desc="{call.method} {call.target} {call.status}"')
+        entries.append(f"app;dur={self.elapsed_ms():.1f}")
+        return ", ".join(entries)
+
+    def summary(self, status=None):
+        return {
+            "route": self.route,
+            "method": self.method,
+            "status": status,
+            "duration_ms": round(self.elapsed_ms(), 1),
+            "upstream_calls": self.count,
+            "upstream_ms": round(self.upstream_ms, 1),
+            "upstream_bytes": self.bytes,
+            "upstream_shared": self.shared,
+            "calls": [f"{call.method} {call.target} {call.status} {call.duration_ms:.1f}ms" for call in self.calls]
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+def start_trace(route=None, method=None):
+    """Begin tracing the current request; returns a token for end_trace"""
+    return _current.set(RequestTrace(route, method))
+
+
+def end_trace(token, status=None):
+    """Log the finished trace, hand it to observers and stop tracing"""
+    trace = _current.get()
+    _current.reset(token)
+    if trace is None:
+        return None
+    logger.info("📊 %s", json.dumps(trace.summary(status)))
+    for observer in list(_observers):
+        observer(trace)
+    return trace
+
+
+def target(url):
+    """Table (or auth endpoint) a Supabase URL addresses"""
+    path = urlsplit(str(url)).path
+    if path.startswith("/rest/v1/"):
+        return path[len("/rest/v1/"):]
+    if path.startswith("/auth/v1/"):
+        return "auth/" + path[len("/auth/v1/"):]
+    return path
+
+
+def record(method, url, status, duration, nbytes):
+    """Count one upstream call in the metrics and against the current request, if one is being traced"""
+    path = target(url)
+    metrics.observe_upstream(method, path, status, duration)
+
+    trace = _current.get()
+    if trace is None:
+        return
+    trace.calls.append(UpstreamCall(method, path, status, duration * 1000, nbytes))
+
+
+def record_shared(url):
+    """Count a read answered by an identical call already in flight (single_flight.py): a call saved"""
+    metrics.observe_coalesced(target(url))
+
+    trace = _current.get()
+    if trace is not None:
+        trace.shared += 1
+
+
+# ================================
+# CLIENT INSTRUMENTATION
+# ================================
+
+class TracedSession(requests.Session):
+    """requests.Session that records every call, including reading the body"""
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            record(method.upper(), url, "error", time.perf_counter() - start, 0)
+            raise
+        # Streamed bodies are read later; count what the headers promise
+        nbytes = (int(response.headers.get("Content-Length") or 0) if kwargs.get("stream")
+                  else len(response.content))
+        record(method.upper(), url, response.status_code, time.perf_counter() - start, nbytes)
+        return response
+
+
+def _httpx_request(request):
+    request.extensions["upstream_started"] = time.perf_counter()
+
+
+def _httpx_response(response):
+    response.read()
+    _record_httpx(response)
+
+
+async def _httpx_request_async(request):
+    _httpx_request(request)
+
+
+async def _httpx_response_async(response):
+    await response.aread()
+    _record_httpx(response)
+
+
+def _record_httpx(response):
+    request = response.request
+    started = request.extensions.get("upstream_started", time.perf_counter())
+    record(request.method, request.url, response.status_code, time.perf_counter() - started, len(response.content))
+
+
+def httpx_hooks():
+    """event_hooks for an httpx.Client (bodies are read in the hook, so not for streamed calls)"""
+    return {"request": [_httpx_request], "response": [_httpx_response]}
+
+
+def async_httpx_hooks():
+    """event_hooks for an httpx.AsyncClient"""
+    return {"request": [_httpx_request_async], "response": [_httpx_response_async]}
+
+
+def instrument_httpx(client):
+    """Add the hooks to an existing httpx.Client once; returns the client"""
+    hooks = client.event_hooks
+    if _httpx_response not in hooks["response"]:
+        hooks["request"].append(_httpx_request)
+        hooks["response"].append(_httpx_response)
+        client.event_hooks = hooks
+    return client
+
+
+# ================================
+# APP INTEGRATION
+# ================================
+
+def init_flask(app):
+    """Trace every request of a Flask app and add its Server-Timing header"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_upstream_trace():
+        g.upstream_trace = start_trace(request.endpoint, request.method)
+
+    @app.after_request
+    def _add_server_timing(response):
+        trace = current_trace()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            g.upstream_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _end_upstream_trace(exc):
+        token = g.pop("upstream_trace", None)
+        if token is not None:
+            end_trace(token, g.pop("upstream_status", 500))
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware doing the same for the Starlette app"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start_trace(scope["path"], scope["method"])
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace = current_trace()
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"server-timing", trace.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_trace(token, status)
+
+
+# ================================
+# TEST HELPER
+# ================================
+
+class UpstreamBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def upstream_budget(max_calls):
+    """Fail if any request finished inside the block made more than max_calls upstream calls
+
+        with upstream_budget(2):
+            client.get("/api/groups", headers=auth_headers)
+    """
+    traces = []
+    _observers.append(traces.append)
+    try:
+        yield traces
+    finally:
+        _observers.remove(traces.append)
+
+    if not traces:
+        raise UpstreamBudgetExceeded("No traced request finished inside the budget block")
+    for trace in traces:
+        if trace.count > max_calls:
+            calls = "\n  ".join(f"{call.method} {call.target} -> {call.status}" for call in trace.calls)
+            raise UpstreamBudgetExceeded(
+                f"{trace.method} {trace.route} made {trace.count} upstream calls (budget {max_calls}):\n  {calls}"
+            )
@@ -3,7 +3,9 @@
 Working Group Handler - Uses anon key with proper user handling
 """
 
-import requests
+from http_pool import get_session, pool_stats
+from jwt_auth import verifier_from_env
+from json_provider import FastJSONProvider
 import json
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -36,6 +38,11 @@ class SimpleSupabaseClient:
             "Prefer": "return=representation"
         }
 
+    @property
+    def session(self):
+        """Shared keep-alive session for this worker"""
+        return get_session()
+
     def create_group_with_user_token(self, group_data, user_token):
         """Create a group using a real user token to bypass RLS"""
         try:
@@ -50,7 +57,7 @@ class SimpleSupabaseClient:
             }
             
             url = f"{self.base_url}/groups"
-            response = requests.post(url, headers=headers, json=group_data)
+            response = self.session.post(url, headers=headers, json=group_data)
             
             if response.status_code in [200, 201]:
                 result = response.json()
@@ -75,7 +82,7 @@ class SimpleSupabaseClient:
             url = f"{self.base_url}/groups"
             params = {"limit": "0"}  # Just check if endpoint exists
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.session.get(url, headers=self.headers, params=params)
             
             if response.status_code in [200, 401]:  # 401 is OK, means auth is working
                 return True, "Connection successful!"
@@ -94,7 +101,7 @@ class SimpleSupabaseClient:
                 "Content-Type": "application/json"
             }
             
-            response = requests.get(auth_url, headers=headers)
+            response = self.session.get(auth_url, headers=headers)
             
             if response.status_code == 200:
                 user_data = response.json()
@@ -126,7 +133,7 @@ class SimpleSupabaseClient:
                 "order": "created_at.desc"
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.session.get(url, headers=headers, params=params)
             
             if response.status_code == 200:
                 return response.json()
@@ -144,8 +151,12 @@ supabase = SimpleSupabaseClient()
 # FLASK APPLICATION
 # ================================
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, origins=["*"])
 
+# Local JWT verification when configured, cached remote verification otherwise
+token_verifier = verifier_from_env(SUPABASE_URL, remote_verify=lambda token: supabase.verify_user_token(token))
+
 def get_current_user():
     """Extract and verify user from Authorization header"""
     auth_header = request.headers.get('Authorization')
@@ -154,7 +165,7 @@ def get_current_user():
     
     try:
         token = auth_header.replace("Bearer ", "")
-        user = supabase.verify_user_token(token)
+        user = token_verifier.verify(token)
         if not user:
             return None, {"error": "Invalid token"}, 401
         return user, token, None  # Return user and token
@@ -185,7 +196,11 @@ def root():
 @app.route("/health")
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "Working Group Handler API"})
+    return jsonify({
+        "status": "healthy",
+        "service": "Working Group Handler API",
+        "upstream_pool": pool_stats()
+    })
 
 @app.route("/test")
 def test_endpoint():
@@ -54,15 +54,37 @@ class ApiService {
     })
   }
 
+  // Follows next_cursor so callers still get every group in one list
   async getGroups() {
-    return this.request('/api/groups', {
+    const first = await this.request('/api/groups', {
+      method: 'GET'
+    })
+
+    const groups = [...first.groups]
+    let cursor = first.next_cursor
+    while (cursor) {
+      const page = await this.request(`/api/groups?cursor=${encodeURIComponent(cursor)}`, {
+        method: 'GET'
+      })
+      groups.push(...page.groups)
+      cursor = page.next_cursor
+    }
+
+    return { groups, count: first.count ?? groups.length }
+  }
+
+  // The group with expense_count and total_amount, plus its first page of expenses
+  async getGroup(groupId) {
+    return this.request(`/api/groups/${groupId}`, {
       method: 'GET'
     })
   }
 
   // Expense API methods
-  async getExpensesForGroup(groupId) {
-    return this.request(`/api/groups/${groupId}/expenses`, {
+  // Returns one page; count and total_amount cover the whole group
+  async getExpensesForGroup(groupId, cursor = null) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
+    return this.request(`/api/groups/${groupId}/expenses${query}`, {
       method: 'GET'
     })
   }
@@ -6,6 +6,9 @@ import { apiService } from '../lib/api'
 const GroupDetailPage = ({ user }) => {
   const [group, setGroup] = useState(null)
   const [expenses, setExpenses] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [expenseTotals, setExpenseTotals] = useState({ count: 0, amount: 0 })
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(true)
   const [expensesLoading, setExpensesLoading] = useState(false)
   const [expenseDescription, setExpenseDescription] = useState('')
@@ -18,27 +21,22 @@ const GroupDetailPage = ({ user }) => {
 
   useEffect(() => {
     if (user && groupId) {
-      fetchGroup()
-      fetchExpenses()
+      fetchGroupDetail()
     }
   }, [user, groupId])
 
-  const fetchGroup = async () => {
+  // One call brings the group, its totals and the first page of expenses
+  const fetchGroupDetail = async () => {
     try {
       setLoading(true)
-      // Fetch all groups and find the one with matching ID
-      const response = await apiService.getGroups()
-      const groups = response.groups || []
-      const foundGroup = groups.find(group => group.id === parseInt(groupId))
-      
-      if (foundGroup) {
-        setGroup(foundGroup)
-      } else {
-        // Group not found, redirect to dashboard
-        console.error('Group not found')
-        navigate('/dashboard')
-      }
+      const response = await apiService.getGroup(groupId)
+      const { expense_count, total_amount, ...foundGroup } = response.group
+      setGroup(foundGroup)
+      setExpenses(response.expenses || [])
+      setNextCursor(response.next_cursor || null)
+      setExpenseTotals({ count: expense_count || 0, amount: parseFloat(total_amount || 0) })
     } catch (error) {
+      // Missing or not this user's group: back to the dashboard
       console.error('Error fetching group:', error)
       navigate('/dashboard')
     } finally {
@@ -46,16 +44,21 @@ const GroupDetailPage = ({ user }) => {
     }
   }
 
-  const fetchExpenses = async () => {
+  const loadMoreExpenses = async () => {
+    if (!nextCursor) {
+      return
+    }
+
     try {
-      setExpensesLoading(true)
-      const response = await apiService.getExpensesForGroup(groupId)
-      setExpenses(response.expenses || [])
+      setLoadingMore(true)
+      const response = await apiService.getExpensesForGroup(groupId, nextCursor)
+      setExpenses(prev => [...prev, ...(response.expenses || [])])
+      setNextCursor(response.next_cursor || null)
     } catch (error) {
-      console.error('Error fetching expenses:', error)
+      console.error('Error loading more expenses:', error)
       setExpenseError('Error loading expenses: ' + (error?.message || 'Unknown error'))
     } finally {
-      setExpensesLoading(false)
+      setLoadingMore(false)
     }
   }
 
@@ -82,6 +85,7 @@ const GroupDetailPage = ({ user }) => {
       })
       
       setExpenses(prev => [newExpense, ...prev])
+      setExpenseTotals(prev => ({ count: prev.count + 1, amount: prev.amount + parseFloat(newExpense.amount) }))
       setExpenseDescription('')
       setExpenseAmount('')
       setShowAddExpense(false)
@@ -106,7 +110,11 @@ const GroupDetailPage = ({ user }) => {
       await apiService.deleteExpense(expenseId)
       
       // Update local state only after successful deletion
+      const deleted = expenses.find(expense => expense.id === expenseId)
       setExpenses(prev => prev.filter(expense => expense.id !== expenseId))
+      if (deleted) {
+        setExpenseTotals(prev => ({ count: prev.count - 1, amount: prev.amount - parseFloat(deleted.amount) }))
+      }
       setExpenseMessage(`Expense "${description}" deleted successfully!`)
       setTimeout(() => setExpenseMessage(''), 3000)
       
@@ -116,13 +124,9 @@ const GroupDetailPage = ({ user }) => {
     }
   }
 
-  const calculateTotal = () => {
-    return expenses.reduce((total, expense) => total + parseFloat(expense.amount), 0).toFixed(2)
-  }
-
-  // Calculate statistics
-  const totalAmount = calculateTotal()
-  const expenseCount = expenses.length
+  // Statistics come from the server totals, since only some pages may be loaded
+  const totalAmount = Math.max(expenseTotals.amount, 0).toFixed(2)
+  const expenseCount = expenseTotals.count
   const averageExpense = expenseCount > 0 ? (parseFloat(totalAmount) / expenseCount).toFixed(2) : '0.00'
   const todaysExpenses = expenses.filter(expense => {
     const expenseDate = new Date(expense.created_at).toDateString()
@@ -668,6 +672,16 @@ const GroupDetailPage = ({ user }) => {
                     </div>
                   </div>
                 ))}
+                {nextCursor && (
+                  <button
+                    onClick={loadMoreExpenses}
+                    disabled={loadingMore}
+                    className="btn btn-secondary"
+                    style={{ alignSelf: 'center', marginTop: 'var(--space-2)' }}
+                  >
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </button>
+                )}
               </div>
             )}
           </div>